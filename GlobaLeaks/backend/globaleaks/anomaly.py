@@ -73,7 +73,7 @@ def generate_admin_alert_mail(session, tid, alert):
             'user': user_desc,
         }
 
-        subject, body = Templating().get_mail_subject_and_body(data)
+        subject, body = Templating(tid, user_language).get_mail_subject_and_body(data)
 
         db_schedule_email(session, tid, user_desc['mail_address'], subject, body)
 
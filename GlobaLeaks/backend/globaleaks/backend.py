@@ -16,7 +16,9 @@ import globaleaks.mocks.twisted_mocks # pylint: disable=W0611
 
 from globaleaks.db import create_db, init_db, update_db, \
     sync_refresh_memory_variables, sync_clean_untracked_files
-from globaleaks.rest.api import APIResourceWrapper
+from globaleaks.handlers.staticfile import get_static_manifest
+from globaleaks.rest.api import APIChannel, APIRequest, APIResourceWrapper
+from globaleaks.rest.apicache import ApiCache
 from globaleaks.settings import Settings
 from globaleaks.state import State
 from globaleaks.utils.process import disable_swap
@@ -40,6 +42,8 @@ class Service(service.Service):
         self.state = State
         self.arw = APIResourceWrapper()
         self.api_factory = Site(self.arw, logFormatter=timedLogFormatter)
+        self.api_factory.protocol = APIChannel
+        self.api_factory.requestFactory = APIRequest
 
     def startService(self):
         mask = 0
@@ -86,6 +90,8 @@ class Service(service.Service):
             if not self._shutdown:
                 self._shutdown = True
                 self.state.orm_tp.stop()
+                self.state.orm_ro_tp.stop()
+                self.state.crypto_tp.stop()
                 d.callback(None)
 
         reactor.callLater(30, _shutdown, None)
@@ -136,7 +142,15 @@ class Service(service.Service):
         sync_clean_untracked_files()
         sync_refresh_memory_variables()
 
+        # build the public resources of all the tenants before serving them
+        ApiCache.warming_queue.add(None)
+
+        # index the client application serving its files from memory
+        get_static_manifest(Settings.client_path)
+
         self.state.orm_tp.start()
+        self.state.orm_ro_tp.start()
+        self.state.crypto_tp.start()
 
         reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
 
@@ -16,11 +16,16 @@ from globaleaks.orm import transact, transact_sync, get_session, make_db_uri
 from globaleaks.settings import Settings
 from globaleaks.state import State, TenantState
 from globaleaks.utils import security
+from globaleaks.utils.lrucache import LRUCache
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.utility import log
 
+# number of distinct Accept-Language headers memoized per tenant
+ACCEPT_LANGUAGE_CACHE_SIZE = 128
+
+
 def get_db_file(db_path):
-    path = os.path.join(db_path, 'globaleaks.db')
+    path = os.path.abspath(os.path.join(db_path, 'globaleaks.db'))
     if os.path.exists(path):
         session = get_session(make_db_uri(path))
         version_db = session.query(models.Config.value).filter(Config.tid == 1, Config.var_name == u'version_db').one()[0]
@@ -150,8 +155,16 @@ def db_refresh_tenant_cache(session, tid_list):
             tenant_cache.setdefault('notification', ObjectDict())
             tenant_cache['notification'][cfg.var_name] = cfg.get_v()
 
+    for tid in tid_list:
+        State.tenant_cache[tid].languages_enabled = []
+
     for tid, lang in models.EnabledLanguage.tid_list(session, tid_list):
-        State.tenant_cache[tid].setdefault('languages_enabled', []).append(lang)
+        State.tenant_cache[tid].languages_enabled.append(lang)
+
+    for tid in tid_list:
+        # the response headers and the negotiated languages depend on the settings just loaded
+        State.tenant_cache[tid].headers = {}
+        State.tenant_cache[tid].accept_language_cache = LRUCache(ACCEPT_LANGUAGE_CACHE_SIZE)
 
 
 def db_refresh_memory_variables(session, to_refresh=None):
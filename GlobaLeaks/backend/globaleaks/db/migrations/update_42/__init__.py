@@ -0,0 +1,106 @@
+# -*- coding: UTF-8
+from globaleaks.db.migrations.update import MigrationBase
+from globaleaks.models import Model
+from globaleaks.models.properties import *
+from globaleaks.utils.utility import datetime_now, datetime_null
+
+
+class Field_v_41(Model):
+    __tablename__ = 'field'
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+    tid = Column(Integer, default=1, nullable=False)
+    x = Column(Integer, default=0, nullable=False)
+    y = Column(Integer, default=0, nullable=False)
+    width = Column(Integer, default=0, nullable=False)
+    label = Column(JSON, nullable=False)
+    description = Column(JSON, nullable=False)
+    hint = Column(JSON, nullable=False)
+    required = Column(Boolean, default=False, nullable=False)
+    preview = Column(Boolean, default=False, nullable=False)
+    multi_entry = Column(Boolean, default=False, nullable=False)
+    multi_entry_hint = Column(JSON, nullable=False)
+    stats_enabled = Column(Boolean, default=False, nullable=False)
+    triggered_by_score = Column(Integer, default=0, nullable=False)
+    template_id = Column(Unicode(36))
+    fieldgroup_id = Column(Unicode(36))
+    step_id = Column(Unicode(36))
+    type = Column(UnicodeText, default=u'inputbox', nullable=False)
+    instance = Column(UnicodeText, default=u'instance', nullable=False)
+    editable = Column(Boolean, default=True, nullable=False)
+
+
+class InternalTip_v_41(Model):
+    __tablename__ = 'internaltip'
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+    tid = Column(Integer, default=1, nullable=False)
+    encrypted = Column(Boolean, default=False, nullable=False)
+    wb_prv_key = Column(Unicode, default=u'', nullable=False)
+    wb_pub_key = Column(Unicode, default=u'', nullable=False)
+    wb_tip_key = Column(Unicode, default=u'', nullable=False)
+    enc_data = Column(Unicode, default=u'', nullable=False)
+    creation_date = Column(DateTime, default=datetime_now, nullable=False)
+    update_date = Column(DateTime, default=datetime_now, nullable=False)
+    context_id = Column(Unicode(36), nullable=False)
+    questionnaire_hash = Column(Unicode(64), nullable=False)
+    preview = Column(JSON, nullable=False)
+    progressive = Column(Integer, default=0, nullable=False)
+    https = Column(Boolean, default=False, nullable=False)
+    total_score = Column(Integer, default=0, nullable=False)
+    expiration_date = Column(DateTime, nullable=False)
+    identity_provided = Column(Boolean, default=False, nullable=False)
+    identity_provided_date = Column(DateTime, default=datetime_null, nullable=False)
+    enable_two_way_comments = Column(Boolean, default=True, nullable=False)
+    enable_two_way_messages = Column(Boolean, default=True, nullable=False)
+    enable_attachments = Column(Boolean, default=True, nullable=False)
+    enable_whistleblower_identity = Column(Boolean, default=False, nullable=False)
+    receipt_hash = Column(Unicode(128), nullable=False)
+    wb_last_access = Column(DateTime, default=datetime_now, nullable=False)
+    wb_access_counter = Column(Integer, default=0, nullable=False)
+
+
+class Receiver_v_41(Model):
+    __tablename__ = 'receiver'
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+    configuration = Column(UnicodeText, default=u'default', nullable=False)
+    can_delete_submission = Column(Boolean, default=False, nullable=False)
+    can_postpone_expiration = Column(Boolean, default=False, nullable=False)
+    can_grant_permissions = Column(Boolean, default=False, nullable=False)
+    tip_notification = Column(Boolean, default=True, nullable=False)
+
+
+class Mail_v_41(Model):
+    __tablename__ = 'mail'
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+    tid = Column(Integer, default=1, nullable=False)
+    creation_date = Column(DateTime, default=datetime_now, nullable=False)
+    address = Column(UnicodeText, nullable=False)
+    subject = Column(UnicodeText, nullable=False)
+    body = Column(UnicodeText, nullable=False)
+    processing_attempts = Column(Integer, default=0, nullable=False)
+
+
+class MigrationScript(MigrationBase):
+    def migrate_Mail(self):
+        old_objs = self.session_old.query(self.model_from['Mail'])
+        for old_obj in old_objs:
+            new_obj = self.model_to['Mail']()
+            for key in [c.key for c in old_obj.__table__.columns]:
+                setattr(new_obj, key, getattr(old_obj, key))
+
+            # the queued mails are sent at the first run
+            new_obj.next_attempt_at = old_obj.creation_date
+
+            self.session_new.add(new_obj)
+
+    def migrate_Receiver(self):
+        old_objs = self.session_old.query(self.model_from['Receiver'])
+        for old_obj in old_objs:
+            new_obj = self.model_to['Receiver']()
+            for key in [c.key for c in old_obj.__table__.columns]:
+                setattr(new_obj, key, getattr(old_obj, key))
+
+            # the two step login is left disabled until the control mails are configured
+            new_obj.control_mail_1 = new_obj.control_mail_2 = new_obj.control_mail_3 = u''
+            new_obj.two_step_login_enabled = False
+
+            self.session_new.add(new_obj)
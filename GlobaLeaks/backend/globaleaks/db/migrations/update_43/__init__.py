@@ -0,0 +1,18 @@
+# -*- coding: UTF-8
+from globaleaks.db.migrations.update import MigrationBase
+
+
+class MigrationScript(MigrationBase):
+    def epilogue(self):
+        """
+        Add the configuration of the notification digests, disabled by default
+        """
+        for tenant in self.session_new.query(self.model_to['Tenant']):
+            self.session_new.add(self.model_to['Config'](tenant.id, u'notification_digest_interval', 0))
+            self.entries_count['Config'] += 1
+
+        for lang in self.session_new.query(self.model_to['EnabledLanguage']):
+            for var_name in [u'digest_mail_title', u'digest_mail_template']:
+                value = self.appdata['templates'][var_name].get(lang.name, u'')
+                self.session_new.add(self.model_to['ConfigL10N'](lang.tid, lang.name, var_name, value))
+                self.entries_count['ConfigL10N'] += 1
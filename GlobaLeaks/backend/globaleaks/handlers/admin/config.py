@@ -7,10 +7,9 @@ from globaleaks.handlers.operation import OperationHandler
 from globaleaks.models import Config
 from globaleaks.models.config import ConfigFactory
 from globaleaks.orm import transact
-from globaleaks.rest import errors
+from globaleaks.rest import errors, requests
 from globaleaks.utils.utility import is_common_net_error
 
-from six import text_type, binary_type
 from six.moves.urllib.parse import urlparse, urlunsplit # pylint: disable=import-error
 
 @transact
@@ -81,6 +80,6 @@ class AdminConfigHandler(OperationHandler):
 
     def operation_descriptors(self):
         return {
-            'set_hostname': (AdminConfigHandler.set_hostname, {'value': text_type}),
-            'verify_hostname': (AdminConfigHandler.verify_hostname, {'value': text_type})
+            'set_hostname': (AdminConfigHandler.set_hostname, requests.OpsValueDesc),
+            'verify_hostname': (AdminConfigHandler.verify_hostname, requests.OpsValueDesc)
         }
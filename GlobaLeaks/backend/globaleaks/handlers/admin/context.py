@@ -4,14 +4,13 @@
 #   *****
 # Implementation of the code executed on handler /admin/contexts
 #
-from six import text_type
 from sqlalchemy.sql.expression import not_
 
 from globaleaks import models
 from globaleaks.handlers.admin.modelimgs import db_get_model_img
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.operation import OperationHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests, errors
 from globaleaks.utils.structures import fill_localized_keys, get_localized_values
 
@@ -54,7 +53,7 @@ def admin_serialize_context(session, context, language):
     return get_localized_values(ret_dict, context, context.localized_keys, language)
 
 
-@transact
+@transact_ro
 def get_context_list(session, tid, language):
     """
     Returns the context list.
@@ -198,7 +197,8 @@ def order_elements(session, handler, req_args, *args, **kwargs):
 class ContextsCollection(OperationHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'Context', 'ContextImg', 'Questionnaire', 'User'}
+    invalidate_cache = {'Context'}
 
     def get(self):
         """
@@ -217,13 +217,13 @@ class ContextsCollection(OperationHandler):
 
     def operation_descriptors(self):
         return {
-            'order_elements': (order_elements, {'ids': [text_type]}),
+            'order_elements': (order_elements, requests.OpsOrderElementsDesc),
         }
 
 
 class ContextInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'Context'}
 
     def put(self, context_id):
         """
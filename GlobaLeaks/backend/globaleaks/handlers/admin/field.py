@@ -9,7 +9,7 @@ from sqlalchemy.sql.expression import not_
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.public import serialize_field
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
 from globaleaks.utils.structures import fill_localized_keys
@@ -274,7 +274,7 @@ def fieldtree_ancestors(session, id):
         yield fieldtree_ancestors(session, field.fieldgroup_id)
 
 
-@transact
+@transact_ro
 def get_fieldtemplate_list(session, tid, language):
     """
     Serialize all the field templates localizing their content depending on the language.
@@ -294,7 +294,8 @@ def get_fieldtemplate_list(session, tid, language):
 class FieldTemplatesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'Field'}
+    invalidate_cache = {'Field'}
 
     def get(self):
         """
@@ -318,7 +319,7 @@ class FieldTemplatesCollection(BaseHandler):
 
 class FieldTemplateInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'Field'}
 
     def put(self, field_id):
         """
@@ -353,7 +354,8 @@ class FieldsCollection(BaseHandler):
     """
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'Field'}
+    invalidate_cache = {'Field'}
 
     def post(self):
         """
@@ -378,7 +380,7 @@ class FieldInstance(BaseHandler):
     /admin/fields
     """
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'Field'}
 
     def put(self, field_id):
         """
@@ -7,15 +7,14 @@
 import base64
 import os
 
-from twisted.internet import threads
-
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
+from globaleaks.utils.securetempfile import run_in_thread_pool
 from globaleaks.utils.security import directory_traversal_check
 from globaleaks.utils.utility import uuid4
 
-@transact
+@transact_ro
 def get_files(session, tid):
     ret = []
 
@@ -65,21 +64,19 @@ def get_file(session, tid, id):
 
 class FileInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'File'}
     upload_handler = True
 
     def post(self, id):
         if id != 'custom':
             sf = self.state.get_tmp_file_by_name(self.uploaded_file['filename'])
-            with sf.open('r') as encrypted_file:
-                data = encrypted_file.read()
 
-            data = base64.b64encode(data)
-            d = add_file(self.request.tid, id, u'', data)
+            d = sf.deferred_read()
+            d.addCallback(lambda data: add_file(self.request.tid, id, u'', base64.b64encode(data)))
         else:
             id = uuid4()
             path = os.path.join(self.state.settings.files_path, id)
-            d = threads.deferToThread(self.write_upload_plaintext_to_disk, path)
+            d = run_in_thread_pool(self.write_upload_plaintext_to_disk, path)
             d.addCallback(lambda x: add_file(self.request.tid, id, self.uploaded_file['name'], u''))
 
         return d
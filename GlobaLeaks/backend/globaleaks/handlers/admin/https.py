@@ -11,7 +11,7 @@ from twisted.internet.threads import deferToThread
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler, HANDLER_EXEC_TIME_THRESHOLD
 from globaleaks.models.config import ConfigFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
 from globaleaks.state import State
@@ -314,7 +314,7 @@ class FileHandler(BaseHandler):
         return self.get_file_res_or_raise(name).get_file(self.request.tid)
 
 
-@transact
+@transact_ro
 def serialize_https_config_summary(session, tid):
     config = ConfigFactory(session, tid, 'node')
 
@@ -13,9 +13,9 @@ from six import binary_type
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 
-@transact
+@transact_ro
 def get(session, tid, lang):
     texts = session.query(models.CustomTexts).filter(models.CustomTexts.tid == tid, models.CustomTexts.lang == lang).one_or_none()
     if texts is None:
@@ -35,7 +35,7 @@ def update(session, tid, lang, request):
 
 class AdminL10NHandler(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'CustomTexts'}
 
     def get(self, lang):
         return get(self.request.tid, lang)
@@ -45,15 +45,16 @@ def del_model_img(session, tid, obj_key, obj_id):
 
 class ModelImgInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'ContextImg', 'UserImg'}
     upload_handler = True
 
     def post(self, obj_key, obj_id):
         sf = self.state.get_tmp_file_by_name(self.uploaded_file['filename'])
-        with sf.open('r') as encrypted_file:
-            data = encrypted_file.read()
 
-        return add_model_img(self.request.tid, obj_key, obj_id, data)
+        d = sf.deferred_read()
+        d.addCallback(lambda data: add_model_img(self.request.tid, obj_key, obj_id, data))
+
+        return d
 
     def delete(self, obj_key, obj_id):
         return del_model_img(self.request.tid, obj_key, obj_id)
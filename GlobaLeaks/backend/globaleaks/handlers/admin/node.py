@@ -10,7 +10,7 @@ from globaleaks.db import db_refresh_memory_variables
 from globaleaks.db.appdata import load_appdata
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models.config import ConfigFactory, NodeL10NFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.state import State
 from globaleaks.utils.utility import log, parse_csv_ip_ranges_to_ip_networks
@@ -41,7 +41,7 @@ def db_admin_serialize_node(session, tid, language):
     return utils.sets.merge_dicts(config, misc_dict, l10n_dict)
 
 
-@transact
+@transact_ro
 def admin_serialize_node(session, tid, language):
     return db_admin_serialize_node(session, tid, language)
 
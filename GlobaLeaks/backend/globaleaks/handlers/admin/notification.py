@@ -7,11 +7,11 @@ from globaleaks.handlers.admin.node import admin_serialize_node
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.user import get_user_settings
 from globaleaks.models.config import ConfigFactory, NotificationL10NFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests
 from globaleaks.state import State
 from globaleaks.utils.sets import merge_dicts
-from globaleaks.utils.templating import Templating
+from globaleaks.utils.templating import Templating, template_cache
 
 
 def admin_serialize_notification(session, tid, language):
@@ -32,7 +32,7 @@ def db_get_notification(session, tid, language):
     return admin_serialize_notification(session, tid, language)
 
 
-@transact
+@transact_ro
 def get_notification(session, tid, language):
     return db_get_notification(session, tid, language)
 
@@ -51,6 +51,8 @@ def update_notification(session, tid, request, language):
     if request.pop('reset_templates'):
         notif_l10n.reset_templates(load_appdata())
 
+    template_cache.invalidate(tid)
+
     db_refresh_memory_variables(session, [tid])
 
     return admin_serialize_notification(session, tid, language)
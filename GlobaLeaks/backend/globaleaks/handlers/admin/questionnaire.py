@@ -10,7 +10,7 @@ from globaleaks import models, QUESTIONNAIRE_EXPORT_VERSION
 from globaleaks.handlers.admin.step import db_create_step
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.public import serialize_questionnaire
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests
 from globaleaks.utils.structures import fill_localized_keys
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now
@@ -22,7 +22,7 @@ def db_get_questionnaire_list(session, tid, language):
     return [serialize_questionnaire(session, tid, questionnaire, language) for questionnaire in questionnaires]
 
 
-@transact
+@transact_ro
 def get_questionnaire_list(session, tid, language):
     """
     Returns the questionnaire list.
@@ -44,7 +44,7 @@ def db_get_questionnaire(session, tid, questionnaire_id, language):
     return serialize_questionnaire(session, tid, questionnaire, language)
 
 
-@transact
+@transact_ro
 def get_questionnaire(session, tid, questionnaire_id, language):
     return db_get_questionnaire(session, tid, questionnaire_id, language)
 
@@ -112,7 +112,10 @@ def update_questionnaire(session, tid, questionnaire_id, request, language):
 class QuestionnairesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'Questionnaire', 'Step', 'Field'}
+    invalidate_cache = {'Questionnaire', 'Step', 'Field'}
+    # questionnaires are imported with all their steps and fields
+    max_body_size = 8 * 1024 * 1024
 
     def get(self):
         """
@@ -135,7 +138,8 @@ class QuestionnairesCollection(BaseHandler):
 
 class QuestionnaireInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'Questionnaire', 'Step', 'Field'}
+    max_body_size = 8 * 1024 * 1024
 
     def put(self, questionnaire_id):
         """
@@ -4,10 +4,10 @@
 from globaleaks import models
 from globaleaks.handlers.signup import serialize_signup
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 
 
-@transact
+@transact_ro
 def get_signup_list(session):
     return [serialize_signup(s) for s in session.query(models.Signup)]
 
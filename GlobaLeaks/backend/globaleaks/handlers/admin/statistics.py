@@ -5,9 +5,14 @@ from datetime import timedelta
 
 from globaleaks.event import events_monitored
 from globaleaks.handlers.base import BaseHandler
+from globaleaks.handlers.submission import ArchivedSchemaCache
 from globaleaks.models import Stats, Anomalies
-from globaleaks.orm import transact
+from globaleaks.orm import get_engine_stats, get_transaction_stats, query_profiles, transact_ro, write_queue
+from globaleaks.rest.apicache import ApiCache
+from globaleaks.rest.router import route_hits
 from globaleaks.state import State
+from globaleaks.utils.securetempfile import ThreadPoolStats
+from globaleaks.utils.smtpspooler import smtp_spooler
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, \
     iso_to_gregorian
 
@@ -24,7 +29,7 @@ def weekmap_to_heatmap(week_map):
     return retlist
 
 
-@transact
+@transact_ro
 def get_stats(session, tid, week_delta):
     """
     :param week_delta: commonly is 0, mean that you're taking this
@@ -109,7 +114,7 @@ def get_stats(session, tid, week_delta):
     }
 
 
-@transact
+@transact_ro
 def get_anomaly_history(session, tid, limit):
     anomalies = session.query(Anomalies).filter(Anomalies.tid == tid).order_by(Anomalies.date.desc())[:limit]
 
@@ -175,6 +180,27 @@ class RecentEventsCollection(BaseHandler):
         return self.get_summary(templist)
 
 
+class MetricsCollection(BaseHandler):
+    """
+    This handler returns the runtime metrics of the ORM layer, of the caches, of the router,
+    of the thread pool encrypting the uploads and of the mail spooler
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        return {
+            'engines': get_engine_stats(),
+            'transactions': get_transaction_stats(),
+            'query_profiles': list(query_profiles),
+            'write_queue': write_queue.waiting,
+            'archived_schema_cache': ArchivedSchemaCache.get_stats(),
+            'api_cache': ApiCache.get_stats(),
+            'routes': dict(route_hits),
+            'crypto_queue': ThreadPoolStats.get_stats(),
+            'smtp': smtp_spooler.get_stats()
+        }
+
+
 class JobsTiming(BaseHandler):
     """
     This handler return the timing for the latest scheduler execution
@@ -4,7 +4,6 @@
 #   *****
 # Implementation of the code executed on handler /admin/steps
 #
-from six import text_type
 
 from globaleaks import models
 from globaleaks.handlers.admin.field import db_create_field, db_update_field
@@ -105,7 +104,8 @@ class StepCollection(OperationHandler):
     """
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'Step', 'Field'}
+    invalidate_cache = {'Step', 'Field'}
 
     def post(self):
         """
@@ -122,13 +122,7 @@ class StepCollection(OperationHandler):
 
     def operation_descriptors(self):
         return {
-            'order_elements': (
-                order_elements,
-                {
-                  'questionnaire_id': requests.uuid_regexp,
-                  'ids': [text_type],
-                }
-            )
+            'order_elements': (order_elements, requests.OpsOrderStepsDesc)
         }
 
 
@@ -139,7 +133,7 @@ class StepInstance(BaseHandler):
     /admin/step
     """
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'Step', 'Field'}
 
     def put(self, step_id):
         """
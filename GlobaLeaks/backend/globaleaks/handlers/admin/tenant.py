@@ -12,7 +12,7 @@ from globaleaks.db import db_refresh_memory_variables
 from globaleaks.db.appdata import db_update_defaults, load_appdata
 from globaleaks.handlers.admin import file
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests
 from globaleaks.utils.utility import log
 from globaleaks.settings import Settings
@@ -75,12 +75,12 @@ def db_get_tenant_list(session):
     return [serialize_tenant(session, tenant) for tenant in session.query(models.Tenant)]
 
 
-@transact
+@transact_ro
 def get_tenant_list(session):
     return db_get_tenant_list(session)
 
 
-@transact
+@transact_ro
 def get(session, id):
     return serialize_tenant(session, models.db_get(session, models.Tenant, models.Tenant.id == id))
 
@@ -105,7 +105,8 @@ class TenantCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     root_tenant_only = True
-    invalidate_cache = True
+    cache_tags = {'Tenant'}
+    invalidate_global_cache = True
     invalidate_tenant_states = True
 
     def get(self):
@@ -127,7 +128,7 @@ class TenantCollection(BaseHandler):
 
 class TenantInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_global_cache = True
     root_tenant_only = True
     invalidate_tenant_states = True
 
@@ -10,7 +10,7 @@ from globaleaks import models
 from globaleaks.db import db_refresh_memory_variables
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.user import parse_pgp_options, user_serialize_user
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests, errors
 from globaleaks.state import State
 from globaleaks.utils import security
@@ -175,7 +175,7 @@ def db_get_admin_users(session, tid):
             for user in session.query(models.User).filter(models.User.tid == tid, models.User.role ==u'admin')]
 
 
-@transact
+@transact_ro
 def get_user_list(session, tid, language):
     """
     Returns:
@@ -188,7 +188,8 @@ def get_user_list(session, tid, language):
 class UsersCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
-    invalidate_cache = True
+    cache_tags = {'User', 'UserImg'}
+    invalidate_cache = {'User'}
 
     def get(self):
         """
@@ -208,7 +209,7 @@ class UsersCollection(BaseHandler):
 
 class UserInstance(BaseHandler):
     check_roles = 'admin'
-    invalidate_cache = True
+    invalidate_cache = {'User'}
 
     def put(self, user_id):
         """
@@ -2,12 +2,11 @@
 #
 # Base class for all the handlers
 import base64
-import collections
 import copy
 import json
 import mimetypes
+import mmap
 import os
-import re
 import shutil
 
 from datetime import datetime
@@ -15,12 +14,17 @@ from cryptography.hazmat.primitives import constant_time
 from six import text_type, binary_type
 from twisted.internet import defer
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.interfaces import IPushProducer
+from twisted.web import http
+from zope.interface import implementer
 
 from globaleaks.event import track_handler
-from globaleaks.rest import errors, requests
-from globaleaks.utils.securetempfile import SecureTemporaryFile
+from globaleaks.orm import record_query_profile
+from globaleaks.rest import errors
+from globaleaks.rest.validator import get_validator
 from globaleaks.utils.security import generateRandomKey, sha512
 from globaleaks.settings import Settings
+from globaleaks.utils.chunkedupload import ChunkedUpload, UploadQuota, UPLOAD_QUOTA_FILES
 from globaleaks.utils.tempdict import TempDict
 from globaleaks.utils.utility import datetime_now, deferred_sleep, log
 
@@ -49,49 +53,113 @@ mimetypes.add_type('application/woff', '.woff')
 mimetypes.add_type('application/woff2', '.woff2')
 
 
+def parse_byte_range(value, size):
+    """
+    Return the inclusive bounds of the single byte range specified by the
+    value of a Range header or None if the header should be ignored
+
+    @raise RangeNotSatisfiable: if the range does not overlap the content
+    """
+    unit, _, ranges = value.partition(b'=')
+    if unit.strip().lower() != b'bytes' or b',' in ranges:
+        # multiple ranges could be served as a whole
+        return None
+
+    first, sep, last = ranges.strip().partition(b'-')
+
+    try:
+        if not sep:
+            return None
+
+        if not first:
+            # suffix range of the last bytes of the content
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise errors.RangeNotSatisfiable(size)
+
+            return max(0, size - length), size - 1
+
+        first = int(first)
+        last = int(last) if last else None
+    except ValueError:
+        return None
+
+    if first < 0 or (last is not None and last < first):
+        return None
+
+    if first >= size:
+        raise errors.RangeNotSatisfiable(size)
+
+    return first, size - 1 if last is None else min(last, size - 1)
+
+
+@implementer(IPushProducer)
 class FileProducer(object):
     """
     Streaming producer for files
 
+    The file is mapped in memory and written to the request while the
+    transport accepts data, pausing whenever its buffer is full.
+
     @ivar request: The L{IRequest} to write the contents of the file to.
     @ivar fileObject: The file the contents of which to write to the request.
     """
     bufferSize = Settings.file_chunk_size
 
-    def __init__(self, request, filePath):
+    def __init__(self, request, filePath, offset=0, size=None):
         self.finish = defer.Deferred()
         self.request = request
-        self.fileSize = os.stat(filePath).st_size
+        self.filePath = filePath
         self.fileObject = open(filePath, "rb")
-        self.bytesWritten = 0
+        self.fileSize = os.fstat(self.fileObject.fileno()).st_size
+        self.offset = offset
+        self.end = offset + size if size is not None else self.fileSize
+        self.paused = False
+
+        # empty files could not be mapped
+        self.data = mmap.mmap(self.fileObject.fileno(), 0, access=mmap.ACCESS_READ) if self.fileSize else b''
 
     def start(self):
-        self.request.registerProducer(self, False)
+        self.request.registerProducer(self, True)
+        self.resumeProducing()
         return self.finish
 
     def resumeProducing(self):
-        try:
-            if self.request is not None:
-                data = self.fileObject.read(self.bufferSize)
-                if data:
-                    self.bytesWritten += len(data)
-                    self.request.write(data)
+        self.paused = False
 
-                if self.bytesWritten == self.fileSize:
-                    self.stopProducing()
-        except:
-            pass
+        try:
+            while self.request is not None and not self.paused and self.offset < self.end:
+                end = min(self.offset + self.bufferSize, self.end)
+                data = self.data[self.offset:end]
+                self.offset = end
+                self.request.write(data)
+        except (IOError, OSError, ValueError) as e:
+            # the length of the content has already been sent so the response could only be aborted
+            log.err("Unable to stream file %s: %s", self.filePath, e)
+            self.request.unregisterProducer()
+            self.request.transport.loseConnection()
+            self.stopProducing()
+            return
+
+        if self.request is not None and self.offset >= self.end:
+            self.request.unregisterProducer()
+            self.request.finish()
+            self.stopProducing()
+
+    def pauseProducing(self):
+        self.paused = True
 
     def stopProducing(self):
-        try:
-            if self.request is not None:
-                self.fileObject.close()
-                self.request.unregisterProducer()
-                self.request.finish()
-                self.request = None
-                self.finish.callback(None)
-        except:
-            pass
+        if self.request is None:
+            return
+
+        self.request = None
+
+        if self.fileSize:
+            self.data.close()
+
+        self.fileObject.close()
+        self.finish.callback(None)
 
 
 class Session(object):
@@ -126,13 +194,19 @@ class BaseHandler(object):
     handler_exec_time_threshold = HANDLER_EXEC_TIME_THRESHOLD
     uniform_answer_time = False
     cache_resource = False
+    # models and config groups the cached resource depends on (None means any)
+    cache_tags = None
     invalidate_global_cache = False
+    # True or the set of models and config groups modified by the handler
     invalidate_cache = False
     invalidate_tenant_states = False
     bypass_basic_auth = False
     root_tenant_only = False
     upload_handler = False
     uploaded_file = None
+    # maximum size in bytes of the body of the requests (the limit of the
+    # upload handlers is the maximum file size configured for the tenant)
+    max_body_size = 1024 * 1024
     require_multisite = False
 
     def __init__(self, state, request):
@@ -206,151 +280,6 @@ class BaseHandler(object):
             self.request.setHeader("WWW-Authenticate", "Basic realm=\"globaleaks\"")
             raise errors.HTTPAuthenticationRequired()
 
-    @staticmethod
-    def validate_python_type(value, python_type):
-        """
-        Return True if the python class instantiates the specified python_type.
-        """
-        if value is None:
-            return True
-
-        if python_type == requests.SkipSpecificValidation:
-            return True
-
-        if python_type == int:
-            try:
-                int(value)
-                return True
-            except:
-                return False
-
-        if python_type == bool:
-            if value == u'true' or value == u'false':
-                return True
-
-        return isinstance(value, python_type)
-
-    @staticmethod
-    def validate_regexp(value, type):
-        """
-        Return True if the python class matches the given regexp.
-        """
-        try:
-            value = text_type(value)
-        except:
-            return False
-
-        return bool(re.match(type, value))
-
-    @staticmethod
-    def validate_type(value, type):
-        retval = False
-
-        if value is None:
-            log.err("-- Invalid python_type, in [%s] expected %s", value, type)
-
-        # if it's callable, than assumes is a primitive class
-        elif callable(type):
-            retval = BaseHandler.validate_python_type(value, type)
-            if not retval:
-                log.err("-- Invalid python_type, in [%s] expected %s", value, type)
-
-        # value as "{foo:bar}"
-        elif isinstance(type, collections.Mapping):
-            retval = BaseHandler.validate_jmessage(value, type)
-            if not retval:
-                log.err("-- Invalid JSON/dict [%s] expected %s", value, type)
-
-        # regexp
-        elif isinstance(type, str):
-            retval = BaseHandler.validate_regexp(value, type)
-            if not retval:
-                log.err("-- Failed Match in regexp [%s] against %s", value, type)
-
-        # value as "[ type ]"
-        elif isinstance(type, collections.Iterable):
-            # empty list is ok
-            if not value:
-                retval = True
-
-            else:
-                retval = all(BaseHandler.validate_type(x, type[0]) for x in value)
-                if not retval:
-                    log.err("-- List validation failed [%s] of %s", value, type)
-
-        return retval
-
-    @staticmethod
-    def validate_jmessage(jmessage, message_template):
-        """
-        Takes a string that represents a JSON messages and checks to see if it
-        conforms to the message type it is supposed to be.
-
-        This message must be either a dict or a list. This function may be called
-        recursively to validate sub-parameters that are also go GLType.
-
-        message: the message string that should be validated
-
-        message_type: the GLType class it should match.
-        """
-        if isinstance(message_template, dict):
-            success_check = 0
-            keys_to_strip = []
-            for key, value in jmessage.items():
-                if key not in message_template:
-                    # strip whatever is not validated
-                    #
-                    # reminder: it's not possible to raise an exception for the
-                    # in case more values are present because it's normal that the
-                    # client will send automatically more data.
-                    #
-                    # e.g. the client will always send 'creation_date' attributes of
-                    #      objects and attributes like this are present generally only
-                    #      from the second request on.
-                    #
-                    keys_to_strip.append(key)
-                    continue
-
-                if not BaseHandler.validate_type(value, message_template[key]):
-                    log.err("Received key %s: type validation fail", key)
-                    raise errors.InputValidationError("Key (%s) type validation failure" % key)
-                success_check += 1
-
-            for key in keys_to_strip:
-                del jmessage[key]
-
-            for key, value in message_template.items():
-                if key not in jmessage:
-                    log.debug("Key %s expected but missing!",  key)
-                    log.debug("Received schema %s - Expected %s",
-                              jmessage.keys(), message_template.keys())
-                    raise errors.InputValidationError("Missing key %s" % key)
-
-                if not BaseHandler.validate_type(jmessage[key], value):
-                    log.err("Expected key: %s type validation failure", key)
-                    raise errors.InputValidationError("Key (%s) double validation failure" % key)
-
-                if isinstance(message_template[key], dict) or isinstance(message_template[key], list):
-                    if message_template[key]:
-                        BaseHandler.validate_jmessage(jmessage[key], message_template[key])
-
-                success_check += 1
-
-            if success_check != len(message_template) * 2:
-                log.err("Success counter double check failure: %d", success_check)
-                raise errors.InputValidationError("Success counter double check failure")
-
-            return True
-
-        elif isinstance(message_template, list):
-            if not all(BaseHandler.validate_type(x, message_template[0]) for x in jmessage):
-                raise errors.InputValidationError("Not every element in %s is %s" %
-                                                (jmessage, message_template[0]))
-            return True
-
-        else:
-            raise errors.InputValidationError("invalid json massage: expected dict or list")
-
     @staticmethod
     def validate_message(message, message_template):
         try:
@@ -361,10 +290,9 @@ class BaseHandler(object):
         except ValueError:
             raise errors.InputValidationError("Invalid JSON format")
 
-        if BaseHandler.validate_jmessage(jmessage, message_template):
-            return jmessage
+        get_validator(message_template)(jmessage)
 
-        raise errors.InputValidationError("Unexpected condition!?")
+        return jmessage
 
     def redirect(self, url):
         self.request.setResponseCode(301)
@@ -383,7 +311,7 @@ class BaseHandler(object):
         if mime_type:
             self.request.setHeader("Content-Type", mime_type)
 
-        return FileProducer(self.request, filepath).start()
+        return self.stream_file(filepath)
 
     def force_file_download(self, filename, filepath):
         if not os.path.exists(filepath) or not os.path.isfile(filepath):
@@ -393,7 +321,40 @@ class BaseHandler(object):
         self.request.setHeader('Content-Type', 'application/octet-stream')
         self.request.setHeader('Content-Disposition', 'attachment; filename=\"%s\"' % filename)
 
-        return FileProducer(self.request, filepath).start()
+        return self.stream_file(filepath)
+
+    def stream_file(self, filepath):
+        """
+        Stream the file honoring the Range and If-Range headers of the
+        request so that interrupted downloads could be resumed
+        """
+        stat = os.stat(filepath)
+        etag = b'"%x-%x"' % (stat.st_size, int(stat.st_mtime))
+        last_modified = http.datetimeToString(stat.st_mtime)
+
+        self.request.setHeader(b'Accept-Ranges', b'bytes')
+        self.request.setHeader(b'ETag', etag)
+        self.request.setHeader(b'Last-Modified', last_modified)
+
+        offset, size = 0, stat.st_size
+
+        byte_range = self.request.getHeader(b'range')
+        if_range = self.request.getHeader(b'if-range')
+        if byte_range is not None and (if_range is None or if_range in (etag, last_modified)):
+            try:
+                bounds = parse_byte_range(byte_range, stat.st_size)
+            except errors.RangeNotSatisfiable:
+                self.request.setHeader(b'Content-Range', b'bytes */%d' % stat.st_size)
+                raise
+
+            if bounds is not None:
+                offset, size = bounds[0], bounds[1] - bounds[0] + 1
+                self.request.setResponseCode(206)
+                self.request.setHeader(b'Content-Range', b'bytes %d-%d/%d' % (bounds[0], bounds[1], stat.st_size))
+
+        self.request.setHeader(b'Content-Length', b'%d' % size)
+
+        return FileProducer(self.request, filepath, offset, size).start()
 
     def get_current_user(self):
         api_session = self.get_api_session()
@@ -444,30 +405,80 @@ class BaseHandler(object):
             return self.state.api_token_session
         return None
 
+    def get_chunked_upload(self):
+        """
+        Return the key and the upload the chunk of the request belongs to
+
+        The uploads are owned by the session of the user or, for the
+        unauthenticated ones, by the submission token carried in the path
+        """
+        owner = self.current_user.id if self.current_user is not None else self.request.path
+        key = (self.request.tid, owner, self.request.args[b'flowIdentifier'][0])
+
+        return key, self.state.TempUploads.get(key)
+
+    def check_file_chunk(self, *args):
+        """
+        Answer the testChunks requests issued by Flow.js to resume an upload
+        skipping the chunks already received
+        """
+        try:
+            key, upload = self.get_chunked_upload()
+            chunk_number = int(self.request.args[b'flowChunkNumber'][0])
+        except (KeyError, ValueError):
+            raise errors.InputValidationError("Invalid upload chunk")
+
+        if upload is None or not upload.has_chunk(chunk_number):
+            self.request.setResponseCode(204)
+        else:
+            self.request.setResponseCode(200)
+
+    @inlineCallbacks
     def process_file_upload(self):
         if b'flowFilename' not in self.request.args:
-            return None
+            return
 
-        total_file_size = int(self.request.args[b'flowTotalSize'][0])
-        flow_identifier = self.request.args[b'flowIdentifier'][0]
+        try:
+            total_file_size = int(self.request.args[b'flowTotalSize'][0])
+            total_chunks = int(self.request.args[b'flowTotalChunks'][0])
+            chunk_size = int(self.request.args[b'flowChunkSize'][0])
+            chunk_number = int(self.request.args[b'flowChunkNumber'][0])
+            key, upload = self.get_chunked_upload()
+        except (KeyError, ValueError):
+            raise errors.InputValidationError("Invalid upload chunk")
 
-        chunk_size = len(self.request.args[b'file'][0])
-        if ((chunk_size / (1024 * 1024)) > self.state.tenant_cache[self.request.tid].maximum_filesize or
+        chunk = self.request.args[b'file'][0]
+
+        if ((len(chunk) / (1024 * 1024)) > self.state.tenant_cache[self.request.tid].maximum_filesize or
             (total_file_size / (1024 * 1024)) > self.state.tenant_cache[self.request.tid].maximum_filesize):
             log.err("File upload request rejected: file too big", tid=self.request.tid)
             raise errors.FileTooBig(self.state.tenant_cache[self.request.tid].maximum_filesize)
 
-        if flow_identifier not in self.state.TempUploadFiles:
-            self.state.TempUploadFiles.set(flow_identifier, SecureTemporaryFile(Settings.tmp_path))
+        if upload is None:
+            upload = ChunkedUpload(Settings.tmp_path, total_file_size, total_chunks, chunk_size)
+
+            # the declared size bounds every chunk and is reserved upfront
+            quota = self.state.TempUploadQuotas.get(key[:2])
+            if quota is None:
+                quota = UploadQuota(UPLOAD_QUOTA_FILES * self.state.tenant_cache[self.request.tid].maximum_filesize * 1024 * 1024)
+                self.state.TempUploadQuotas.set(key[:2], quota)
 
-        f = self.state.TempUploadFiles[flow_identifier]
-        with f.open('w') as f:
-            f.write(self.request.args[b'file'][0])
+            quota.charge(total_file_size)
 
-            if self.request.args[b'flowChunkNumber'][0] != self.request.args[b'flowTotalChunks'][0]:
-                return None
-            else:
-                f.finalize_write()
+            self.state.TempUploads.set(key, upload)
+        elif not upload.match(total_file_size, total_chunks, chunk_size):
+            raise errors.InputValidationError("Upload chunk not matching the previous ones")
+
+        yield upload.write_chunk(chunk_number, chunk)
+
+        # the upload could have been completed by a chunk received in parallel
+        if not upload.complete or key not in self.state.TempUploads:
+            return
+
+        self.state.TempUploads.delete(key)
+
+        f = upload.file
+        self.state.TempUploadFiles.set(key, f)
 
         mime_type, _ = mimetypes.guess_type(text_type(self.request.args[b'flowFilename'][0], 'utf-8'))
         if mime_type is None:
@@ -513,6 +524,10 @@ class BaseHandler(object):
             log.err(tid=self.request.tid, *err_tup)
             self.state.schedule_exception_email(*err_tup)
 
+        query_profile = getattr(self.request, 'query_profile', None)
+        if query_profile is not None:
+            record_query_profile('%s.%s' % (self.name, self.request.method.lower()), query_profile)
+
         track_handler(self)
 
         if self.uniform_answer_time:
@@ -3,21 +3,21 @@
 # Handlers dealing with custodian user functionalities
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.models.serializers import db_prepare_tip_serialization
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now
 
 
-def serialize_identityaccessrequest(session, tid, identityaccessrequest):
-    itip, user = session.query(models.InternalTip, models.User) \
-                      .filter(models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                              models.ReceiverTip.id == identityaccessrequest.receivertip_id,
-                              models.ReceiverTip.receiver_id == models.User.id,
-                              models.User.tid == tid).one()
+def serialize_identityaccessrequest(session, tid, identityaccessrequest, data=None):
+    if data is None:
+        data = db_prepare_tip_serialization(session, iars=[identityaccessrequest])
+
+    rtip = data['rtips'][identityaccessrequest.receivertip_id]
+    itip = data['itips'][rtip.internaltip_id]
+    user = data['users'][rtip.receiver_id]
+    reply_user = data['users'].get(identityaccessrequest.reply_user_id)
 
-    reply_user = session.query(models.User) \
-                      .filter(models.User.id == identityaccessrequest.reply_user_id,
-                              models.User.tid == tid).one_or_none()
     return {
         'id': identityaccessrequest.id,
         'receivertip_id': identityaccessrequest.receivertip_id,
@@ -34,19 +34,26 @@ def serialize_identityaccessrequest(session, tid, identityaccessrequest):
 
 
 def db_get_identityaccessrequest_list(session, tid, rtip_id):
-    return [serialize_identityaccessrequest(session, tid, iar) for iar in session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.receivertip_id == rtip_id)]
+    iars = session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.receivertip_id == rtip_id).all()
 
+    data = db_prepare_tip_serialization(session, iars=iars)
 
-@transact
+    return [serialize_identityaccessrequest(session, tid, iar, data) for iar in iars]
+
+
+@transact_ro
 def get_identityaccessrequest_list(session, tid):
-    return [serialize_identityaccessrequest(session, tid, iar)
-        for iar in session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.reply == u'pending',
-                                                                      models.IdentityAccessRequest.receivertip_id == models.ReceiverTip.id,
-                                                                      models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                                      models.InternalTip.tid == tid)]
+    iars = session.query(models.IdentityAccessRequest).filter(models.IdentityAccessRequest.reply == u'pending',
+                                                              models.IdentityAccessRequest.receivertip_id == models.ReceiverTip.id,
+                                                              models.ReceiverTip.internaltip_id == models.InternalTip.id,
+                                                              models.InternalTip.tid == tid).all()
 
+    data = db_prepare_tip_serialization(session, iars=iars)
 
-@transact
+    return [serialize_identityaccessrequest(session, tid, iar, data) for iar in iars]
+
+
+@transact_ro
 def get_identityaccessrequest(session, tid, identityaccessrequest_id):
     iar = session.query(models.IdentityAccessRequest) \
                .filter(models.IdentityAccessRequest.id == identityaccessrequest_id,
@@ -42,24 +42,29 @@ def get_tip_export(session, tid, user_id, rtip_id, language):
         'files': []
     }
 
-    export_template = Templating().format_template(export_dict['notification']['export_template'], export_dict).encode('utf-8')
+    export_template = Templating(tid, language).format_template(export_dict['notification']['export_template'], export_dict, 'export_template').encode('utf-8')
 
     export_template = msdos_encode(text_type(export_template, 'utf-8'))
 
     export_dict['files'].append({'buf': export_template, 'name': "data.txt"})
 
-    for rfile in session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip_id):
+    rfiles = session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip_id).all()
+    wbfiles = session.query(models.WhistleblowerFile).filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
+                                                             models.ReceiverTip.internaltip_id == rtip.internaltip_id,
+                                                             models.InternalTip.id == rtip.internaltip_id).all()
+
+    data = models.serializers.db_prepare_tip_serialization(session, rfiles=rfiles, wbfiles=wbfiles)
+
+    for rfile in rfiles:
         rfile.last_access = datetime_now()
         rfile.downloads += 1
-        file_dict = models.serializers.serialize_rfile(session, tid, rfile)
+        file_dict = models.serializers.serialize_rfile(session, tid, rfile, data)
         file_dict['name'] = 'files/' + file_dict['name']
         file_dict['path'] = os.path.join(Settings.attachments_path, file_dict['filename'])
         export_dict['files'].append(file_dict)
 
-    for wf in session.query(models.WhistleblowerFile).filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
-                                                             models.ReceiverTip.internaltip_id == rtip.internaltip_id,
-                                                             models.InternalTip.id == rtip.internaltip_id):
-        file_dict = models.serializers.serialize_wbfile(session, tid, wf)
+    for wf in wbfiles:
+        file_dict = models.serializers.serialize_wbfile(session, tid, wf, data)
         file_dict['name'] = 'files_from_recipients/' + file_dict['name']
         file_dict['path'] = os.path.join(Settings.attachments_path, file_dict['filename'])
         export_dict['files'].append(file_dict)
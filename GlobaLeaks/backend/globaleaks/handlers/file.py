@@ -8,9 +8,9 @@ from twisted.internet import defer
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 
-@transact
+@transact_ro
 def get_file_id(session, tid, name):
     return models.db_get(session, models.File, models.File.tid == tid, models.File.name == text_type(name)).id
 
@@ -5,7 +5,7 @@ import os
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 from globaleaks.rest import errors
 from globaleaks.utils.security import directory_traversal_check
 from globaleaks.settings import Settings
@@ -16,7 +16,7 @@ def langfile_path(lang):
     return os.path.abspath(os.path.join(Settings.client_path, 'l10n', '%s.json' % lang))
 
 
-@transact
+@transact_ro
 def get_l10n(session, tid, lang):
     path = langfile_path(lang)
     directory_traversal_check(Settings.client_path, path)
@@ -37,6 +37,7 @@ def get_l10n(session, tid, lang):
 class L10NHandler(BaseHandler):
     check_roles = '*'
     cache_resource = True
+    cache_tags = {'CustomTexts'}
 
     def get(self, lang):
         return get_l10n(self.request.tid, lang)
@@ -3,6 +3,7 @@
 # Base class for implementing handlers for executing commands/operations
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.rest import errors, requests
+from globaleaks.rest.validator import get_validator
 
 
 class OperationHandler(BaseHandler):
@@ -18,6 +19,6 @@ class OperationHandler(BaseHandler):
 
         func, obj_validator = op_desc
         if obj_validator is not None:
-            self.validate_jmessage(request['args'], obj_validator)
+            get_validator(obj_validator)(request['args'])
 
         return func(self, request['args'], *args, **kwargs)
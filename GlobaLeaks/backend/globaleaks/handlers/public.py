@@ -7,7 +7,7 @@ from globaleaks import models, LANGUAGES_SUPPORTED, LANGUAGES_SUPPORTED_CODES
 from globaleaks.handlers.admin.file import db_get_file
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models.config import ConfigFactory, NodeL10NFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 from globaleaks.state import State
 from globaleaks.utils.sets import merge_dicts
 from globaleaks.utils.structures import get_localized_values
@@ -381,7 +381,7 @@ def db_get_public_receiver_list(session, tid, language):
     return ret
 
 
-@transact
+@transact_ro
 def get_public_resources(session, tid, language):
     return {
         'node': db_serialize_node(session, tid, language),
@@ -394,6 +394,8 @@ def get_public_resources(session, tid, language):
 class PublicResource(BaseHandler):
     check_roles = '*'
     cache_resource = True
+    cache_tags = {'Config', 'ConfigL10N', 'EnabledLanguage', 'File',
+                  'Context', 'ContextImg', 'Questionnaire', 'Step', 'Field', 'User', 'UserImg'}
 
     def get(self):
         """
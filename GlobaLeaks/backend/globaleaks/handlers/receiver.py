@@ -1,19 +1,30 @@
 # -*- coding: utf-8 -*-
 #
 # API handling recipient user functionalities
-from sqlalchemy.sql.expression import func, distinct
+import base64
+from datetime import datetime
+
+from six import text_type
+from sqlalchemy.sql.expression import and_, func, distinct, not_, or_
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.rtip import db_postpone_expiration_date, db_delete_itip
-from globaleaks.handlers.submission import db_serialize_archived_preview_schema
+from globaleaks.handlers.submission import db_get_archived_preview_schema
 from globaleaks.handlers.user import db_user_update_user
 from globaleaks.handlers.user import user_serialize_user
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests, errors
 from globaleaks.state import State
 from globaleaks.utils.structures import get_localized_values
-from globaleaks.utils.utility import datetime_to_ISO8601
+from globaleaks.utils.utility import datetime_to_ISO8601, ISO8601_to_datetime
+
+
+# maximum number of tips returned by a single page of /receiver/tips
+TIPS_PAGE_MAX_SIZE = 500
+
+TIPS_CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
 
 
 def receiver_serialize_receiver(session, tid, receiver, user, language):
@@ -37,7 +48,7 @@ def receiver_serialize_receiver(session, tid, receiver, user, language):
     return get_localized_values(ret_dict, receiver, receiver.localized_keys, language)
 
 
-@transact
+@transact_ro
 def get_receiver_settings(session, tid, receiver_id, language):
     receiver, user = session.query(models.Receiver, models.User) \
                             .filter(models.Receiver.id == receiver_id,
@@ -61,55 +72,114 @@ def update_receiver_settings(session, state, tid, receiver_id, request, language
     return receiver_serialize_receiver(session, tid, receiver, user, language)
 
 
-@transact
-def get_receivertip_list(session, tid, receiver_id, language):
+def serialize_tips_cursor(rtip, itip):
+    """
+    Serialize the opaque cursor pointing after the specified tip
+    """
+    cursor = u'%s|%s' % (itip.update_date.strftime(TIPS_CURSOR_DATE_FORMAT), rtip.id)
+
+    return text_type(base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('utf-8'))
+
+
+def parse_tips_cursor(cursor):
+    """
+    Parse an opaque cursor returning the tuple (update_date, rtip_id)
+    """
+    try:
+        update_date, rtip_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(u'|')
+        return datetime.strptime(update_date, TIPS_CURSOR_DATE_FORMAT), rtip_id
+    except (TypeError, ValueError):
+        raise errors.InputValidationError('Invalid cursor')
+
+
+def db_get_receivertip_page(session, tid, receiver_id, language, filters=None, cursor=None, limit=None):
+    """
+    Return a page of the summary list of the tips of a receiver ordered
+    by update date and id starting after the specified cursor.
+
+    :return: a tuple (tips, next_cursor) where next_cursor is None on the last page
+    """
+    filters = filters or {}
     rtip_summary_list = []
+    next_cursor = None
+
+    query = session.query(models.ReceiverTip, models.InternalTip) \
+                   .filter(models.ReceiverTip.receiver_id == receiver_id,
+                           models.ReceiverTip.internaltip_id == models.InternalTip.id,
+                           models.InternalTip.tid == tid)
+
+    if 'context_id' in filters:
+        query = query.filter(models.InternalTip.context_id == filters['context_id'])
+
+    if 'label' in filters:
+        query = query.filter(models.ReceiverTip.label == filters['label'])
+
+    if 'new' in filters:
+        new = or_(models.ReceiverTip.access_counter == 0,
+                  models.ReceiverTip.last_access < models.InternalTip.update_date)
+        query = query.filter(new if filters['new'] else not_(new))
+
+    if 'expiration_from' in filters:
+        query = query.filter(models.InternalTip.expiration_date >= filters['expiration_from'])
+
+    if 'expiration_to' in filters:
+        query = query.filter(models.InternalTip.expiration_date <= filters['expiration_to'])
 
-    rtips = session.query(models.ReceiverTip).filter(models.ReceiverTip.receiver_id == receiver_id,
-                                                     models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                     models.InternalTip.tid == tid)
+    if 'min_score' in filters:
+        query = query.filter(models.InternalTip.total_score >= filters['min_score'])
 
-    itips_ids = [rtip.internaltip_id for rtip in rtips]
+    if 'max_score' in filters:
+        query = query.filter(models.InternalTip.total_score <= filters['max_score'])
 
-    if not itips_ids:
-        return []
+    if cursor is not None:
+        update_date, rtip_id = parse_tips_cursor(cursor)
+        query = query.filter(or_(models.InternalTip.update_date < update_date,
+                                 and_(models.InternalTip.update_date == update_date,
+                                      models.ReceiverTip.id < rtip_id)))
+
+    query = query.order_by(models.InternalTip.update_date.desc(), models.ReceiverTip.id.desc())
+
+    if limit is not None:
+        query = query.limit(limit + 1)
+
+    rtips = query.all()
+
+    if limit is not None and len(rtips) > limit:
+        rtips = rtips[:limit]
+        next_cursor = serialize_tips_cursor(*rtips[-1])
+
+    if not rtips:
+        return [], None
+
+    rtips_ids = [rtip.id for rtip, _ in rtips]
+    itips_ids = [itip.id for _, itip in rtips]
 
-    itips_by_id = {}
-    aqs_by_itip = {}
     comments_by_itip = {}
     internalfiles_by_itip = {}
     messages_by_rtip = {}
+    preview_schemas = {}
 
-    for itip, archivedschema in session.query(models.InternalTip, models.ArchivedSchema) \
-                                     .filter(models.InternalTip.id.in_(itips_ids),
-                                             models.ArchivedSchema.hash == models.InternalTip.questionnaire_hash,
-                                             models.InternalTip.tid == tid):
-        itips_by_id[itip.id] = itip
-        aqs_by_itip[itip.id] = archivedschema
-
-    result = session.query(models.ReceiverTip.id, func.count(distinct(models.Message.id))) \
-                    .filter(models.ReceiverTip.receiver_id == receiver_id,
-                            models.ReceiverTip.id == models.Message.receivertip_id,
-                            models.InternalTip.id == models.ReceiverTip.internaltip_id).group_by(models.ReceiverTip.id)
+    result = session.query(models.Message.receivertip_id, func.count(distinct(models.Message.id))) \
+                    .filter(models.Message.receivertip_id.in_(rtips_ids)).group_by(models.Message.receivertip_id)
     for rtip_id, count in result:
         messages_by_rtip[rtip_id] = count
 
-    result = session.query(models.InternalTip.id, func.count(distinct(models.Comment.id))) \
-                    .filter(models.Comment.internaltip_id == models.InternalTip.id,
-                            models.InternalTip.id.in_(itips_ids)).group_by(models.InternalTip.id)
+    result = session.query(models.Comment.internaltip_id, func.count(distinct(models.Comment.id))) \
+                    .filter(models.Comment.internaltip_id.in_(itips_ids)).group_by(models.Comment.internaltip_id)
     for itip_id, count in result:
         comments_by_itip[itip_id] = count
 
-    result = session.query(models.InternalTip.id, func.count(distinct(models.InternalFile.id))) \
-                    .filter(models.InternalFile.internaltip_id == models.InternalTip.id,
-                            models.InternalTip.id.in_(itips_ids)).group_by(models.InternalTip.id)
+    result = session.query(models.InternalFile.internaltip_id, func.count(distinct(models.InternalFile.id))) \
+                    .filter(models.InternalFile.internaltip_id.in_(itips_ids)).group_by(models.InternalFile.internaltip_id)
     for itip_id, count in result:
         internalfiles_by_itip[itip_id] = count
 
-    for rtip in rtips:
-        internaltip = itips_by_id[rtip.internaltip_id]
-        archivedschema = aqs_by_itip[rtip.internaltip_id]
+    # the preview schema is looked up once for each of the distinct
+    # questionnaires referenced by the tips of the page
+    for questionnaire_hash in set(itip.questionnaire_hash for _, itip in rtips):
+        preview_schemas[questionnaire_hash] = db_get_archived_preview_schema(session, questionnaire_hash, language)
 
+    for rtip, internaltip in rtips:
         rtip_summary_list.append({
             'id': rtip.id,
             'creation_date': datetime_to_ISO8601(internaltip.creation_date),
@@ -125,14 +195,24 @@ def get_receivertip_list(session, tid, receiver_id, language):
             'comment_count': comments_by_itip.get(internaltip.id, 0),
             'message_count': messages_by_rtip.get(rtip.id, 0),
             'https': internaltip.https,
-            'preview_schema': db_serialize_archived_preview_schema(session, archivedschema.preview, language),
+            'preview_schema': preview_schemas[internaltip.questionnaire_hash],
             'preview': internaltip.preview,
             'total_score': internaltip.total_score,
             'label': rtip.label,
             'ext_network_prov': internaltip.ext_network_prov
         })
 
-    return rtip_summary_list
+    return rtip_summary_list, next_cursor
+
+
+@transact_ro
+def get_receivertip_page(session, tid, receiver_id, language, filters=None, cursor=None, limit=None):
+    return db_get_receivertip_page(session, tid, receiver_id, language, filters, cursor, limit)
+
+
+@transact_ro
+def get_receivertip_list(session, tid, receiver_id, language, filters=None):
+    return db_get_receivertip_page(session, tid, receiver_id, language, filters)[0]
 
 
 @transact
@@ -187,10 +267,62 @@ class TipsCollection(BaseHandler):
     """
     check_roles = 'receiver'
 
+    @inlineCallbacks
     def get(self):
-        return get_receivertip_list(self.request.tid,
-                                    self.current_user.user_id,
-                                    self.request.language)
+        filters, cursor, limit = self.parse_tips_query(self.request.args)
+
+        tips, next_cursor = yield get_receivertip_page(self.request.tid,
+                                                       self.current_user.user_id,
+                                                       self.request.language,
+                                                       filters, cursor, limit)
+
+        if next_cursor is not None:
+            self.request.setHeader(b'X-Next-Cursor', next_cursor.encode('utf-8'))
+
+        returnValue(tips)
+
+    @staticmethod
+    def parse_tips_query(args):
+        """
+        Parse the query arguments used to filter and paginate the list
+
+        :return: a tuple (filters, cursor, limit)
+        """
+        def arg(name):
+            name = name.encode('utf-8')
+            return args[name][0].decode('utf-8') if name in args else None
+
+        filters = {}
+
+        try:
+            for key in ['context_id', 'label']:
+                if arg(key) is not None:
+                    filters[key] = arg(key)
+
+            if arg('new') is not None:
+                if arg('new') not in (u'true', u'false'):
+                    raise ValueError
+                filters['new'] = arg('new') == u'true'
+
+            for key in ['expiration_from', 'expiration_to']:
+                if arg(key) is not None:
+                    filters[key] = ISO8601_to_datetime(arg(key))
+
+            for key in ['min_score', 'max_score']:
+                if arg(key) is not None:
+                    filters[key] = int(arg(key))
+
+            limit = arg('limit')
+            if limit is not None:
+                limit = int(limit)
+                if not 0 < limit <= TIPS_PAGE_MAX_SIZE:
+                    raise ValueError
+
+            cursor = arg('cursor')
+        except ValueError:
+            raise errors.InputValidationError('Invalid tips query')
+
+        return filters, cursor, limit
 
 
 class TipsOperations(BaseHandler):
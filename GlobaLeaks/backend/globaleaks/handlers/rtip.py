@@ -4,28 +4,28 @@
 import os
 import string
 
-from six import text_type
-from twisted.internet import threads
 from twisted.internet.defer import returnValue, inlineCallbacks
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.handlers.custodian import serialize_identityaccessrequest, db_get_identityaccessrequest_list
+from globaleaks.handlers.custodian import serialize_identityaccessrequest
 from globaleaks.handlers.operation import OperationHandler
 from globaleaks.handlers.submission import serialize_usertip
 from globaleaks.models import serializers
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
 from globaleaks.settings import Settings
+from globaleaks.utils.securetempfile import run_in_thread_pool
 from globaleaks.utils.security import directory_traversal_check
 from globaleaks.state import State
 from globaleaks.utils.utility import log, get_expiration, datetime_now, datetime_never, \
     datetime_to_ISO8601
 
-def receiver_serialize_rfile(session, rfile):
-    ifile = session.query(models.InternalFile) \
-                   .filter(models.InternalFile.id == models.ReceiverFile.internalfile_id,
-                           models.ReceiverFile.id == rfile.id).one()
+def receiver_serialize_rfile(session, rfile, data=None):
+    if data is None:
+        data = serializers.db_prepare_tip_serialization(session, rfiles=[rfile])
+
+    ifile = data['ifiles'][rfile.internalfile_id]
 
     if rfile.status == 'unavailable':
         return {
@@ -54,8 +54,11 @@ def receiver_serialize_rfile(session, rfile):
     }
 
 
-def receiver_serialize_wbfile(session, wbfile):
-    rtip = models.db_get(session, models.ReceiverTip, models.ReceiverTip.id == wbfile.receivertip_id)
+def receiver_serialize_wbfile(session, wbfile, data=None):
+    if data is None:
+        data = serializers.db_prepare_tip_serialization(session, wbfiles=[wbfile])
+
+    rtip = data['rtips'][wbfile.receivertip_id]
 
     return {
         'id': wbfile.id,
@@ -69,14 +72,16 @@ def receiver_serialize_wbfile(session, wbfile):
     }
 
 
-def serialize_comment(session, comment):
+def serialize_comment(session, comment, data=None):
     author = 'Recipient'
 
     if comment.type == 'whistleblower':
         author = 'Whistleblower'
     elif comment.author_id is not None:
-        author = session.query(models.User) \
-                        .filter(models.User.id == comment.author_id).one().name
+        if data is None:
+            data = serializers.db_prepare_tip_serialization(session, comments=[comment])
+
+        author = data['users'][comment.author_id].name
 
     return {
         'id': comment.id,
@@ -87,14 +92,14 @@ def serialize_comment(session, comment):
     }
 
 
-def serialize_message(session, message):
+def serialize_message(session, message, data=None):
     if message.type == 'whistleblower':
         author = 'Whistleblower'
     else:
-        author = session.query(models.User) \
-                        .filter(models.User.id == models.ReceiverTip.receiver_id,
-                                models.ReceiverTip.id == models.Message.receivertip_id,
-                                models.Message.id == message.id).one().name
+        if data is None:
+            data = serializers.db_prepare_tip_serialization(session, messages=[message])
+
+        author = data['users'][data['rtips'][message.receivertip_id].receiver_id].name
 
     return {
         'id': message.id,
@@ -113,20 +118,33 @@ def serialize_rtip(session, rtip, itip, language, is_sensitive_data_visible=Fals
 
     ret = serialize_usertip(session, rtip, itip, language, is_sensitive_data_visible)
 
+    # the child collections are serialized from in memory maps loaded
+    # with a constant number of queries independently of their size
+    comments = session.query(models.Comment).filter(models.Comment.internaltip_id == itip.id).all()
+    messages = session.query(models.Message).filter(models.Message.receivertip_id == rtip.id).all()
+    rfiles = session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == rtip.id).all()
+    wbfiles = session.query(models.WhistleblowerFile) \
+                     .filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
+                             models.ReceiverTip.internaltip_id == itip.id).all()
+    iars = session.query(models.IdentityAccessRequest) \
+                  .filter(models.IdentityAccessRequest.receivertip_id == rtip.id).all()
+
+    data = serializers.db_prepare_tip_serialization(session, comments, messages, rfiles, wbfiles, iars)
+
     ret['id'] = rtip.id
     ret['receiver_id'] = user_id
     ret['label'] = rtip.label
-    ret['comments'] = db_get_itip_comment_list(session, itip.tid, itip)
-    ret['messages'] = db_get_itip_message_list(session, itip.tid, rtip)
-    ret['rfiles'] = db_receiver_get_rfile_list(session, itip.tid, rtip.id)
-    ret['wbfiles'] = db_receiver_get_wbfile_list(session, itip.tid, itip.id)
-    ret['iars'] = db_get_identityaccessrequest_list(session, itip.tid, rtip.id)
+    ret['comments'] = [serialize_comment(session, comment, data) for comment in comments]
+    ret['messages'] = [serialize_message(session, message, data) for message in messages]
+    ret['rfiles'] = [receiver_serialize_rfile(session, rfile, data) for rfile in rfiles]
+    ret['wbfiles'] = [receiver_serialize_wbfile(session, wbfile, data) for wbfile in wbfiles]
+    ret['iars'] = [serialize_identityaccessrequest(session, itip.tid, iar, data) for iar in iars]
     ret['enable_notifications'] = bool(rtip.enable_notifications)
 
     if receiver.two_step_login_enabled:
         ret['control_mail_list'] = receiver.control_mail_1+";"+receiver.control_mail_2+";"+receiver.control_mail_3
-	else:
-		ret['control_mail_list'] = None
+    else:
+        ret['control_mail_list'] = None
 
     return ret
 
@@ -165,23 +183,21 @@ def db_receiver_get_rfile_list(session, tid, rtip_id):
                     .filter(models.ReceiverFile.receivertip_id == models.ReceiverTip.id,
                             models.ReceiverTip.id == rtip_id,
                             models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                            models.InternalTip.tid == tid)
+                            models.InternalTip.tid == tid).all()
 
-    return [receiver_serialize_rfile(session, rfile) for rfile in rfiles]
+    data = serializers.db_prepare_tip_serialization(session, rfiles=rfiles)
 
+    return [receiver_serialize_rfile(session, rfile, data) for rfile in rfiles]
 
-def db_receiver_get_wbfile_list(session, tid, itip_id):
-    rtips = session.query(models.ReceiverTip) \
-                   .filter(models.ReceiverTip.internaltip_id == itip_id)
 
-    rtips_ids = [rt.id for rt in rtips]
+def db_receiver_get_wbfile_list(session, tid, itip_id):
+    wbfiles = session.query(models.WhistleblowerFile) \
+                     .filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
+                             models.ReceiverTip.internaltip_id == itip_id).all()
 
-    wbfiles = []
-    if rtips_ids:
-        wbfiles = session.query(models.WhistleblowerFile) \
-                        .filter(models.WhistleblowerFile.receivertip_id.in_(rtips_ids))
+    data = serializers.db_prepare_tip_serialization(session, wbfiles=wbfiles)
 
-    return [receiver_serialize_wbfile(session, wbfile) for wbfile in wbfiles]
+    return [receiver_serialize_wbfile(session, wbfile, data) for wbfile in wbfiles]
 
 
 @transact
@@ -331,7 +347,11 @@ def get_rtip(session, tid, user_id, rtip_id, language, is_sensitive_data_visible
 
 
 def db_get_itip_comment_list(session, tid, itip):
-    return [serialize_comment(session, comment) for comment in session.query(models.Comment).filter(models.Comment.internaltip_id == itip.id)]
+    comments = session.query(models.Comment).filter(models.Comment.internaltip_id == itip.id).all()
+
+    data = serializers.db_prepare_tip_serialization(session, comments=comments)
+
+    return [serialize_comment(session, comment, data) for comment in comments]
 
 
 @transact
@@ -365,7 +385,11 @@ def create_comment(session, tid, user_id, rtip_id, request):
 
 
 def db_get_itip_message_list(session, tid, rtip):
-    return [serialize_message(session, message) for message in session.query(models.Message).filter(models.Message.receivertip_id == rtip.id)]
+    messages = session.query(models.Message).filter(models.Message.receivertip_id == rtip.id).all()
+
+    data = serializers.db_prepare_tip_serialization(session, messages=messages)
+
+    return [serialize_message(session, message, data) for message in messages]
 
 
 @transact
@@ -413,10 +437,8 @@ class RTipInstance(OperationHandler):
     def operation_descriptors(self):
         return {
           'postpone_expiration': (RTipInstance.postpone_expiration, None),
-          'set': (RTipInstance.set_tip_val,
-                  {'key': '^(enable_two_way_comments|enable_two_way_messages|enable_attachments|enable_notifications)$',
-                   'value': bool}),
-          'set_label': (RTipInstance.set_label, {'value': text_type})
+          'set': (RTipInstance.set_tip_val, requests.OpsTipSetDesc),
+          'set_label': (RTipInstance.set_label, requests.OpsValueDesc)
         }
 
 
@@ -498,7 +520,7 @@ class WhistleblowerFileHandler(BaseHandler):
 
         directory_traversal_check(Settings.attachments_path, dst)
 
-        yield threads.deferToThread(self.write_upload_plaintext_to_disk, dst)
+        yield run_in_thread_pool(self.write_upload_plaintext_to_disk, dst)
 
         self.uploaded_file['filename'] = filename
         self.uploaded_file['creation_date'] = datetime_now()
@@ -5,11 +5,11 @@ from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 from globaleaks.rest import errors
 
 
-@transact
+@transact_ro
 def translate_shorturl(session, tid, shorturl):
     shorturl = session.query(models.ShortURL).filter(models.ShortURL.shorturl == shorturl, models.ShortURL.tid == tid).one_or_none()
     if shorturl is None:
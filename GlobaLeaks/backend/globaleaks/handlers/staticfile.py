@@ -1,11 +1,155 @@
 # -*- coding: utf-8 -*-
 #
 # Handler exposing application files
+import hashlib
+import mimetypes
 import os
+import re
 
-from globaleaks.handlers.base import BaseHandler
+try:
+    import brotli # Optional, used to precompress the application files
+except ImportError:
+    brotli = None
+
+from twisted.web import http
+
+from globaleaks.handlers.base import BaseHandler, parse_byte_range
 from globaleaks.rest import errors
+from globaleaks.rest.apicache import etag_matches, gzipdata
 from globaleaks.utils.security import directory_traversal_check
+from globaleaks.utils.utility import log
+
+# files up to this size are kept in memory together with their compressed variants
+STATIC_FILE_MEMORY_MAX_SIZE = 1024 * 1024
+
+# overall bound of the memory used by the files of a manifest
+STATIC_MANIFEST_MEMORY_MAX_SIZE = 64 * 1024 * 1024
+
+# names embedding a content hash (e.g. scripts.3f2a9c1d.js) never change
+HASHED_ASSET_RE = re.compile(r'[.\-][0-9a-f]{8,}\.[a-z0-9]+$')
+
+IMMUTABLE_CACHE_CONTROL = b'public, max-age=31536000, immutable'
+
+COMPRESSIBLE_MIME_TYPES = frozenset([
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+    'image/x-icon',
+    'image/vnd.microsoft.icon'
+])
+
+# manifests of the served directories indexed by the path given to the handler
+_manifests = {}
+
+
+class StaticAsset(object):
+    """
+    An entry of the manifest of an application directory
+
+    The variants map each content encoding to the payload in memory and are
+    empty for the files too big to be kept in memory, that are streamed
+    """
+    __slots__ = ['path', 'size', 'mtime', 'content_type', 'etag', 'immutable', 'variants']
+
+    def __init__(self, path, size, mtime, content_type, etag, immutable, variants):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_type = content_type
+        self.etag = etag
+        self.immutable = immutable
+        self.variants = variants
+
+
+def is_compressible(content_type):
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_MIME_TYPES
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_static_asset(path, relpath, memory):
+    """
+    Build the manifest entry of a file reading it and its compressed
+    variants if the file is small enough to be kept in memory
+    """
+    stat = os.stat(path)
+    mime_type, _ = mimetypes.guess_type(relpath)
+    content_type = mime_type or 'application/octet-stream'
+    immutable = HASHED_ASSET_RE.search(relpath) is not None
+
+    if stat.st_size > STATIC_FILE_MEMORY_MAX_SIZE or stat.st_size > memory:
+        return StaticAsset(path, stat.st_size, stat.st_mtime, content_type, None, immutable, {})
+
+    data = read_file(path)
+    variants = {b'identity': data}
+
+    if is_compressible(content_type):
+        # the precompressed files produced by the build are preferred to compressing at startup
+        if os.path.isfile(path + '.gz'):
+            variants[b'gzip'] = read_file(path + '.gz')
+        else:
+            variants[b'gzip'] = gzipdata(data)
+
+        if brotli is not None:
+            variants[b'br'] = brotli.compress(data)
+
+        # a compressed variant is useful only if smaller than the original
+        for encoding in [x for x in variants if len(variants[x]) >= len(data)]:
+            if encoding != b'identity':
+                del variants[encoding]
+
+    etag = b'"' + hashlib.sha256(data).hexdigest().encode() + b'"'
+
+    return StaticAsset(path, stat.st_size, stat.st_mtime, content_type, etag, immutable, variants)
+
+
+def build_static_manifest(root):
+    """
+    Scan the directory indexing its files by their path relative to the root
+    """
+    manifest = {}
+    memory = STATIC_MANIFEST_MEMORY_MAX_SIZE
+
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, root).replace(os.sep, '/')
+
+            # precompressed files are variants of the original ones if present
+            if filename.endswith('.gz') and os.path.isfile(path[:-3]):
+                continue
+
+            try:
+                asset = load_static_asset(path, relpath, memory)
+            except (IOError, OSError) as excep:
+                log.err("Unable to load the static file %s: %s", path, excep)
+                continue
+
+            manifest[relpath] = asset
+            memory -= sum(len(x) for x in asset.variants.values())
+
+    return manifest
+
+
+def get_static_manifest(path):
+    """
+    Return the manifest of the directory scanning it on first use
+    """
+    manifest = _manifests.get(path)
+    if manifest is None:
+        manifest = _manifests[path] = build_static_manifest(path)
+
+    return manifest
+
+
+def get_accepted_encodings(request):
+    accept_encoding = request.getHeader(b'accept-encoding') or b''
+
+    return [x.split(b';')[0].strip() for x in accept_encoding.split(b',')]
 
 
 class StaticFileHandler(BaseHandler):
@@ -15,20 +159,85 @@ class StaticFileHandler(BaseHandler):
     def __init__(self, state, request, path):
         BaseHandler.__init__(self, state, request)
 
-        self.root = "%s%s" % (os.path.abspath(path), "/")
+        self.path = path
 
     def get(self, filename):
         if not filename:
             filename = 'index.html'
 
-        abspath = os.path.abspath(os.path.join(self.root, filename))
+        asset = get_static_manifest(self.path).get(filename)
+        if asset is not None and asset.variants:
+            return self.serve_static_asset(asset)
+
+        return self.serve_file(filename)
 
-        directory_traversal_check(self.root, abspath)
+    def serve_static_asset(self, asset):
+        """
+        Write the variant of the asset matching the encodings accepted by
+        the client honoring the conditional and the Range headers
+        """
+        encoding = b'identity'
+        if len(asset.variants) > 1:
+            accepted = get_accepted_encodings(self.request)
+            encoding = next((x for x in (b'br', b'gzip') if x in accepted and x in asset.variants), encoding)
 
-        if os.path.exists(abspath + '.gz') and os.path.isfile(abspath + '.gz'):
+            self.request.setHeader(b'Vary', b'Accept-Encoding')
+
+        data = asset.variants[encoding]
+        etag = asset.etag
+        last_modified = http.datetimeToString(asset.mtime)
+
+        if encoding != b'identity':
+            # the encodings are distinct representations and so need distinct strong etags
+            etag = etag[:-1] + b'-' + encoding + b'"'
+            self.request.setHeader(b'Content-encoding', encoding)
+
+        self.request.setHeader(b'Content-Type', asset.content_type)
+        self.request.setHeader(b'Accept-Ranges', b'bytes')
+        self.request.setHeader(b'ETag', etag)
+        self.request.setHeader(b'Last-Modified', last_modified)
+
+        if asset.immutable:
+            self.request.setHeader(b'Cache-control', IMMUTABLE_CACHE_CONTROL)
+            self.request.responseHeaders.removeHeader(b'Pragma')
+            self.request.responseHeaders.removeHeader(b'Expires')
+        else:
+            # the files not versioned by name keep the no caching policy of the application
+            self.request.setHeader(b'Cache-control', b'no-cache, no-store, must-revalidate')
+
+        if etag_matches(self.request, etag):
+            self.request.setResponseCode(304)
+            return
+
+        byte_range = self.request.getHeader(b'range')
+        if_range = self.request.getHeader(b'if-range')
+        if byte_range is not None and (if_range is None or if_range in (etag, last_modified)):
+            try:
+                bounds = parse_byte_range(byte_range, len(data))
+            except errors.RangeNotSatisfiable:
+                self.request.setHeader(b'Content-Range', b'bytes */%d' % len(data))
+                raise
+
+            if bounds is not None:
+                self.request.setResponseCode(206)
+                self.request.setHeader(b'Content-Range', b'bytes %d-%d/%d' % (bounds[0], bounds[1], len(data)))
+                data = data[bounds[0]:bounds[1] + 1]
+
+        self.request.setHeader(b'Content-Length', b'%d' % len(data))
+        self.request.write(data)
+
+    def serve_file(self, filename):
+        """
+        Serve from the filesystem the files not kept in memory
+        """
+        root = "%s%s" % (os.path.abspath(self.path), "/")
+        abspath = os.path.abspath(os.path.join(root, filename))
+
+        directory_traversal_check(root, abspath)
+
+        if os.path.isfile(abspath + '.gz'):
             return self.write_file(filename + '.gz', abspath + '.gz')
-        if os.path.exists(abspath) and os.path.isfile(abspath):
+        if os.path.isfile(abspath):
             return self.write_file(filename, abspath)
         else:
             raise errors.ResourceNotFound()
-
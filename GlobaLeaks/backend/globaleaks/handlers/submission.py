@@ -16,11 +16,19 @@ from globaleaks.rest import errors, requests
 from globaleaks.utils.security import hash_password, sha256, generateRandomReceipt
 from globaleaks.state import State
 from globaleaks.utils.structures import get_localized_values
+from globaleaks.utils.lrucache import LRUCache, json_size
 from globaleaks.utils.token import TokenList
 from globaleaks.utils.utility import log, get_expiration, \
     datetime_now, datetime_never, datetime_to_ISO8601
 
 
+# Archived schemas are keyed by the hash of their content and so their
+# localized serializations never change and could be shared by all requests
+ARCHIVED_SCHEMA_CACHE_SIZE = 32 * 1024 * 1024 # 32MB of serialized json
+
+ArchivedSchemaCache = LRUCache(ARCHIVED_SCHEMA_CACHE_SIZE, sizeof=json_size)
+
+
 def _parse_request(client_ip, tid):
 
     if State.tenant_cache[tid]['enable_network_detecting']:
@@ -101,6 +109,38 @@ def db_serialize_archived_preview_schema(session, preview_schema, language):
     return preview
 
 
+def db_get_archived_questionnaire_schema(session, questionnaire_hash, language):
+    """
+    Return the localized serialization of the archived questionnaire schema
+
+    The returned value is shared among requests and should not be modified
+    """
+    key = (questionnaire_hash, u'schema', language)
+
+    questionnaire = ArchivedSchemaCache.get(key)
+    if questionnaire is None:
+        aqs = session.query(models.ArchivedSchema).filter(models.ArchivedSchema.hash == questionnaire_hash).one()
+        questionnaire = ArchivedSchemaCache.set(key, db_serialize_archived_questionnaire_schema(session, aqs.schema, language))
+
+    return questionnaire
+
+
+def db_get_archived_preview_schema(session, questionnaire_hash, language):
+    """
+    Return the localized serialization of the archived preview schema
+
+    The returned value is shared among requests and should not be modified
+    """
+    key = (questionnaire_hash, u'preview', language)
+
+    preview = ArchivedSchemaCache.get(key)
+    if preview is None:
+        aqs = session.query(models.ArchivedSchema).filter(models.ArchivedSchema.hash == questionnaire_hash).one()
+        preview = ArchivedSchemaCache.set(key, db_serialize_archived_preview_schema(session, aqs.preview, language))
+
+    return preview
+
+
 def db_serialize_questionnaire_answers_recursively(session, answers, answers_by_group, groups_by_answer):
     ret = {}
 
@@ -115,8 +155,7 @@ def db_serialize_questionnaire_answers_recursively(session, answers, answers_by_
 
 
 def db_serialize_questionnaire_answers(session, tid, usertip, internaltip):
-    aqs = session.query(models.ArchivedSchema).filter(models.ArchivedSchema.hash == internaltip.questionnaire_hash).one()
-    questionnaire = db_serialize_archived_questionnaire_schema(session, aqs.schema, State.tenant_cache[tid].default_language)
+    questionnaire = db_get_archived_questionnaire_schema(session, internaltip.questionnaire_hash, State.tenant_cache[tid].default_language)
 
     answers = []
     answers_by_group = {}
@@ -238,8 +277,6 @@ def db_get_itip_receiver_list(session, itip):
 
 
 def serialize_itip(session, internaltip, language):
-    aq = session.query(models.ArchivedSchema).filter(models.ArchivedSchema.hash == internaltip.questionnaire_hash).one()
-
     return {
         'id': internaltip.id,
         'creation_date': datetime_to_ISO8601(internaltip.creation_date),
@@ -247,7 +284,7 @@ def serialize_itip(session, internaltip, language):
         'expiration_date': datetime_to_ISO8601(internaltip.expiration_date),
         'progressive': internaltip.progressive,
         'context_id': internaltip.context_id,
-        'questionnaire': db_serialize_archived_questionnaire_schema(session, aq.schema, language),
+        'questionnaire': db_get_archived_questionnaire_schema(session, internaltip.questionnaire_hash, language),
         'receivers': db_get_itip_receiver_list(session, internaltip),
         'https': internaltip.https,
         'enable_two_way_comments': internaltip.enable_two_way_comments,
@@ -447,6 +484,8 @@ class SubmissionInstance(BaseHandler):
     The interface that creates, populates and finishes a submission.
     """
     check_roles = 'unauthenticated'
+    # the answers could include long texts
+    max_body_size = 8 * 1024 * 1024
 
     def put(self, token_id):
         """
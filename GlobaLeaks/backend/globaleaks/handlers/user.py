@@ -4,10 +4,9 @@
 from globaleaks import models
 from globaleaks.handlers.admin.modelimgs import db_get_model_img
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests
 from globaleaks.state import State
-from globaleaks.utils.pgp import PGPContext
 from globaleaks.utils.security import change_password, generateRandomKey
 from globaleaks.utils.structures import get_localized_values
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, datetime_null
@@ -22,9 +21,10 @@ def parse_pgp_options(state, user, request):
 
     k = None
     if not remove_key and pgp_key_public:
-        pgpctx = PGPContext(state.settings.tmp_path)
+        k = state.pgp_keyring.load_key(pgp_key_public)
 
-        k = pgpctx.load_key(pgp_key_public)
+    if user.pgp_key_fingerprint and (k is None or k['fingerprint'] != user.pgp_key_fingerprint):
+        state.pgp_keyring.remove_key(user.pgp_key_fingerprint)
 
     if k is not None:
         user.pgp_key_public = pgp_key_public
@@ -72,7 +72,7 @@ def user_serialize_user(session, user, language):
     return get_localized_values(ret_dict, user, user.localized_keys, language)
 
 
-@transact
+@transact_ro
 def get_user_settings(session, tid, user_id, language):
     user = models.db_get(session, models.User, models.User.id == user_id, models.User.tid == tid)
 
@@ -155,7 +155,7 @@ class UserInstance(BaseHandler):
         - pgp key
     """
     check_roles = {'admin', 'receiver', 'custodian'}
-    invalidate_cache = True
+    invalidate_cache = {'User'}
 
     def get(self):
         return get_user_settings(self.request.tid,
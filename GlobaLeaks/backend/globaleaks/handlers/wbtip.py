@@ -2,11 +2,12 @@
 #
 # Handlers dealing with tip interface for whistleblowers (wbtip)
 from globaleaks import models
+from globaleaks.models import serializers
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.rtip import serialize_comment, serialize_message, db_get_itip_comment_list, WBFileHandler
 from globaleaks.handlers.submission import serialize_usertip, \
-    db_save_questionnaire_answers, db_serialize_archived_questionnaire_schema
-from globaleaks.orm import transact
+    db_save_questionnaire_answers, db_get_archived_questionnaire_schema
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.utils.utility import log, datetime_now, datetime_to_ISO8601
 
@@ -21,9 +22,11 @@ def wb_serialize_ifile(session, ifile):
     }
 
 
-def wb_serialize_wbfile(session, wbfile):
-    receiver_id = session.query(models.ReceiverTip.receiver_id) \
-                         .filter(models.ReceiverTip.id == wbfile.receivertip_id).one()[0]
+def wb_serialize_wbfile(session, wbfile, data=None):
+    if data is None:
+        data = serializers.db_prepare_tip_serialization(session, wbfiles=[wbfile])
+
+    receiver_id = data['rtips'][wbfile.receivertip_id].receiver_id
 
     return {
         'id': wbfile.id,
@@ -45,9 +48,11 @@ def db_get_rfile_list(session, tid, itip_id):
 def db_get_wbfile_list(session, tid, itip_id):
     wbfiles = session.query(models.WhistleblowerFile) \
                      .filter(models.WhistleblowerFile.receivertip_id == models.ReceiverTip.id,
-                             models.ReceiverTip.internaltip_id == itip_id)
+                             models.ReceiverTip.internaltip_id == itip_id).all()
+
+    data = serializers.db_prepare_tip_serialization(session, wbfiles=wbfiles)
 
-    return [wb_serialize_wbfile(session, wbfile) for wbfile in wbfiles]
+    return [wb_serialize_wbfile(session, wbfile, data) for wbfile in wbfiles]
 
 
 def db_get_wbtip(session, tid, itip_id, language):
@@ -93,16 +98,18 @@ def create_comment(session, tid, wbtip_id, request):
     return serialize_comment(session, comment)
 
 
-@transact
+@transact_ro
 def get_itip_message_list(session, tid, wbtip_id, receiver_id):
     messages = session.query(models.Message) \
                       .filter(models.Message.receivertip_id == models.ReceiverTip.id,
                               models.ReceiverTip.internaltip_id == wbtip_id,
                               models.ReceiverTip.receiver_id == receiver_id,
                               models.InternalTip.id == wbtip_id,
-                              models.InternalTip.tid == tid)
+                              models.InternalTip.tid == tid).all()
 
-    return [serialize_message(session, message) for message in messages]
+    data = serializers.db_prepare_tip_serialization(session, messages=messages)
+
+    return [serialize_message(session, message, data) for message in messages]
 
 @transact
 def create_message(session, tid, wbtip_id, receiver_id, request):
@@ -134,9 +141,7 @@ def update_identity_information(session, tid, tip_id, identity_field_id, identit
     if internaltip.identity_provided:
         return
 
-    aqs = session.query(models.ArchivedSchema).filter(models.ArchivedSchema.hash == internaltip.questionnaire_hash).one()
-
-    questionnaire = db_serialize_archived_questionnaire_schema(session, aqs.schema, language)
+    questionnaire = db_get_archived_questionnaire_schema(session, internaltip.questionnaire_hash, language)
     for step in questionnaire:
         for field in step['children']:
             if field['id'] == identity_field_id and field['template_id'] == 'whistleblower_identity':
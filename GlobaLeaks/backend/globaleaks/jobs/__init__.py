@@ -1,4 +1,5 @@
 from globaleaks.jobs import anomalies, \
+                            cache_warming, \
                             cleaning, \
                             delivery, \
                             exit_nodes_refresh, \
@@ -12,6 +13,7 @@ from globaleaks.jobs import anomalies, \
 
 jobs_list = [
     anomalies.Anomalies,
+    cache_warming.CacheWarming,
     cleaning.Cleaning,
     delivery.Delivery,
     exit_nodes_refresh.ExitNodesRefresh,
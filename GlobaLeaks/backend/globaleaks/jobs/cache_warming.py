@@ -0,0 +1,67 @@
+# -*- coding: utf-8
+# Implement the background rebuild of the invalidated public resources
+import json
+
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.handlers import l10n, public
+from globaleaks.jobs.base import LoopingJob
+from globaleaks.rest import errors
+from globaleaks.rest.apicache import ApiCache
+
+__all__ = ['CacheWarming']
+
+
+def get_warmable_resources(tid, language):
+    """
+    Return the list of the resources to be kept warm for the specified language
+
+    :return: a list of tuples (path, cache_tags, function returning a deferred of the resource)
+    """
+    return [
+        (b'/public', public.PublicResource.cache_tags,
+         lambda: public.get_public_resources(tid, language)),
+        (b'/l10n/' + language.encode(), l10n.L10NHandler.cache_tags,
+         lambda: l10n.get_l10n(tid, language))
+    ]
+
+
+class CacheWarming(LoopingJob):
+    """
+    This job rebuilds in background the /public and /l10n resources
+    of the tenants whose cache has been invalidated.
+
+    Bursts of invalidations happening between two runs are coalesced
+    in a single rebuild of the resources of each tenant.
+    """
+    interval = 1
+    monitor_interval = 5 * 60
+
+    @inlineCallbacks
+    def operation(self):
+        if not self.state.settings.enable_api_cache:
+            return
+
+        queue = ApiCache.pop_warming_queue()
+        if not queue:
+            return
+
+        tids = list(self.state.tenant_cache) if None in queue else queue
+
+        for tid in tids:
+            if tid not in self.state.tenant_cache:
+                continue
+
+            for language in self.state.tenant_cache[tid].languages_enabled:
+                for path, tags, get_resource in get_warmable_resources(tid, language):
+                    if ApiCache.contains(tid, path, language):
+                        continue
+
+                    generation = ApiCache.generation
+
+                    try:
+                        data = yield get_resource()
+                    except errors.ResourceNotFound:
+                        continue
+
+                    ApiCache.set(tid, path, language, b'application/json', json.dumps(data), tags, generation)
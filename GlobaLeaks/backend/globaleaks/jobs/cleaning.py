@@ -87,7 +87,7 @@ class Cleaning(LoopingJob):
                    'earliest_expiration_date': datetime_to_ISO8601(earliest_expiration_date)
                 }
 
-                subject, body = Templating().get_mail_subject_and_body(data)
+                subject, body = Templating(tid, user.language).get_mail_subject_and_body(data)
 
                 session.add(models.Mail({
                     'tid': tid,
@@ -5,14 +5,16 @@
 #
 # Call also the FileProcess working point, in order to verify which
 # kind of file has been submitted.
+import multiprocessing
 import os
 
+from twisted.internet import threads
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils.pgp import PGPEncryptionSink
 from globaleaks.utils.security import generateRandomKey, overwrite_and_remove
 from globaleaks.settings import Settings
 from globaleaks.utils.utility import log
@@ -22,6 +24,11 @@ __all__ = ['Delivery']
 
 INTERNALFILES_HANDLE_RETRY_MAX = 3
 
+# maximum number of gpg processes encrypting a file at the same time
+DELIVERY_MAX_PARALLEL_ENCRYPTIONS = max(2, multiprocessing.cpu_count())
+
+DELIVERY_CHUNK_SIZE = 64 * 1024
+
 
 @transact
 def receiverfile_planning(session):
@@ -94,29 +101,116 @@ def receiverfile_planning(session):
     return receiverfiles_maps
 
 
-def fsops_pgp_encrypt(state, sf, key, fingerprint):
+def fsops_deliver_file(state, sf, rfiles, plain_path, progress=None):
     """
-    Encrypt the file for a speficic key
+    Decrypt the file once streaming it to the encryptions for the receivers
+    and to the plaintext file if needed
 
-    return
-        path of encrypted file,
-        length of the encrypted file
+    @param rfiles: the receiver files to be encrypted for their receivers
+    @param plain_path: the path of the plaintext file or None
+    @param progress: a callable reporting the number of bytes processed
     """
-    pgpctx = PGPContext(state.settings.tmp_path)
-
-    pgpctx.load_key(key)
+    pgpctx = state.pgp_keyring.get_context()
+
+    sinks = []
+    for rfileinfo in rfiles:
+        try:
+            fingerprint = state.pgp_keyring.acquire_key(rfileinfo['receiver']['pgp_key_public'])['fingerprint']
+        except Exception as excep:
+            log.err("Unable to load the PGP key of %s: %s. marking the file as unavailable.",
+                    rfileinfo['receiver']['name'], excep)
+            rfileinfo['status'] = u'unavailable'
+            continue
 
-    with sf.open('rb') as f:
         encrypted_file_path = os.path.abspath(os.path.join(state.settings.attachments_path, "pgp_encrypted-%s" % generateRandomKey(16)))
-        _, encrypted_file_size = pgpctx.encrypt_file(fingerprint, f, encrypted_file_path)
+        sinks.append((rfileinfo, PGPEncryptionSink(pgpctx, fingerprint, encrypted_file_path)))
+
+    plaintext_file = open(plain_path, "a+b") if plain_path is not None else None
+
+    processed = 0
+    completed = False
+    try:
+        with sf.open('rb') as encrypted_file:
+            while True:
+                chunk = encrypted_file.read(DELIVERY_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                for _, sink in sinks:
+                    sink.write(chunk)
+
+                if plaintext_file is not None:
+                    plaintext_file.write(chunk)
+
+                processed += len(chunk)
+                if progress is not None:
+                    progress(processed)
+
+        completed = True
+    finally:
+        if plaintext_file is not None:
+            plaintext_file.close()
+
+        # every sink is closed before waiting so that the gpg processes complete in parallel
+        for _, sink in sinks:
+            sink.close()
+
+        for rfileinfo, sink in sinks:
+            try:
+                new_size = sink.wait()
+                if not completed:
+                    raise Exception("file read interrupted after %d bytes" % processed)
+            except Exception as excep:
+                log.err("Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable.",
+                        rfileinfo['receiver']['name'], rfileinfo['filename'], excep)
+                rfileinfo['status'] = u'unavailable'
+
+                if os.path.exists(sink.output_path):
+                    overwrite_and_remove(sink.output_path)
+
+                continue
+            finally:
+                state.pgp_keyring.release_key(sink.key_fingerprint)
+
+            new_filename = os.path.basename(sink.output_path)
+
+            log.debug("Switch on Receiver File for %s filename %s => %s size %d => %d",
+                      rfileinfo['receiver']['name'], rfileinfo['filename'],
+                      new_filename, rfileinfo['size'], new_size)
 
-    return os.path.basename(encrypted_file_path), encrypted_file_size
+            rfileinfo['filename'] = new_filename
+            rfileinfo['size'] = new_size
+            rfileinfo['status'] = u'encrypted'
 
 
+def fsops_process_file(state, sf, receiverfiles_map, rfiles, plain_path):
+    """
+    Encrypt the file for the receivers in batches bounding the number of
+    concurrent gpg processes
+    """
+    ifile_name = receiverfiles_map['ifile_name']
+    size = receiverfiles_map['ifile_size'] or 1
+    batches = [rfiles[i:i + DELIVERY_MAX_PARALLEL_ENCRYPTIONS]
+               for i in range(0, len(rfiles), DELIVERY_MAX_PARALLEL_ENCRYPTIONS)] or [[]]
+
+    for i, batch in enumerate(batches):
+        reported = [0]
+
+        def progress(processed):
+            percentage = min(100, processed * 100 // size)
+            if percentage >= reported[0] + 10:
+                reported[0] = percentage
+                log.debug("Delivery of %s: %d%% (batch %d/%d)", ifile_name, percentage, i + 1, len(batches))
+
+        # the plaintext file is dumped together with the first batch
+        fsops_deliver_file(state, sf, batch, plain_path if i == 0 else None, progress)
+
+
+@inlineCallbacks
 def process_files(state, receiverfiles_maps):
     """
     @param receiverfiles_maps: the mapping of ifile/rfiles to be created on filesystem
-    @return: return None
+    @return: a deferred fired once the files have been processed
     """
     for ifile_id, receiverfiles_map in receiverfiles_maps.items():
         ifile_name = receiverfiles_map['ifile_name']
@@ -125,26 +219,11 @@ def process_files(state, receiverfiles_maps):
 
         sf = state.get_tmp_file_by_name(ifile_name)
 
+        rfiles = []
         receiverfiles_map['plaintext_file_needed'] = False
-        for rcounter, rfileinfo in enumerate(receiverfiles_map['rfiles']):
+        for rfileinfo in receiverfiles_map['rfiles']:
             if rfileinfo['receiver']['pgp_key_public']:
-                try:
-                    new_filename, new_size = fsops_pgp_encrypt(state,
-                                                               sf,
-                                                               rfileinfo['receiver']['pgp_key_public'],
-                                                               rfileinfo['receiver']['pgp_key_fingerprint'])
-
-                    log.debug("%d# Switch on Receiver File for %s filename %s => %s size %d => %d",
-                              rcounter,  rfileinfo['receiver']['name'], rfileinfo['filename'],
-                              new_filename, rfileinfo['size'], new_size)
-
-                    rfileinfo['filename'] = new_filename
-                    rfileinfo['size'] = new_size
-                    rfileinfo['status'] = u'encrypted'
-                except Exception as excep:
-                    log.err("%d# Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable.",
-                            rcounter, rfileinfo['receiver']['name'], rfileinfo['filename'], excep)
-                    rfileinfo['status'] = u'unavailable'
+                rfiles.append(rfileinfo)
             elif state.tenant_cache[receiverfiles_map['tid']].allow_unencrypted:
                 receiverfiles_map['plaintext_file_needed'] = True
                 rfileinfo['filename'] = plain_name
@@ -155,20 +234,24 @@ def process_files(state, receiverfiles_maps):
         if receiverfiles_map['plaintext_file_needed']:
             log.debug("Not all receivers support PGP and the system allows plaintext version of files: %s saved as plaintext file %s",
                       ifile_name, plain_name)
+        else:
+            log.debug("All receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+            plain_path = None
 
-            try:
-                with sf.open('rb') as encrypted_file, open(plain_path, "a+b") as plaintext_file:
-                    while True:
-                        chunk = encrypted_file.read(4096)
-                        if not chunk:
-                            break
-                        plaintext_file.write(chunk)
+            if not rfiles:
+                continue
 
+        try:
+            yield threads.deferToThread(fsops_process_file, state, sf, receiverfiles_map, rfiles, plain_path)
+
+            if plain_path is not None:
                 receiverfiles_map['ifile_name'] = plain_name
-            except Exception as excep:
-                log.err("Unable to create plaintext file %s: %s", plain_path, excep)
-        else:
-            log.debug("All receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+        except Exception as excep:
+            log.err("Unable to deliver file %s: %s", ifile_name, excep)
+
+            for rfileinfo in rfiles:
+                if rfileinfo['status'] == u'processing':
+                    rfileinfo['status'] = u'unavailable'
 
 
 @transact
@@ -204,5 +287,5 @@ class Delivery(LoopingJob):
         """
         receiverfiles_maps = yield receiverfile_planning()
         if receiverfiles_maps:
-            process_files(self.state, receiverfiles_maps)
+            yield process_files(self.state, receiverfiles_maps)
             yield update_internalfile_and_store_receiverfiles(receiverfiles_maps)
@@ -1,7 +1,9 @@
 #######i -*- coding: utf-8 -*-
 # Implement the notification of new submissions
 import copy
+from datetime import timedelta
 
+from sqlalchemy import func, or_
 from twisted.internet import defer
 
 from globaleaks import models
@@ -12,9 +14,21 @@ from globaleaks.handlers.rtip import serialize_rtip, serialize_message, serializ
 from globaleaks.handlers.user import user_serialize_user
 from globaleaks.jobs.base import NetLoopingJob
 from globaleaks.orm import transact
-from globaleaks.utils.pgp import PGPContext
 from globaleaks.utils.templating import Templating
-from globaleaks.utils.utility import log
+from globaleaks.utils.utility import datetime_now, datetime_null, datetime_to_ISO8601, log, uuid4
+
+# mails claimed by each run of the spooler
+MAIL_BATCH_SIZE = 200
+
+# attempts after which a mail is discarded
+MAIL_MAX_ATTEMPTS = 10
+
+# seconds after which a mail is retried, doubled at every failed attempt
+MAIL_RETRY_DELAY = 5
+MAIL_RETRY_MAX_DELAY = 3600
+
+# seconds after which the mails claimed by a run that did not complete are retried
+MAIL_LEASE_TIME = 600
 
 
 trigger_template_map = {
@@ -67,9 +81,6 @@ class MailGenerator(object):
                 cache_obj = user_serialize_user(session, obj, language)
             elif key == 'context':
                 cache_obj = admin_serialize_context(session, obj, language)
-            elif key == 'tip':
-                itip = session.query(models.InternalTip).filter(models.InternalTip.id == obj.internaltip_id).one()
-                cache_obj = serialize_rtip(session, obj, itip, language)
             elif key == 'message':
                 cache_obj = serialize_message(session, obj)
             elif key == 'comment':
@@ -81,83 +92,83 @@ class MailGenerator(object):
 
         return self.cache[cache_key]
 
-    def process_ReceiverTip(self, session, rtip, data):
-        user, context = session.query(models.User, models.Context) \
-                               .filter(models.User.id == rtip.receiver_id,
-                                       models.InternalTip.id == rtip.internaltip_id,
-                                       models.Context.id == models.InternalTip.context_id).one()
-
-        tid = context.tid
-
-        data['user'] = self.serialize_obj(session, 'user', user, tid, user.language)
-        data['tip'] = self.serialize_obj(session, 'tip', rtip, tid, user.language)
-        data['context'] = self.serialize_obj(session, 'context', context, tid, user.language)
-
-        self.process_mail_creation(session, tid, data)
+    def serialize_tip(self, session, rtip, itip, tid, language):
+        """
+        Serialize the tip once for all the events of the same receiver tip
+        """
+        cache_key = gen_cache_key('tip', tid, rtip.id, language)
 
-    def process_Message(self, session, message, data):
-        # if the message was created by a receiver do not generate mails
-        if message.type == u"receiver":
-            return
+        if cache_key not in self.cache:
+            self.cache[cache_key] = serialize_rtip(session, rtip, itip, language)
 
-        user, context, rtip = session.query(models.User, models.Context, models.ReceiverTip) \
-                                     .filter(models.User.id == models.ReceiverTip.receiver_id,
-                                             models.ReceiverTip.id == models.Message.receivertip_id,
-                                             models.Context.id == models.InternalTip.context_id,
-                                             models.InternalTip.id == models.ReceiverTip.internaltip_id,
-                                             models.Message.id == message.id).one()
+        return self.cache[cache_key]
 
+    def serialize_event(self, session, data, user, context, rtip, itip):
         tid = context.tid
 
         data['user'] = self.serialize_obj(session, 'user', user, tid, user.language)
-        data['tip'] = self.serialize_obj(session, 'tip', rtip, tid, user.language)
+        data['tip'] = self.serialize_tip(session, rtip, itip, tid, user.language)
         data['context'] = self.serialize_obj(session, 'context', context, tid, user.language)
-        data['message'] = self.serialize_obj(session, 'message', message, tid, user.language)
 
-        self.process_mail_creation(session, tid, data)
+        return tid
 
-    def process_Comment(self, session, comment, data):
-        for user, context, rtip in session.query(models.User, models.Context, models.ReceiverTip) \
-                                          .filter(models.User.id == models.ReceiverTip.receiver_id,
-                                                  models.ReceiverTip.internaltip_id == comment.internaltip_id,
-                                                  models.Context.id == models.InternalTip.context_id,
-                                                  models.InternalTip.id == comment.internaltip_id,
-                                                  models.ReceiverTip.internaltip_id == comment.internaltip_id):
-            tid = context.tid
+    def process_ReceiverTip(self, session, data):
+        for rtip, itip, user, context in session.query(models.ReceiverTip, models.InternalTip, models.User, models.Context) \
+                                                .filter(models.ReceiverTip.new == True,
+                                                        models.User.id == models.ReceiverTip.receiver_id,
+                                                        models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                                        models.Context.id == models.InternalTip.context_id):
+            umsg = copy.deepcopy(data)
+            tid = self.serialize_event(session, umsg, user, context, rtip, itip)
 
-            # avoid to send emails to the receiver that written the comment
-            if comment.author_id == rtip.receiver_id:
-                continue
+            self.process_mail_creation(session, tid, umsg)
 
+    def process_Message(self, session, data):
+        # if the message was created by a receiver do not generate mails
+        for message, rtip, itip, user, context in session.query(models.Message, models.ReceiverTip, models.InternalTip, models.User, models.Context) \
+                                                         .filter(models.Message.new == True,
+                                                                 models.Message.type != u'receiver',
+                                                                 models.ReceiverTip.id == models.Message.receivertip_id,
+                                                                 models.User.id == models.ReceiverTip.receiver_id,
+                                                                 models.InternalTip.id == models.ReceiverTip.internaltip_id,
+                                                                 models.Context.id == models.InternalTip.context_id):
             umsg = copy.deepcopy(data)
-            umsg['user'] = self.serialize_obj(session, 'user', user, tid, user.language)
-            umsg['tip'] = self.serialize_obj(session, 'tip', rtip, tid, user.language)
-            umsg['context'] = self.serialize_obj(session, 'context', context, tid, user.language)
-            umsg['comment'] = self.serialize_obj(session, 'comment', comment, tid, user.language)
+            tid = self.serialize_event(session, umsg, user, context, rtip, itip)
+            umsg['message'] = self.serialize_obj(session, 'message', message, tid, user.language)
 
             self.process_mail_creation(session, tid, umsg)
 
-    def process_ReceiverFile(self, session, rfile, data):
-        user, context, rtip, ifile = session.query(models.User, models.Context, models.ReceiverTip, models.InternalFile) \
-                                            .filter(models.User.id == models.ReceiverTip.receiver_id,
-                                                    models.InternalFile.id == rfile.internalfile_id,
-                                                    models.InternalTip.id == models.InternalFile.internaltip_id,
-                                                    models.ReceiverTip.id == rfile.receivertip_id,
-                                                    models.Context.id == models.InternalTip.context_id).one()
+    def process_Comment(self, session, data):
+        # avoid to send emails to the receiver that written the comment
+        for comment, rtip, itip, user, context in session.query(models.Comment, models.ReceiverTip, models.InternalTip, models.User, models.Context) \
+                                                         .filter(models.Comment.new == True,
+                                                                 models.ReceiverTip.internaltip_id == models.Comment.internaltip_id,
+                                                                 or_(models.Comment.author_id == None,
+                                                                     models.Comment.author_id != models.ReceiverTip.receiver_id),
+                                                                 models.User.id == models.ReceiverTip.receiver_id,
+                                                                 models.InternalTip.id == models.Comment.internaltip_id,
+                                                                 models.Context.id == models.InternalTip.context_id):
+            umsg = copy.deepcopy(data)
+            tid = self.serialize_event(session, umsg, user, context, rtip, itip)
+            umsg['comment'] = self.serialize_obj(session, 'comment', comment, tid, user.language)
 
-        tid = context.tid
+            self.process_mail_creation(session, tid, umsg)
 
+    def process_ReceiverFile(self, session, data):
         # avoid sending an email for the files that have been loaded during the initial submission
-        if ifile.submission:
-            return
-
-        data['user'] = self.serialize_obj(session, 'user', user, tid, user.language)
-        data['tip'] = self.serialize_obj(session, 'tip', rtip, tid, user.language)
-        data['user'] = self.serialize_obj(session, 'user', user, tid, user.language)
-        data['context'] = self.serialize_obj(session, 'context', context, tid, user.language)
-        data['file'] = self.serialize_obj(session, 'file', ifile, tid, user.language)
+        for rfile, ifile, rtip, itip, user, context in session.query(models.ReceiverFile, models.InternalFile, models.ReceiverTip, models.InternalTip, models.User, models.Context) \
+                                                              .filter(models.ReceiverFile.new == True,
+                                                                      models.InternalFile.id == models.ReceiverFile.internalfile_id,
+                                                                      models.InternalFile.submission == False,
+                                                                      models.ReceiverTip.id == models.ReceiverFile.receivertip_id,
+                                                                      models.User.id == models.ReceiverTip.receiver_id,
+                                                                      models.InternalTip.id == models.InternalFile.internaltip_id,
+                                                                      models.Context.id == models.InternalTip.context_id):
+            umsg = copy.deepcopy(data)
+            tid = self.serialize_event(session, umsg, user, context, rtip, itip)
+            umsg['file'] = self.serialize_obj(session, 'file', ifile, tid, user.language)
 
-        self.process_mail_creation(session, tid, data)
+            self.process_mail_creation(session, tid, umsg)
 
     def process_mail_creation(self, session, tid, data):
         user_id = data['user']['id']
@@ -167,6 +178,11 @@ class MailGenerator(object):
             log.debug("Discarding emails for %s due to receiver's preference.", user_id)
             return
 
+        if self.state.tenant_cache[tid].notification.notification_digest_interval > 0:
+            # the event is notified to the receiver with the next digest
+            self.add_digest_event(session, tid, data)
+            return
+
         # https://github.com/globaleaks/GlobaLeaks/issues/798
         # TODO: the current solution is global and configurable only by the admin
         sent_emails = self.state.get_mail_counter(user_id)
@@ -193,13 +209,11 @@ class MailGenerator(object):
         if not data['node']['allow_unencrypted'] and len(data['user']['pgp_key_public']) == 0:
             return
 
-        subject, body = Templating().get_mail_subject_and_body(data)
+        subject, body = Templating(tid, data['user']['language']).get_mail_subject_and_body(data)
 
         # If the receiver has encryption enabled encrypt the mail body
         if data['user']['pgp_key_public']:
-            pgpctx = PGPContext(self.state.settings.tmp_path)
-            fingerprint = pgpctx.load_key(data['user']['pgp_key_public'])['fingerprint']
-            body = pgpctx.encrypt_message(fingerprint, body)
+            body = self.state.pgp_keyring.encrypt_message(data['user']['pgp_key_public'], body)
 
         session.add(models.Mail({
             'address': data['user']['mail_address'],
@@ -226,57 +240,169 @@ class MailGenerator(object):
                     }))
         #fine modifica
 
+    def add_digest_event(self, session, tid, data):
+        """
+        Keep track of the event with the subject of the mail that would notify it
+        """
+        language = data['user']['language']
+
+        data['notification'] = self.serialize_config(session, 'notification', tid, language)
+        data['node'] = self.serialize_config(session, 'node', tid, language)
+
+        session.add(models.DigestEvent({
+            'tid': tid,
+            'receiver_id': data['user']['id'],
+            'subject': Templating(tid, language).get_mail_subject(data)
+        }))
+
+    def process_digests(self, session):
+        """
+        Send to each receiver the digest of the events accumulated since
+        the opening of the window that has elapsed
+        """
+        now = datetime_now()
+
+        for tid, receiver_id, first_event_date in session.query(models.DigestEvent.tid,
+                                                                models.DigestEvent.receiver_id,
+                                                                func.min(models.DigestEvent.creation_date)) \
+                                                         .group_by(models.DigestEvent.tid, models.DigestEvent.receiver_id):
+            if tid not in self.state.tenant_cache:
+                continue
+
+            # the events left when the digests are disabled are sent at the next run
+            interval = self.state.tenant_cache[tid].notification.notification_digest_interval
+            if first_event_date > now - timedelta(hours=interval):
+                continue
+
+            self.process_digest(session, tid, receiver_id)
+
+    def process_digest(self, session, tid, receiver_id):
+        user = session.query(models.User).filter(models.User.id == receiver_id).one()
+        events = session.query(models.DigestEvent).filter(models.DigestEvent.receiver_id == receiver_id) \
+                                                  .order_by(models.DigestEvent.creation_date).all()
+
+        data = {
+            'type': u'digest',
+            'user': self.serialize_obj(session, 'user', user, tid, user.language),
+            'notification': self.serialize_config(session, 'notification', tid, user.language),
+            'node': self.serialize_config(session, 'node', tid, user.language),
+            'events': [{'creation_date': datetime_to_ISO8601(e.creation_date), 'subject': e.subject} for e in events]
+        }
+
+        session.query(models.DigestEvent).filter(models.DigestEvent.id.in_([e.id for e in events])).delete(synchronize_session=False)
+
+        if not data['node']['allow_unencrypted'] and len(data['user']['pgp_key_public']) == 0:
+            return
+
+        subject, body = Templating(tid, user.language).get_mail_subject_and_body(data)
+
+        # the events are encrypted once for all within the digest
+        if data['user']['pgp_key_public']:
+            body = self.state.pgp_keyring.encrypt_message(data['user']['pgp_key_public'], body)
+
+        session.add(models.Mail({
+            'address': data['user']['mail_address'],
+            'subject': subject,
+            'body': body,
+            'tid': tid,
+        }))
+
     @transact
     def generate(self, session):
+        silent_tids = [tid for tid, cache_item in self.state.tenant_cache.items()
+                       if cache_item.notification.disable_receiver_notification_emails]
+
+        if silent_tids:
+            itips = session.query(models.InternalTip.id).filter(models.InternalTip.tid.in_(silent_tids))
+            rtips = session.query(models.ReceiverTip.id).filter(models.ReceiverTip.internaltip_id.in_(itips))
+
+            session.query(models.ReceiverTip).filter(models.ReceiverTip.new == True,
+                                                     models.ReceiverTip.internaltip_id.in_(itips)).update({'new': False}, synchronize_session=False)
+
+            session.query(models.Comment).filter(models.Comment.new == True,
+                                                 models.Comment.internaltip_id.in_(itips)).update({'new': False}, synchronize_session=False)
+
+            session.query(models.Message).filter(models.Message.new == True,
+                                                 models.Message.receivertip_id.in_(rtips)).update({'new': False}, synchronize_session=False)
+
+            session.query(models.ReceiverFile).filter(models.ReceiverFile.new == True,
+                                                      models.ReceiverFile.receivertip_id.in_(rtips)).update({'new': False}, synchronize_session=False)
+
+            session.query(models.DigestEvent).filter(models.DigestEvent.tid.in_(silent_tids)).delete(synchronize_session=False)
+
         for trigger in ['ReceiverTip', 'Comment', 'Message', 'ReceiverFile']:
             model = trigger_model_map[trigger]
 
-            silent_tids = []
-            for tid, cache_item in self.state.tenant_cache.items():
-                if cache_item.notification.disable_receiver_notification_emails:
-                    silent_tids.append(tid)
-
-            if len(silent_tids):
-                for x in session.query(models.ReceiverTip).filter(models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                                  models.InternalTip.tid.in_(silent_tids)):
-                    x.new = False
+            data = {
+                'type': trigger_template_map[trigger]
+            }
 
-                for x in session.query(models.Comment).filter(models.Comment.internaltip_id == models.InternalTip.id,
-                                                              models.InternalTip.tid.in_(silent_tids)):
-                    x.new = False
+            # the events pending for each trigger are loaded with a single joined query
+            getattr(self, 'process_%s' % trigger)(session, data)
 
-                for x in session.query(models.Message).filter(models.Message.receivertip_id == models.ReceiverTip.id,
-                                                              models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                              models.InternalTip.tid.in_(silent_tids)):
-                    x.new = False
+            session.query(model).filter(model.new == True).update({'new': False}, synchronize_session=False)
 
-                for x in session.query(models.ReceiverFile).filter(models.ReceiverFile.receivertip_id == models.ReceiverTip.id,
-                                                                   models.ReceiverTip.internaltip_id == models.InternalTip.id,
-                                                                   models.InternalTip.tid.in_(silent_tids)):
-                    x.new = False
+        self.process_digests(session)
 
-            for element in session.query(model).filter(model.new == True):
-                element.new = False
 
-                data = {
-                    'type': trigger_template_map[trigger]
-                }
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(MAIL_RETRY_DELAY * 2 ** attempts, MAIL_RETRY_MAX_DELAY))
 
-                getattr(self, 'process_%s' % trigger)(session, element, data)
 
 @transact
-def delete_sent_mails(session, mail_ids):
-    session.query(models.Mail).filter(models.Mail.id.in_(mail_ids)).delete(synchronize_session='fetch')
+def release_mails(session, lease_owner, sent_ids, failed_ids):
+    """
+    Delete the mails sent and release the lease of the ones to be retried
+    """
+    if sent_ids:
+        session.query(models.Mail).filter(models.Mail.id.in_(sent_ids)).delete(synchronize_session=False)
+
+    if failed_ids:
+        session.query(models.Mail).filter(models.Mail.id.in_(failed_ids),
+                                          models.Mail.lease_owner == lease_owner) \
+                                  .update({'lease_owner': u'', 'lease_expiration': datetime_null()}, synchronize_session=False)
 
 
 @transact
-def get_mails_from_the_pool(session):
-    session.query(models.Mail).filter(models.Mail.processing_attempts > 9).delete(synchronize_session='fetch')
-    session.query(models.Mail).update({'processing_attempts': models.Mail.processing_attempts + 1})
+def get_mails_from_the_pool(session, lease_owner):
+    """
+    Claim the batch of the mails due for sending that are not leased by
+    another run, postponing their next attempt with an exponential backoff
+    """
+    now = datetime_now()
+
+    due = session.query(models.Mail.id, models.Mail.processing_attempts) \
+                 .filter(models.Mail.next_attempt_at <= now,
+                         models.Mail.lease_expiration <= now) \
+                 .order_by(models.Mail.next_attempt_at) \
+                 .limit(MAIL_BATCH_SIZE).all()
+
+    expired_ids = [x[0] for x in due if x[1] >= MAIL_MAX_ATTEMPTS]
+    if expired_ids:
+        session.query(models.Mail).filter(models.Mail.id.in_(expired_ids)).delete(synchronize_session=False)
+
+    claimed = {}
+    for mail_id, attempts in due:
+        if attempts < MAIL_MAX_ATTEMPTS:
+            claimed.setdefault(attempts, []).append(mail_id)
+
+    # the mails with the same attempts share the same backoff and so are updated together
+    for attempts, mail_ids in claimed.items():
+        session.query(models.Mail).filter(models.Mail.id.in_(mail_ids)) \
+                                  .update({'processing_attempts': attempts + 1,
+                                           'next_attempt_at': now + get_retry_delay(attempts),
+                                           'lease_owner': lease_owner,
+                                           'lease_expiration': now + timedelta(seconds=MAIL_LEASE_TIME)}, synchronize_session=False)
+
+    if not claimed:
+        return []
 
     ret = []
 
-    for mail in session.query(models.Mail).order_by(models.Mail.creation_date):
+    claimed_ids = [mail_id for mail_ids in claimed.values() for mail_id in mail_ids]
+
+    # the bodies are loaded only for the mails claimed
+    for mail in session.query(models.Mail).filter(models.Mail.id.in_(claimed_ids)).order_by(models.Mail.creation_date):
         ret.append({
             'id': mail.id,
             'address': mail.address,
@@ -292,25 +418,32 @@ class Notification(NetLoopingJob):
     interval = 5
     monitor_interval = 3 * 60
     mails_to_delete = []
+    mails_to_retry = []
 
     @defer.inlineCallbacks
     def sendmail(self, mail):
         success = yield self.state.sendmail(mail['tid'], mail['address'], mail['subject'], mail['body'])
         if success:
             self.mails_to_delete.append(mail['id'])
+        else:
+            self.mails_to_retry.append(mail['id'])
 
     @defer.inlineCallbacks
     def spool_emails(self):
-        mails = yield get_mails_from_the_pool()
-        for mail in mails:
-            yield self.sendmail(mail)
+        lease_owner = uuid4()
+
+        mails = yield get_mails_from_the_pool(lease_owner)
+
+        # the mails are sent in parallel through the sessions pooled by the spooler for each server
+        yield defer.DeferredList([self.sendmail(mail) for mail in mails])
 
-        if self.mails_to_delete:
-            yield delete_sent_mails(self.mails_to_delete)
+        if self.mails_to_delete or self.mails_to_retry:
+            yield release_mails(lease_owner, self.mails_to_delete, self.mails_to_retry)
 
     @defer.inlineCallbacks
     def operation(self):
         del self.mails_to_delete[:]
+        del self.mails_to_retry[:]
 
         yield MailGenerator(self.state).generate()
 
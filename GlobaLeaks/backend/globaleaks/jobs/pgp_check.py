@@ -50,7 +50,7 @@ class PGPCheck(LoopingJob):
                 'user': user_desc,
             }
 
-            subject, body = Templating().get_mail_subject_and_body(data)
+            subject, body = Templating(tid, user_language).get_mail_subject_and_body(data)
 
             db_schedule_email(session, tid, user_desc['mail_address'], subject, body)
 
@@ -64,7 +64,7 @@ class PGPCheck(LoopingJob):
             'user': user_desc
         }
 
-        subject, body = Templating().get_mail_subject_and_body(data)
+        subject, body = Templating(tid, user_language).get_mail_subject_and_body(data)
 
         db_schedule_email(session, tid, user_desc['mail_address'], subject, body)
 
@@ -78,6 +78,7 @@ class PGPCheck(LoopingJob):
 
             log.info('Removing expired PGP key of: %s', user.username, tid=user.tid)
             if user.pgp_key_expiration < datetime_now():
+                self.state.pgp_keyring.remove_key(user.pgp_key_fingerprint)
                 user.pgp_key_public = ''
                 user.pgp_key_fingerprint = ''
                 user.pgp_key_expiration = datetime_null()
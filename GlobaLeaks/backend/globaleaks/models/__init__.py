@@ -400,6 +400,30 @@ class _CustomTexts(Model):
         return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
 
 
+class _DigestEvent(Model):
+    """
+    This model keeps track of the events accumulated to be notified to a
+    receiver with a single digest mail
+    """
+    __tablename__ = 'digestevent'
+
+    id = Column(Unicode(36), primary_key=True, default=uuid4, nullable=False)
+
+    tid = Column(Integer, default=1, nullable=False)
+
+    creation_date = Column(DateTime, default=datetime_now, nullable=False)
+    receiver_id = Column(Unicode(36), nullable=False)
+    subject = Column(UnicodeText, nullable=False)
+
+    unicode_keys = ['receiver_id', 'subject']
+
+    @declared_attr
+    def __table_args__(cls): # pylint: disable=no-self-argument
+        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                ForeignKeyConstraint(['receiver_id'], ['receiver.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('digestevent_receiver_id_idx', 'receiver_id', 'creation_date'))
+
+
 class _EnabledLanguage(Model):
     __tablename__ = 'enabledlanguage'
 
@@ -706,11 +730,18 @@ class _Mail(Model):
     body = Column(UnicodeText, nullable=False)
     processing_attempts = Column(Integer, default=0, nullable=False)
 
+    # the mail is sent not before next_attempt_at by the spooling run holding
+    # the lease, that is released on failure or when it expires
+    next_attempt_at = Column(DateTime, default=datetime_now, nullable=False)
+    lease_owner = Column(Unicode(36), default=u'', nullable=False)
+    lease_expiration = Column(DateTime, default=datetime_null, nullable=False)
+
     unicode_keys = ['address', 'subject', 'body']
 
     @declared_attr
     def __table_args__(cls): # pylint: disable=no-self-argument
-        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),)
+        return (ForeignKeyConstraint(['tid'], ['tenant.id'], ondelete='CASCADE', deferrable=True, initially='DEFERRED'),
+                Index('mail_next_attempt_at_idx', 'next_attempt_at', 'lease_expiration'))
 
 
 class _Message(Model):
@@ -1130,6 +1161,7 @@ class ConfigL10N(_ConfigL10N, Base): pass
 class Context(_Context, Base): pass
 class ContextImg(_ContextImg, Base): pass
 class CustomTexts(_CustomTexts, Base): pass
+class DigestEvent(_DigestEvent, Base): pass
 class EnabledLanguage(_EnabledLanguage, Base): pass
 class Field(_Field, Base): pass
 class FieldAttr(_FieldAttr, Base): pass
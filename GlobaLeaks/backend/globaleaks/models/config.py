@@ -154,6 +154,8 @@ class NotificationL10NFactory(ConfigL10NFactory):
         u'tip_expiration_summary_mail_title',
         u'receiver_notification_limit_reached_mail_template',
         u'receiver_notification_limit_reached_mail_title',
+        u'digest_mail_template',
+        u'digest_mail_title',
         u'identity_access_authorized_mail_template',
         u'identity_access_authorized_mail_title',
         u'identity_access_denied_mail_template',
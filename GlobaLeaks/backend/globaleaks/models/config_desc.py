@@ -66,6 +66,7 @@ ConfigDescriptor = {
 
     u'tip_expiration_threshold': Int(default=72), # Hours
     u'notification_threshold_per_hour': Int(default=20),
+    u'notification_digest_interval': Int(default=0), # Hours, 0 to notify each event with its own mail
 
     u'enable_admin_exception_notification': Bool(default=False),
     u'enable_developers_exception_notification': Bool(default=True),
@@ -242,7 +243,8 @@ ConfigFilters = {
         u'disable_custodian_notification_emails',
         u'disable_receiver_notification_emails',
         u'tip_expiration_threshold',
-        u'notification_threshold_per_hour'
+        u'notification_threshold_per_hour',
+        u'notification_digest_interval'
     ])
 }
 
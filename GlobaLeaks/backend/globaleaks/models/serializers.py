@@ -4,6 +4,44 @@ from globaleaks import models
 from globaleaks.utils.utility import datetime_to_ISO8601
 
 
+def db_prepare_tip_serialization(session, comments=(), messages=(), rfiles=(), wbfiles=(), iars=()):
+    """
+    Load in a constant number of queries the objects referenced by the
+    comments, messages, files and identity access requests of a tip.
+
+    :return: a dictionary of maps by id of the referenced users, receiver tips,
+             internal tips and internal files
+    """
+    data = {'users': {}, 'rtips': {}, 'itips': {}, 'ifiles': {}}
+
+    rtips_ids = set(m.receivertip_id for m in messages if m.type != u'whistleblower')
+    rtips_ids.update(wbfile.receivertip_id for wbfile in wbfiles)
+    rtips_ids.update(iar.receivertip_id for iar in iars)
+
+    if rtips_ids:
+        for rtip, itip in session.query(models.ReceiverTip, models.InternalTip) \
+                                 .filter(models.ReceiverTip.id.in_(rtips_ids),
+                                         models.InternalTip.id == models.ReceiverTip.internaltip_id):
+            data['rtips'][rtip.id] = rtip
+            data['itips'][itip.id] = itip
+
+    users_ids = set(c.author_id for c in comments if c.author_id is not None)
+    users_ids.update(rtip.receiver_id for rtip in data['rtips'].values())
+    users_ids.update(iar.reply_user_id for iar in iars if iar.reply_user_id is not None)
+
+    if users_ids:
+        for user in session.query(models.User).filter(models.User.id.in_(users_ids)):
+            data['users'][user.id] = user
+
+    ifiles_ids = set(rfile.internalfile_id for rfile in rfiles)
+
+    if ifiles_ids:
+        for ifile in session.query(models.InternalFile).filter(models.InternalFile.id.in_(ifiles_ids)):
+            data['ifiles'][ifile.id] = ifile
+
+    return data
+
+
 # InternaltFile
 def serialize_ifile(session, ifile):
     return {
@@ -16,10 +54,11 @@ def serialize_ifile(session, ifile):
 
 
 # ReceiverFile
-def serialize_rfile(session, tid, rfile):
-    ifile = session.query(models.InternalFile) \
-                 .filter(models.InternalFile.id == models.ReceiverFile.internalfile_id,
-                         models.ReceiverFile.id == rfile.id).one()
+def serialize_rfile(session, tid, rfile, data=None):
+    if data is None:
+        data = db_prepare_tip_serialization(session, rfiles=[rfile])
+
+    ifile = data['ifiles'][rfile.internalfile_id]
 
     return {
         'id': rfile.id,
@@ -33,9 +72,11 @@ def serialize_rfile(session, tid, rfile):
     }
 
 # WhistleblowerFile
-def serialize_wbfile(session, tid, wbfile):
-    receiver_id = session.query(models.ReceiverTip.receiver_id) \
-                         .filter(models.ReceiverTip.id == wbfile.receivertip_id).one()
+def serialize_wbfile(session, tid, wbfile, data=None):
+    if data is None:
+        data = db_prepare_tip_serialization(session, wbfiles=[wbfile])
+
+    receiver_id = data['rtips'][wbfile.receivertip_id].receiver_id
 
     return {
         'id': wbfile.id,
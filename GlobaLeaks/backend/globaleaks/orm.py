@@ -1,20 +1,62 @@
 # -*- coding: utf-8
 import random
+import re
+import threading
 import time
 import platform
 
+from collections import Counter, deque
+
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
-
-from twisted.internet import reactor
+from twisted.internet import defer, reactor
 from twisted.internet.threads import deferToThreadPool
-from globaleaks.utils.utility import datetime_now, deferred_sleep, log
+from twisted.python import context
+from globaleaks.rest import errors
+from globaleaks.utils.utility import datetime_now, datetime_to_ISO8601, deferred_sleep, log
 
 
 __DB_URI = 'sqlite:'
 __THREAD_POOL = None
+__RO_THREAD_POOL = None
+__ENGINES = {}
+__ENGINES_LOCK = threading.Lock()
+__TRANSACTION_STATS = {}
+__TRANSACTION_STATS_LOCK = threading.Lock()
+__WRITE_MAX_WAIT = 60
+__PROFILING = False
+
+# Default number of pooled connections used when the thread pool
+# in use does not declare its maximum size
+DEFAULT_POOL_SIZE = 16
+
+# Number of additional connections allowed for callers running outside
+# of the thread pool (e.g. transact_sync, migrations, gl-admin)
+POOL_OVERFLOW = 4
+
+# Max number of seconds a transaction waits for a pooled connection
+POOL_TIMEOUT = 30
+
+# Bounds of the jittered exponential backoff applied when the database is locked
+LOCK_BACKOFF_MIN = 0.01
+LOCK_BACKOFF_MAX = 1.0
+
+# Key used to bind a QueryProfile to the twisted context of a request
+QUERY_PROFILE_KEY = 'query_profile'
+
+# Thresholds over which a query profile is logged and recorded
+QUERY_PROFILE_STATEMENTS_THRESHOLD = 100
+QUERY_PROFILE_REPEAT_THRESHOLD = 20
+
+# Ring buffer of the query profiles exceeding the thresholds
+query_profiles = deque(maxlen=100)
+
+# Profile of the transaction running on the current thread
+_profile_local = threading.local()
 
 
 def make_db_uri(db_file):
@@ -43,23 +85,306 @@ def get_db_uri():
     return __DB_URI
 
 
-def get_engine(db_uri=None, foreign_keys=True):
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool keeping track of connection reuse:
+      - hit: checkout served by an already opened connection
+      - miss: checkout requiring the creation of a new physical connection
+      - wait: checkout issued while all the connections were busy
+    """
+    def __init__(self, *args, **kwargs):
+        QueuePool.__init__(self, *args, **kwargs)
+        self.counters = {'checkout': 0, 'miss': 0, 'wait': 0}
+
+    def _do_get(self):
+        self.counters['checkout'] += 1
+
+        if self.checkedout() >= self.size() + max(self._max_overflow, 0):
+            self.counters['wait'] += 1
+
+        return QueuePool._do_get(self)
+
+    def _create_connection(self):
+        self.counters['miss'] += 1
+        return QueuePool._create_connection(self)
+
+    def recreate(self):
+        pool = QueuePool.recreate(self)
+        pool.counters = self.counters
+        return pool
+
+
+def get_pool_size(readonly=False):
+    thread_pool = get_ro_thread_pool() if readonly else get_thread_pool()
+    return getattr(thread_pool, 'max', DEFAULT_POOL_SIZE)
+
+
+def _set_pragmas(foreign_keys, readonly):
+    def on_connect(conn, record):
+        # auto_vacuum needs to be configured before the switch to WAL
+        # initializes the header of newly created databases
+        conn.execute('pragma auto_vacuum=FULL')
+
+        # WAL allows readers to proceed while a write transaction is in progress
+        conn.execute('pragma journal_mode=WAL')
+
+        if foreign_keys:
+            conn.execute('pragma foreign_keys=ON')
+
+        if readonly:
+            conn.execute('pragma query_only=ON')
+
+    return on_connect
+
+
+class QueryProfile(object):
+    """
+    Statistics of the SQL statements issued by one or more transactions.
+
+    Statements are grouped by shape, i.e. the SQL text with the expanded
+    parameter lists collapsed, so that a shape issued many times within the
+    same profile reveals a query executed per row (N+1).
+    """
+    _collapse_params = re.compile(r'\?(?:, \?)+')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def add(self, statement, duration):
+        with self.lock:
+            self.statements += 1
+            self.duration += duration
+            self.shapes[self._collapse_params.sub('?', statement)] += 1
+
+    def merge(self, other):
+        with self.lock:
+            self.statements += other.statements
+            self.duration += other.duration
+            self.shapes.update(other.shapes)
+
+    def max_repeat(self):
+        return max(self.shapes.values()) if self.shapes else 0
+
+    def exceeds_thresholds(self):
+        return self.statements > QUERY_PROFILE_STATEMENTS_THRESHOLD or \
+               self.max_repeat() > QUERY_PROFILE_REPEAT_THRESHOLD
+
+    def serialize(self):
+        with self.lock:
+            return {
+                'statements': self.statements,
+                'duration': self.duration,
+                'repeated': [{'statement': shape, 'count': count}
+                             for shape, count in self.shapes.most_common(5) if count > 1]
+            }
+
+
+def set_profiling(enabled):
+    global __PROFILING
+    __PROFILING = enabled
+
+
+def get_profiling():
+    global __PROFILING
+    return __PROFILING
+
+
+def record_query_profile(name, profile):
+    """
+    Log and record in the ring buffer a profile exceeding the thresholds
+
+    :param name: the name of the transaction or handler profiled
+    :param profile: the QueryProfile
+    """
+    if not profile.exceeds_thresholds():
+        return
+
+    log.err("Query profile of %s exceeded thresholds: %d statements (max repeat %d) in %.3f seconds",
+            name, profile.statements, profile.max_repeat(), profile.duration)
+
+    entry = profile.serialize()
+    entry['name'] = name
+    entry['date'] = datetime_to_ISO8601(datetime_now())
+    query_profiles.append(entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, ctx, executemany):
+    if getattr(_profile_local, 'profile', None) is not None:
+        _profile_local.start = time.time()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, ctx, executemany):
+    profile = getattr(_profile_local, 'profile', None)
+    if profile is not None:
+        profile.add(statement, time.time() - _profile_local.start)
+
+
+def get_engine(db_uri=None, foreign_keys=True, readonly=False):
+    """
+    Return the process wide engine associated to the provided db uri.
+
+    Engines are created once and kept in a registry so that all the
+    transactions share a bounded pool of warm connections; the
+    connection pragmas are applied once per physical connection.
+    """
     if db_uri is None:
         db_uri = get_db_uri()
 
-    engine = create_engine(db_uri, connect_args={'timeout': 30})
+    key = (db_uri, foreign_keys, readonly)
 
-    if foreign_keys:
-        def on_connect(conn, record):
-            conn.execute('pragma foreign_keys=ON')
+    with __ENGINES_LOCK:
+        entry = __ENGINES.get(key)
+        if entry is None:
+            kwargs = {'connect_args': {'timeout': 30}}
+
+            # In-memory databases cannot be shared across a pool of connections
+            if make_url(db_uri).database not in (None, '', ':memory:'):
+                kwargs['poolclass'] = InstrumentedQueuePool
+                kwargs['pool_size'] = get_pool_size(readonly)
+                kwargs['max_overflow'] = POOL_OVERFLOW
+                kwargs['pool_timeout'] = POOL_TIMEOUT
+                kwargs['connect_args']['check_same_thread'] = False
 
-        event.listen(engine, 'connect', on_connect)
+            engine = create_engine(db_uri, **kwargs)
 
-    return engine
+            event.listen(engine, 'connect', _set_pragmas(foreign_keys, readonly))
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
 
+            entry = __ENGINES[key] = (engine, sessionmaker(bind=engine))
 
-def get_session(db_uri=None, foreign_keys=True):
-    return sessionmaker(bind=get_engine(db_uri, foreign_keys))()
+    return entry[0]
+
+
+def get_session(db_uri=None, foreign_keys=True, readonly=False):
+    if db_uri is None:
+        db_uri = get_db_uri()
+
+    get_engine(db_uri, foreign_keys, readonly)
+
+    return __ENGINES[(db_uri, foreign_keys, readonly)][1]()
+
+
+def dispose_engines(db_uri=None):
+    """
+    Close the pooled connections of the engines associated to the provided
+    db uri (or of all the engines) and remove them from the registry.
+
+    This has to be invoked every time a database file is replaced on disk.
+    """
+    with __ENGINES_LOCK:
+        for key in list(__ENGINES):
+            if db_uri is None or key[0] == db_uri:
+                __ENGINES.pop(key)[0].dispose()
+
+
+def get_engine_stats():
+    """
+    Return the pool counters of every engine in the registry
+    """
+    ret = []
+
+    with __ENGINES_LOCK:
+        for (db_uri, foreign_keys, readonly), (engine, _) in __ENGINES.items():
+            pool = engine.pool
+            if not isinstance(pool, InstrumentedQueuePool):
+                continue
+
+            stats = {
+                'hit': pool.counters['checkout'] - pool.counters['miss'],
+                'miss': pool.counters['miss'],
+                'wait': pool.counters['wait'],
+                'db_uri': db_uri,
+                'foreign_keys': foreign_keys,
+                'readonly': readonly,
+                'size': pool.size(),
+                'checkedout': pool.checkedout()
+            }
+            ret.append(stats)
+
+    return ret
+
+
+def set_write_max_wait(seconds):
+    global __WRITE_MAX_WAIT
+    __WRITE_MAX_WAIT = seconds
+
+
+def get_write_max_wait():
+    global __WRITE_MAX_WAIT
+    return __WRITE_MAX_WAIT
+
+
+class WriteQueue(object):
+    """
+    Admission queue of the write transactions.
+
+    Write transactions are serialized by the thread of the writer lane so
+    that they do not compete on the database lock; the queue accounts for
+    the transactions dispatched to the lane and not yet started so that the
+    ones waiting longer than the configured max wait could be refused.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = 0
+
+    def enqueue(self):
+        """
+        Account a transaction dispatched to the writer lane; return the dispatch time
+        """
+        with self.lock:
+            self.waiting += 1
+
+        return time.time()
+
+    def admit(self, dispatch_time):
+        """
+        Account the start of a transaction; return the time spent in queue
+        """
+        with self.lock:
+            self.waiting -= 1
+
+        return time.time() - dispatch_time
+
+
+write_queue = WriteQueue()
+
+
+def get_lock_backoff(attempt):
+    """
+    Return the jittered exponential delay to be applied before the next attempt
+    """
+    return random.uniform(0, min(LOCK_BACKOFF_MAX, LOCK_BACKOFF_MIN * 2 ** attempt))
+
+
+def get_transaction_stats():
+    """
+    Return the counters of every decorated function executed
+    """
+    with __TRANSACTION_STATS_LOCK:
+        return [dict(stats, name=name) for name, stats in sorted(__TRANSACTION_STATS.items())]
+
+
+def reset_transaction_stats():
+    with __TRANSACTION_STATS_LOCK:
+        __TRANSACTION_STATS.clear()
+
+
+def update_transaction_stats(name, **kwargs):
+    with __TRANSACTION_STATS_LOCK:
+        stats = __TRANSACTION_STATS.setdefault(name, {
+            'calls': 0,
+            'attempts': 0,
+            'lock_waits': 0,
+            'wait_time': 0.0,
+            'rollbacks': 0
+        })
+
+        for key, value in kwargs.items():
+            stats[key] += value
 
 
 def set_thread_pool(thread_pool):
@@ -72,10 +397,25 @@ def get_thread_pool():
     return __THREAD_POOL
 
 
+def set_ro_thread_pool(thread_pool):
+    global __RO_THREAD_POOL
+    __RO_THREAD_POOL = thread_pool
+
+
+def get_ro_thread_pool():
+    global __RO_THREAD_POOL
+    return __RO_THREAD_POOL if __RO_THREAD_POOL is not None else __THREAD_POOL
+
+
 class transact(object):
     """
     Class decorator for managing transactions.
+
+    Transactions are executed on the writer lane, a thread pool
+    serializing all the write transactions of the process.
     """
+    readonly = False
+
     def __init__(self, method):
         self.method = method
         self.instance = None
@@ -85,47 +425,135 @@ class transact(object):
         return self
 
     def __call__(self, *args, **kwargs):
-        return self.run(self._wrap, self.method, *args, **kwargs)
+        # the wait of the write transactions is measured from their dispatch
+        # to the writer lane so to include the time spent in its queue
+        dispatch_time = None if self.readonly else write_queue.enqueue()
+
+        return self.run(self._wrap, self.method, dispatch_time, *args, **kwargs)
+
+    def get_thread_pool(self):
+        return get_thread_pool()
 
     def run(self, function, *args, **kwargs):
-        return deferToThreadPool(reactor,
-                                 get_thread_pool(),
-                                 function,
-                                 *args,
-                                 **kwargs)
+        d = deferToThreadPool(reactor,
+                              self.get_thread_pool(),
+                              function,
+                              *args,
+                              **kwargs)
+
+        profile = context.get(QUERY_PROFILE_KEY)
+        if profile is None:
+            return d
+
+        # the callbacks of the result are fired by the reactor outside of the
+        # context of the request; they are run within it so that the further
+        # transactions dispatched by the handler are profiled as well
+        ret = defer.Deferred()
+        d.addBoth(lambda result: context.call({QUERY_PROFILE_KEY: profile}, ret.callback, result))
+
+        return ret
 
-    def _wrap(self, function, *args, **kwargs):
+    def _wrap(self, function, dispatch_time, *args, **kwargs):
         """
         Wrap provided function calling it inside a thread and
         passing the store to it.
+
+        Write transactions queued on the writer lane longer than the configured
+        max wait are refused; on a locked database the transaction is retried
+        with a jittered exponential backoff until the max wait is reached.
         """
-        session = get_session()
+        name = '%s.%s' % (function.__module__, function.__name__)
+        max_wait = get_write_max_wait()
+        wait_time = 0.0
+        attempt = 0
+
+        update_transaction_stats(name, calls=1)
+
+        if not self.readonly:
+            wait_time = write_queue.admit(dispatch_time)
+            if wait_time > max_wait:
+                log.err("Transaction %s refused after waiting %.2f seconds in queue", name, wait_time)
+                raise errors.DatabaseBusy
+
+            if wait_time > LOCK_BACKOFF_MIN:
+                update_transaction_stats(name, lock_waits=1, wait_time=wait_time)
+
+        previous_profile = getattr(_profile_local, 'profile', None)
+        profile = QueryProfile() if get_profiling() else None
+        _profile_local.profile = profile
 
         try:
-            while True:
-                try:
-                    if self.instance:
-                        result = function(self.instance, session, *args, **kwargs)
+            session = get_session(readonly=self.readonly)
+
+            try:
+                while True:
+                    update_transaction_stats(name, attempts=1)
+
+                    try:
+                        if self.instance:
+                            result = function(self.instance, session, *args, **kwargs)
+                        else:
+                            result = function(session, *args, **kwargs)
+
+                        if self.readonly:
+                            session.rollback()
+                        else:
+                            session.commit()
+                    except OperationalError as e:
+                        session.rollback()
+                        update_transaction_stats(name, rollbacks=1)
+
+                        if "database is locked" not in str(e):
+                            raise
+
+                        delay = get_lock_backoff(attempt)
+                        if wait_time + delay > max_wait:
+                            log.err("Transaction %s refused after waiting %.2f seconds for the database lock", name, wait_time)
+                            raise errors.DatabaseBusy
+
+                        update_transaction_stats(name, lock_waits=1, wait_time=delay)
+                        time.sleep(delay)
+                        wait_time += delay
+                        attempt += 1
+                    except:
+                        session.rollback()
+                        update_transaction_stats(name, rollbacks=1)
+                        raise
                     else:
-                        result = function(session, *args, **kwargs)
+                        return result
+            finally:
+                session.close()
+        finally:
+            _profile_local.profile = previous_profile
 
-                    session.commit()
-                except OperationalError as e:
-                    session.rollback()
+            if profile is not None:
+                self._conclude_profile(name, profile)
 
-                    if "database is locked" not in str(e):
-                        raise
+    def _conclude_profile(self, name, profile):
+        """
+        Record the query profile of the transaction and merge it into the
+        profile of the request that issued it, if any.
+        """
+        record_query_profile(name, profile)
 
-                    time.sleep(0.1)
-                except:
-                    session.rollback()
-                    raise
-                else:
-                    return result
-        finally:
-            session.close()
+        request_profile = context.get(QUERY_PROFILE_KEY)
+        if request_profile is not None:
+            request_profile.merge(profile)
 
 
 class transact_sync(transact):
     def run(self, function, *args, **kwargs):
         return function(*args, **kwargs)
+
+
+class transact_ro(transact):
+    """
+    Class decorator for managing read only transactions.
+
+    Read only transactions are executed on a dedicated thread pool
+    using read only connections so that they never wait on the writer lane.
+    """
+    readonly = True
+
+    def get_thread_pool(self):
+        return get_ro_thread_pool()
@@ -5,7 +5,6 @@
 #   This file defines the URI mapping for the GlobaLeaks API and its factory
 
 import json
-import re
 import sys
 import types
 
@@ -14,10 +13,12 @@ from six.moves.urllib.parse import urlparse, urlsplit, urlunparse, urlunsplit #
 
 from twisted.internet import defer
 from twisted.internet.abstract import isIPAddress, isIPv6Address
+from twisted.python import context
+from twisted.web.http import HTTPChannel, RESPONSES
 from twisted.web.resource import Resource
-from twisted.web.server import NOT_DONE_YET
+from twisted.web.server import NOT_DONE_YET, Request
 
-from globaleaks import LANGUAGES_SUPPORTED_CODES
+from globaleaks import LANGUAGES_SUPPORTED_CODES, orm
 from globaleaks.handlers import custodian, \
                                 email_validation, \
                                 exception, \
@@ -52,9 +53,24 @@ from globaleaks.handlers.admin import statistics as admin_statistics
 from globaleaks.handlers.admin import step as admin_step
 from globaleaks.handlers.admin import tenant as admin_tenant
 from globaleaks.handlers.admin import user as admin_user
+from globaleaks.handlers.base import BaseHandler
 from globaleaks.rest import apicache, requests, errors
+from globaleaks.rest.router import Router
 from globaleaks.settings import Settings
 from globaleaks.state import State, extract_exception_traceback_and_schedule_email
+from globaleaks.utils.jsonstream import JSONDepthScanner
+
+# maximum nesting depth of the JSON bodies of the requests
+MAX_JSON_DEPTH = 64
+
+# Accept-Language headers longer than this are negotiated without being memoized
+ACCEPT_LANGUAGE_CACHE_MAX_KEY_SIZE = 256
+
+# marker of the Accept-Language headers not yet memoized
+NOT_NEGOTIATED = object()
+
+# allowance for the multipart encoding of the chunks of the uploaded files
+UPLOAD_ENCODING_OVERHEAD = 64 * 1024
 
 uuid_regexp = r'([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})'
 key_regexp = r'([a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12}|[a-z_]{0,100})'
@@ -135,6 +151,7 @@ api_spec = [
     (r'/admin/activities/(summary|details)', admin_statistics.RecentEventsCollection),
     (r'/admin/anomalies', admin_statistics.AnomalyCollection),
     (r'/admin/jobs', admin_statistics.JobsTiming),
+    (r'/admin/metrics', admin_statistics.MetricsCollection),
     (r'/admin/l10n/(' + '|'.join(LANGUAGES_SUPPORTED_CODES) + ')', admin_l10n.AdminL10NHandler),
     (r'/admin/files/(logo|favicon|css|homepage|script)', admin_file.FileInstance),
     (r'/admin/config', admin_config.AdminConfigHandler),
@@ -168,11 +185,17 @@ api_spec = [
 ]
 
 
-def decorate_method(h, method):
+def get_roles(h):
     value = getattr(h, 'check_roles')
     if isinstance(value, str):
         value = {value}
 
+    return value
+
+
+def decorate_method(h, method):
+    value = get_roles(h)
+
     f = getattr(h, method)
 
     if State.settings.enable_api_cache:
@@ -192,14 +215,136 @@ def decorate_method(h, method):
     setattr(h, method, f)
 
 
+def get_headers(tenant_cache, language):
+    """
+    Return the headers set on every response of the tenant in the specified language
+    """
+    headers = [(b'Server', b'Globaleaks')]
+
+    if language is not None:
+        headers.append((b'Content-Language', language.encode()))
+
+    headers += [
+        # to reduce possibility for XSS attacks.
+        (b'X-Content-Type-Options', b'nosniff'),
+        (b'X-XSS-Protection', b'1; mode=block'),
+
+        # to disable caching
+        (b'Cache-control', b'no-cache, no-store, must-revalidate'),
+        (b'Pragma', b'no-cache'),
+        (b'Expires', b'-1'),
+
+        # to avoid information leakage via referrer
+        (b'Referrer-Policy', b'no-referrer')
+    ]
+
+    # to avoid Robots spidering, indexing, caching
+    if not tenant_cache.allow_indexing:
+        headers.append((b'X-Robots-Tag', b'noindex'))
+
+    # to mitigate clickjaking attacks on iframes allowing only same origin
+    # same origin is needed in order to include svg and other html <object>
+    if not tenant_cache.allow_iframes_inclusion:
+        headers.append((b'X-Frame-Options', b'sameorigin'))
+
+    return headers
+
+
+def get_error_response(e):
+    return json.dumps({
+        'error_message': e.reason,
+        'error_code': e.error_code,
+        'arguments': getattr(e, 'arguments', [])
+    }).encode()
+
+
+class APIChannel(HTTPChannel):
+    """
+    A channel setting the method and the URI of a request as soon as its
+    request line is received, so that they are known while receiving its body
+    """
+    def lineReceived(self, line):
+        last = self.requests[-1] if self.requests else None
+
+        HTTPChannel.lineReceived(self, line)
+
+        if self.requests and self.requests[-1] is not last:
+            parts = line.split()
+            if len(parts) == 3:
+                self.requests[-1].method, self.requests[-1].uri = parts[0], parts[1]
+
+
+class APIRequest(Request):
+    """
+    A request checking its body against the limits of the handler of its
+    route while it is received, so that oversize or too deeply nested
+    payloads are rejected before being buffered
+    """
+    body_size = 0
+    size_limit = None
+    size_error = None
+    json_scanner = None
+    rejected = False
+
+    def gotLength(self, length):
+        self.size_limit, depth_limit, self.size_error = self.channel.site.resource.get_body_limits(self)
+
+        if length is not None and length > self.size_limit:
+            self.reject(self.size_error)
+            return
+
+        Request.gotLength(self, length)
+
+        if depth_limit is not None:
+            self.json_scanner = JSONDepthScanner(depth_limit)
+
+    def handleContentChunk(self, data):
+        if self.rejected:
+            return
+
+        # the length could be unknown in advance when the body is chunked
+        self.body_size += len(data)
+        if self.body_size > self.size_limit:
+            self.reject(self.size_error)
+            return
+
+        if self.json_scanner is not None:
+            try:
+                self.json_scanner.feed(data)
+            except ValueError as e:
+                self.reject(errors.InputValidationError(str(e)))
+                return
+
+        Request.handleContentChunk(self, data)
+
+    def requestReceived(self, command, path, version):
+        if not self.rejected:
+            Request.requestReceived(self, command, path, version)
+
+    def reject(self, e):
+        """
+        Reply with the error and close the connection without waiting the rest of the body
+        """
+        self.rejected = True
+
+        body = get_error_response(e)
+
+        self.channel.transport.write(b'HTTP/1.1 %d %s\r\n'
+                                     b'Content-Type: application/json\r\n'
+                                     b'Content-Length: %d\r\n'
+                                     b'Connection: close\r\n\r\n' % (e.status_code, RESPONSES[e.status_code], len(body)) + body)
+
+        self.channel.loseConnection()
+
+
 class APIResourceWrapper(Resource):
-    _registry = None
+    _router = None
     isLeaf = True
     method_map = {'get': 200, 'post': 201, 'put': 202, 'delete': 200}
 
     def __init__(self):
         Resource.__init__(self)
-        self._registry = []
+        self._router = Router()
         self.handler = None
 
         for tup in api_spec:
@@ -209,19 +354,17 @@ class APIResourceWrapper(Resource):
             else:
                 pattern, handler, args = tup
 
-            if not pattern.startswith("^"):
-                pattern = "^" + pattern
-
-            if not pattern.endswith("$"):
-                pattern += "$"
-
             if not hasattr(handler, '_decorated'):
                 handler._decorated = True
                 for m in ['get', 'put', 'post', 'delete']:
                     if hasattr(handler, m):
                         decorate_method(handler, m)
 
-            self._registry.append((re.compile(pattern), handler, args))
+                if handler.upload_handler:
+                    # the testChunks requests of Flow.js require the same roles of the upload
+                    handler.check_file_chunk = BaseHandler.decorator_authentication(BaseHandler.check_file_chunk, get_roles(handler))
+
+            self._router.add(pattern, handler, args)
 
     def should_redirect_https(self, request):
         hostname = request.hostname
@@ -289,13 +432,44 @@ class APIResourceWrapper(Resource):
         request.setResponseCode(e.status_code)
         request.setHeader(b'content-type', b'application/json')
 
-        response = json.dumps({
-            'error_message': e.reason,
-            'error_code': e.error_code,
-            'arguments': getattr(e, 'arguments', [])
-        })
+        request.write(get_error_response(e))
+
+    def get_tid(self, hostname):
+        if (hostname == b'localhost' or
+            isIPAddress(hostname) or
+            isIPv6Address(hostname)):
+            return 1
+
+        return State.tenant_hostname_id_map.get(hostname, 1)
+
+    def get_body_limits(self, request):
+        """
+        Return the maximum size of the body of a request being received, the
+        maximum nesting depth of its JSON content (None if it is not JSON)
+        and the error to be reported if the size limit is exceeded
+
+        @param request: a `twisted.web.Request` whose headers have been received
+        """
+        path = request.uri.split(b'?', 1)[0]
+
+        try:
+            route, _ = self._router.lookup(path.decode('utf-8'))
+        except UnicodeDecodeError:
+            route = None
+
+        handler = route[1] if route is not None else BaseHandler
 
-        request.write(response.encode())
+        if handler.upload_handler and request.method == b'POST':
+            tid = self.get_tid(request.getRequestHostname().split(b':')[0])
+            maximum_filesize = State.tenant_cache[tid].maximum_filesize
+
+            return (maximum_filesize * 1024 * 1024 + UPLOAD_ENCODING_OVERHEAD,
+                    None,
+                    errors.FileTooBig(maximum_filesize))
+
+        return (handler.max_body_size,
+                MAX_JSON_DEPTH,
+                errors.RequestEntityTooLarge(handler.max_body_size))
 
     def preprocess(self, request):
         request.headers = request.getAllHeaders()
@@ -311,13 +485,7 @@ class APIResourceWrapper(Resource):
 
         request.hostname = request.hostname.split(b':')[0]
         request.port = request.getHost().port
-
-        if (request.hostname == b'localhost' or
-            isIPAddress(request.hostname) or
-            isIPv6Address(request.hostname)):
-            request.tid = 1
-        else:
-            request.tid = State.tenant_hostname_id_map.get(request.hostname, 1)
+        request.tid = self.get_tid(request.hostname)
 
         request.client_ip = request.headers.get(b'gl-forwarded-for')
         request.client_proto = b'https'
@@ -367,25 +535,25 @@ class APIResourceWrapper(Resource):
             self.redirect_https(request)
             return b''
 
-        match = None
-        for regexp, handler, args in self._registry:
-            try:
-                match = regexp.match(request.path.decode('utf-8'))
-            except UnicodeDecodeError:
-                match = None
-            if match:
-                break
+        try:
+            match, handler, args = self._router.match(request.path.decode('utf-8'))
+        except UnicodeDecodeError:
+            match = None
 
         if match is None:
             self.handle_exception(errors.ResourceNotFound(), request)
             return b''
 
         method = request.method.lower().decode('utf-8')
-        if not method in self.method_map.keys() or not hasattr(handler, method):
+
+        if handler.upload_handler and method == 'get' and b'flowChunkNumber' in request.args:
+            # the testChunks requests issued by Flow.js to resume an upload
+            f = handler.check_file_chunk
+        elif not method in self.method_map.keys() or not hasattr(handler, method):
             self.handle_exception(errors.MethodNotImplemented(), request)
             return b''
-
-        f = getattr(handler, method)
+        else:
+            f = getattr(handler, method)
         groups = [text_type(g) for g in match.groups()]
 
         self.handler = handler(State, request, **args)
@@ -396,16 +564,31 @@ class APIResourceWrapper(Resource):
             self.handle_exception(errors.ForbiddenOperation(), request)
             return b''
 
-        if self.handler.upload_handler and method == 'post':
-            self.handler.process_file_upload()
-            if self.handler.uploaded_file is None:
-               return b''
+        handler_instance = self.handler
+
+        def call_handler(_):
+            if handler_instance.upload_handler and method == 'post' and handler_instance.uploaded_file is None:
+                # the file is still being uploaded
+                return None
 
-        d = defer.maybeDeferred(f, self.handler, *groups)
+            if orm.get_profiling():
+                # bind a query profile to the transactions started by the handler
+                request.query_profile = orm.QueryProfile()
+                return context.call({orm.QUERY_PROFILE_KEY: request.query_profile},
+                                    defer.maybeDeferred, f, handler_instance, *groups)
+
+            return f(handler_instance, *groups)
+
+        if self.handler.upload_handler and method == 'post':
+            # the chunks are written in a thread and so the handler is called once they are on disk
+            d = defer.maybeDeferred(self.handler.process_file_upload)
+            d.addCallback(call_handler)
+        else:
+            d = defer.maybeDeferred(call_handler, None)
 
         @defer.inlineCallbacks
         def concludeHandlerFailure(err):
-            yield self.handler.execution_check()
+            yield handler_instance.execution_check()
 
             self.handle_exception(err, request)
 
@@ -419,7 +602,7 @@ class APIResourceWrapper(Resource):
 
             @param ret: A `dict`, `list`, `str`, `None` or something unexpected
             """
-            yield self.handler.execution_check()
+            yield handler_instance.execution_check()
 
             if not request_finished[0]:
                 if ret is not None:
@@ -440,30 +623,15 @@ class APIResourceWrapper(Resource):
         return NOT_DONE_YET
 
     def set_headers(self, request):
-        request.setHeader("Server", "Globaleaks")
-
-        request.setHeader('Content-Language', request.language)
+        tenant_cache = State.tenant_cache[request.tid]
 
-        # to reduce possibility for XSS attacks.
-        request.setHeader("X-Content-Type-Options", "nosniff")
-        request.setHeader("X-XSS-Protection", "1; mode=block")
-
-        # to disable caching
-        request.setHeader("Cache-control", "no-cache, no-store, must-revalidate")
-        request.setHeader("Pragma", "no-cache")
-        request.setHeader("Expires", "-1")
-
-        # to avoid information leakage via referrer
-        request.setHeader("Referrer-Policy", "no-referrer")
+        # the headers are computed once per language after every refresh of the tenant settings
+        headers = tenant_cache.headers.get(request.language)
+        if headers is None:
+            headers = tenant_cache.headers[request.language] = get_headers(tenant_cache, request.language)
 
-        # to avoid Robots spidering, indexing, caching
-        if not State.tenant_cache[request.tid].allow_indexing:
-            request.setHeader("X-Robots-Tag", "noindex")
-
-        # to mitigate clickjaking attacks on iframes allowing only same origin
-        # same origin is needed in order to include svg and other html <object>
-        if not State.tenant_cache[request.tid].allow_iframes_inclusion:
-            request.setHeader("X-Frame-Options", "sameorigin")
+        for name, value in headers:
+            request.responseHeaders.setRawHeaders(name, [value])
 
         request.setHeader(b'x-check-tor', bytes(request.client_using_tor))
 
@@ -488,13 +656,26 @@ class APIResourceWrapper(Resource):
 
         return State.tenant_cache[request.tid].default_language
 
+    def negotiate_language(self, request):
+        """
+        Return the first enabled language among the ones accepted by the client
+        or None if none of them is enabled
+        """
+        for l in self.parse_accept_language_header(request):
+            if l in State.tenant_cache[request.tid].languages_enabled:
+                return l
+
     def detect_language(self, request):
         language = request.headers.get(b'gl-language')
         if language is None:
-            for l in self.parse_accept_language_header(request):
-                if l in State.tenant_cache[request.tid].languages_enabled:
-                    language = l
-                    break
+            accept_language = request.headers.get(b'accept-language')
+            if accept_language is not None and len(accept_language) <= ACCEPT_LANGUAGE_CACHE_MAX_KEY_SIZE:
+                cache = State.tenant_cache[request.tid].accept_language_cache
+                language = cache.get(accept_language, NOT_NEGOTIATED)
+                if language is NOT_NEGOTIATED:
+                    language = cache.set(accept_language, self.negotiate_language(request))
+            else:
+                language = self.negotiate_language(request)
         else:
             language = text_type(language, 'utf-8')
 
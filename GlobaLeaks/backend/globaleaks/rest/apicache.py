@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import io
 import gzip
 import json
-import types
+from collections import namedtuple, OrderedDict
 
 from six import text_type, binary_type
 
@@ -21,44 +22,206 @@ def gzipdata(data):
     return fgz.getvalue()
 
 
+# An entry keeps both the gzip and the identity encoding of a resource
+# together with the strong ETag computed on its content at insert time
+# and the tags of the models and config groups it has been built from
+ApiCacheEntry = namedtuple('ApiCacheEntry', ['content_type', 'gzip', 'identity', 'etag', 'tags'])
+
+# Tags of the root tenant settings and questionnaires inherited by the resources of the other tenants
+ROOT_TENANT_SHARED_TAGS = frozenset(['Config', 'Questionnaire', 'Step', 'Field'])
+
+
+def accepts_gzip(request):
+    return b'gzip' in (request.getHeader(b'accept-encoding') or b'')
+
+
+def etag_matches(request, etag):
+    """
+    Check if the If-None-Match header of the request matches the ETag
+    """
+    if_none_match = request.getHeader(b'if-none-match')
+    if if_none_match is None:
+        return False
+
+    etags = [x.strip() for x in if_none_match.split(b',')]
+
+    return b'*' in etags or etag in etags
+
+
 class ApiCache(object):
+    """
+    A least recently used cache of the API resources bounded by the
+    total number of bytes of the cached payloads
+    """
     memory_cache_dict = {}
 
+    # entries ordered from the least to the most recently used
+    lru = OrderedDict()
+
+    max_size = 64 * 1024 * 1024 # 64MB
+    size = 0
+    tenant_size = {}
+
+    hits = 0
+    misses = 0
+    evictions = 0
+    not_modified = 0
+
+    # incremented on every invalidation to detect entries rebuilt on stale data
+    generation = 0
+
+    # tenants whose resources should be rebuilt in background (None means all)
+    warming_queue = set()
+
     @classmethod
     def get(cls, tid, resource, language):
-        if tid in cls.memory_cache_dict \
-           and resource in cls.memory_cache_dict[tid] \
-           and language in cls.memory_cache_dict[tid][resource]:
-            return cls.memory_cache_dict[tid][resource][language]
+        key = (tid, resource, language)
+        if key not in cls.lru:
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        cls.lru[key] = cls.lru.pop(key)
+
+        return cls.memory_cache_dict[tid][resource][language]
 
     @classmethod
-    def set(cls, tid, resource, language, content_type, data):
-        data = gzipdata(data)
+    def set(cls, tid, resource, language, content_type, data, tags=None, generation=None):
+        """
+        Cache the resource unless an invalidation happened after the specified
+        generation, that is while the data was being built
+        """
+        if isinstance(data, text_type):
+            data = data.encode()
+
+        entry = ApiCacheEntry(content_type,
+                              gzipdata(data),
+                              data,
+                              b'"' + hashlib.sha256(data).hexdigest().encode() + b'"',
+                              frozenset(tags) if tags is not None else None)
 
-        if tid not in ApiCache.memory_cache_dict:
-            cls.memory_cache_dict[tid] = {}
+        if generation is not None and generation != cls.generation:
+            return entry
 
-        if resource not in ApiCache.memory_cache_dict[tid]:
-            cls.memory_cache_dict[tid][resource] = {}
+        cls._remove(tid, resource, language)
 
-        entry = (content_type, data)
+        size = len(entry.gzip) + len(entry.identity)
+        if size > cls.max_size:
+            return entry
 
-        cls.memory_cache_dict[tid][resource][language] = entry
+        while cls.lru and cls.size + size > cls.max_size:
+            cls._remove(*next(iter(cls.lru)))
+            cls.evictions += 1
+
+        cls.memory_cache_dict.setdefault(tid, {}).setdefault(resource, {})[language] = entry
+        cls.lru[(tid, resource, language)] = size
+        cls.size += size
+        cls.tenant_size[tid] = cls.tenant_size.get(tid, 0) + size
 
         return entry
 
     @classmethod
-    def invalidate(cls, tid=None):
-        if tid is not None:
-            cls.memory_cache_dict.pop(tid, None)
+    def _remove(cls, tid, resource, language):
+        size = cls.lru.pop((tid, resource, language), None)
+        if size is None:
+            return
+
+        cls.size -= size
+        cls.tenant_size[tid] -= size
+
+        del cls.memory_cache_dict[tid][resource][language]
+
+        if not cls.memory_cache_dict[tid][resource]:
+            del cls.memory_cache_dict[tid][resource]
+
+        if not cls.memory_cache_dict[tid]:
+            del cls.memory_cache_dict[tid]
+            del cls.tenant_size[tid]
+
+    @classmethod
+    def invalidate(cls, tid=None, tags=None):
+        """
+        Invalidate the entries of the tenant (or of all the tenants if tid is None)
+
+        If tags are specified only the entries built from any of them are invalidated
+        """
+        cls.generation += 1
+        cls.warming_queue.add(tid)
+
+        if tags is not None:
+            for key in list(cls.lru):
+                entry = cls.memory_cache_dict[key[0]][key[1]][key[2]]
+                if (tid is None or key[0] == tid) and (entry.tags is None or entry.tags & tags):
+                    cls._remove(*key)
+        elif tid is not None:
+            for resource, languages in list(cls.memory_cache_dict.get(tid, {}).items()):
+                for language in list(languages):
+                    cls._remove(tid, resource, language)
         else:
             cls.memory_cache_dict.clear()
+            cls.lru.clear()
+            cls.tenant_size.clear()
+            cls.size = 0
+
+    @classmethod
+    def contains(cls, tid, resource, language):
+        return (tid, resource, language) in cls.lru
+
+    @classmethod
+    def pop_warming_queue(cls):
+        queue, cls.warming_queue = cls.warming_queue, set()
+        return queue
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.lru),
+            'size': cls.size,
+            'max_size': cls.max_size,
+            'tenant_size': dict(cls.tenant_size),
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions,
+            'not_modified': cls.not_modified
+        }
+
+
+def serve_cache_entry(request, entry):
+    """
+    Write the headers of the cached entry and return the variant of the
+    payload matching the encodings accepted by the client
+    """
+    etag = entry.etag
+    data = entry.identity
+
+    if accepts_gzip(request):
+        # the two encodings are distinct representations and so need distinct strong etags
+        etag = etag[:-1] + b'-gzip"'
+        data = entry.gzip
+        request.setHeader(b'Content-encoding', b'gzip')
+
+    request.setHeader(b'Content-type', entry.content_type)
+    request.setHeader(b'ETag', etag)
+    request.setHeader(b'Vary', b'Accept-Encoding')
+
+    if etag_matches(request, etag):
+        ApiCache.not_modified += 1
+        request.setResponseCode(304)
+        return None
+
+    return data
 
 
 def decorator_cache_get(f):
     def decorator_cache_get_wrapper(self, *args, **kwargs):
+        if '*' in self.check_roles:
+            # public resources could be stored by the client and revalidated with If-None-Match
+            self.request.setHeader(b'Cache-control', b'no-cache')
+
         c = ApiCache.get(self.request.tid, self.request.path, self.request.language)
         if c is None:
+            generation = ApiCache.generation
+
             d = defer.maybeDeferred(f, self, *args, **kwargs)
 
             def callback(data):
@@ -66,31 +229,44 @@ def decorator_cache_get(f):
                     self.request.setHeader(b'content-type', b'application/json')
                     data = json.dumps(data)
 
-                self.request.setHeader("Content-encoding", "gzip")
-
                 c = self.request.responseHeaders.getRawHeaders("Content-type", ["application/json"])[0]
-                return ApiCache.set(self.request.tid, self.request.path, self.request.language, c, data)[1]
+                return serve_cache_entry(self.request, ApiCache.set(self.request.tid, self.request.path, self.request.language, c, data, self.cache_tags, generation))
 
             d.addCallback(callback)
 
             return d
 
-        else:
-            self.request.setHeader("Content-encoding", "gzip")
-            self.request.setHeader("Content-type", c[0])
-
-        return c[1]
+        return serve_cache_entry(self.request, c)
 
     return decorator_cache_get_wrapper
 
 
 def decorator_cache_invalidate(f):
-    def decorator_cache_invalidate_wrapper(self, *args, **kwargs):
-        if self.invalidate_cache and self.request.tid != 1:
-            ApiCache.invalidate(self.request.tid)
-        else:
+    def invalidate(self):
+        if self.invalidate_global_cache:
             ApiCache.invalidate()
+        else:
+            tags = None if self.invalidate_cache is True else frozenset(self.invalidate_cache)
+
+            ApiCache.invalidate(self.request.tid, tags)
+
+            # the resources of every tenant inherit part of the root tenant settings
+            if self.request.tid == 1:
+                shared_tags = ROOT_TENANT_SHARED_TAGS if tags is None else tags & ROOT_TENANT_SHARED_TAGS
+                if shared_tags:
+                    ApiCache.invalidate(tags=shared_tags)
+
+    def decorator_cache_invalidate_wrapper(self, *args, **kwargs):
+        d = defer.maybeDeferred(f, self, *args, **kwargs)
+
+        # the invalidation follows the end of the write so that entries
+        # rebuilt while the transaction is in progress are discarded too
+        def callback(ret):
+            invalidate(self)
+            return ret
+
+        d.addBoth(callback)
 
-        return f(self, *args, **kwargs)
+        return d
 
     return decorator_cache_invalidate_wrapper
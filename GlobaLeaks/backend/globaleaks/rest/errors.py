@@ -189,3 +189,48 @@ class AccessLocationInvalid(GLException):
     reason = "IP Address not allows to login from this location"
     error_code = 17
     status_code = 401
+
+
+class DatabaseBusy(GLException):
+    """
+    Raised when a transaction cannot acquire the database within the max wait
+    """
+    reason = "The database is busy; please retry later"
+    error_code = 18
+    status_code = 503 # Service not available
+
+
+class RequestEntityTooLarge(GLException):
+    """
+    Raised when the body of a request exceeds the limit of its route
+    """
+    error_code = 19
+    status_code = 413 # Request Entity Too Large
+
+    def __init__(self, size_limit):
+        self.reason = "The body of the request exceeds the size limit (%d bytes)" % size_limit
+        self.arguments = [size_limit]
+
+
+class RangeNotSatisfiable(GLException):
+    """
+    Raised when the byte range requested does not overlap the content
+    """
+    error_code = 20
+    status_code = 416 # Requested Range Not Satisfiable
+
+    def __init__(self, size):
+        self.reason = "The requested range is not satisfiable (content size %d bytes)" % size
+        self.arguments = [size]
+
+
+class UploadQuotaExceeded(GLException):
+    """
+    Raised when the uploads of a session or submission token exceed their quota
+    """
+    error_code = 21
+    status_code = 429 # Too Many Requests
+
+    def __init__(self, quota):
+        self.reason = "The uploads exceed the quota (%d bytes)" % quota
+        self.arguments = [quota]
@@ -186,6 +186,24 @@ TipOpsDesc = {
     'args': dict
 }
 
+OpsValueDesc = {
+    'value': text_type
+}
+
+OpsOrderElementsDesc = {
+    'ids': [text_type]
+}
+
+OpsOrderStepsDesc = {
+    'questionnaire_id': uuid_regexp,
+    'ids': [text_type]
+}
+
+OpsTipSetDesc = {
+    'key': '^(enable_two_way_comments|enable_two_way_messages|enable_attachments|enable_notifications)$',
+    'value': bool
+}
+
 WhisleblowerIdentityAnswers = {
     'identity_field_id': uuid_regexp,
     'identity_field_answers': dict
@@ -276,6 +294,7 @@ AdminNotificationDesc = merge_dicts({
     'disable_receiver_notification_emails': bool,
     'tip_expiration_threshold': int,
     'notification_threshold_per_hour': int,
+    'notification_digest_interval': int,
     'reset_templates': bool
   },
   {k: text_type for k in NotificationL10NFactory.keys}
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+#   router
+#   ******
+#
+# Dispatch of the request paths to the API handlers.
+#
+# The routes are indexed by the first segment of their path whenever it is a
+# literal string so that a request is matched only against the routes sharing
+# its first segment and the few routes whose first segment is a regexp,
+# keeping the order of declaration of the routes as matching priority.
+import re
+from collections import Counter
+
+# characters that could not be part of a literal path segment
+REGEXP_META_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+# number of requests matched by each route pattern
+route_hits = Counter()
+
+
+def get_first_segment(path):
+    """
+    Return the first segment of a path or None if the path is not absolute
+    """
+    if not path.startswith('/'):
+        return None
+
+    return path[1:].split('/', 1)[0]
+
+
+def get_literal_first_segment(pattern):
+    """
+    Return the first segment of a route pattern if it is a literal string, None otherwise
+    """
+    pattern = pattern.lstrip('^')
+
+    if not pattern.startswith('/'):
+        return None
+
+    segment = re.split(r'[/$]', pattern[1:], 1)[0]
+
+    if REGEXP_META_CHARS.intersection(segment):
+        return None
+
+    return segment
+
+
+class Router(object):
+    def __init__(self):
+        self.routes = []
+
+        # indexes of the routes for each literal first segment
+        self.buckets = {}
+
+        # indexes of the routes that could match any first segment
+        self.fallback = []
+
+    def add(self, pattern, handler, args=None):
+        if not pattern.startswith("^"):
+            pattern = "^" + pattern
+
+        if not pattern.endswith("$"):
+            pattern += "$"
+
+        idx = len(self.routes)
+        self.routes.append((re.compile(pattern), handler, args or {}))
+
+        segment = get_literal_first_segment(pattern)
+        if segment is None:
+            self.fallback.append(idx)
+            for bucket in self.buckets.values():
+                bucket.append(idx)
+        else:
+            self.buckets.setdefault(segment, list(self.fallback)).append(idx)
+
+    def candidates(self, path):
+        """
+        Return the routes that could match the path in order of priority
+        """
+        return [self.routes[idx] for idx in self.buckets.get(get_first_segment(path), self.fallback)]
+
+    def lookup(self, path):
+        """
+        Return the first route matching the path and its match or (None, None) if no route matches it
+        """
+        for idx in self.buckets.get(get_first_segment(path), self.fallback):
+            route = self.routes[idx]
+            match = route[0].match(path)
+            if match:
+                return route, match
+
+        return None, None
+
+    def match(self, path):
+        """
+        Return the tuple (match, handler, args) of the first route matching
+        the path or (None, None, None) if no route matches it
+        """
+        route, match = self.lookup(path)
+        if route is None:
+            return None, None, None
+
+        route_hits[route[0].pattern] += 1
+
+        return match, route[1], route[2]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+#   validator
+#   *********
+#
+# Compilation of the request descriptors defined in globaleaks.rest.requests
+# into validators that check a message with a single traversal.
+#
+# The keys not present in the descriptor are stripped, every key of the
+# descriptor is required and None is never a valid value.
+import collections
+import re
+
+from six import text_type
+
+from globaleaks.rest import errors
+from globaleaks.rest.requests import SkipSpecificValidation
+from globaleaks.utils.utility import log
+
+# compiled validators indexed by the id of the descriptor they are built from;
+# the descriptor is kept together with its validator so that its id is never reused
+_validators = {}
+
+
+def compile_python_type(python_type):
+    if python_type == SkipSpecificValidation:
+        def validate_any(value):
+            return value is not None
+
+        return validate_any
+
+    if python_type == int:
+        def validate_int(value):
+            try:
+                int(value)
+                return True
+            except:
+                return False
+
+        return validate_int
+
+    if python_type == bool:
+        def validate_bool(value):
+            return value == u'true' or value == u'false' or isinstance(value, bool)
+
+        return validate_bool
+
+    def validate_instance(value):
+        return value is not None and isinstance(value, python_type)
+
+    return validate_instance
+
+
+def compile_regexp(pattern):
+    match = re.compile(pattern).match
+
+    def validate_regexp(value):
+        if value is None:
+            return False
+
+        try:
+            value = text_type(value)
+        except:
+            return False
+
+        return match(value) is not None
+
+    return validate_regexp
+
+
+def compile_list(template):
+    validate_item = compile_type(template[0])
+
+    def validate_list(value):
+        if value is None or not isinstance(value, collections.Iterable):
+            return False
+
+        return not value or all(validate_item(x) for x in value)
+
+    return validate_list
+
+
+def compile_dict(template):
+    validators = [(key, compile_type(value)) for key, value in template.items()]
+
+    def validate_dict(value):
+        if not isinstance(value, dict):
+            return False
+
+        # strip whatever is not validated
+        for key in [key for key in value if key not in template]:
+            del value[key]
+
+        missing = None
+        for key, validate in validators:
+            if key not in value:
+                # keys with an invalid type are reported before the missing ones
+                if missing is None:
+                    missing = key
+
+                continue
+
+            if not validate(value[key]):
+                log.debug("Received key %s: type validation fail", key)
+                raise errors.InputValidationError("Key (%s) type validation failure" % key)
+
+        if missing is not None:
+            log.debug("Key %s expected but missing!", missing)
+            raise errors.InputValidationError("Missing key %s" % missing)
+
+        return True
+
+    return validate_dict
+
+
+def compile_type(template):
+    # if it's callable, than assumes is a primitive class
+    if callable(template):
+        return compile_python_type(template)
+
+    # value as "{foo:bar}"
+    if isinstance(template, collections.Mapping):
+        return compile_dict(template)
+
+    # regexp
+    if isinstance(template, str):
+        return compile_regexp(template)
+
+    # value as "[ type ]"
+    if isinstance(template, collections.Iterable):
+        return compile_list(template)
+
+    return lambda value: False
+
+
+def compile_validator(message_template):
+    """
+    Compile a request descriptor into a function validating a decoded JSON
+    message against it and raising InputValidationError on failure
+    """
+    if isinstance(message_template, dict):
+        validate_dict = compile_dict(message_template)
+
+        def validate_message(jmessage):
+            if not validate_dict(jmessage):
+                raise errors.InputValidationError("invalid json message: expected dict")
+
+        return validate_message
+
+    if isinstance(message_template, list):
+        validate_item = compile_type(message_template[0])
+
+        def validate_message(jmessage):
+            if not isinstance(jmessage, list) or not all(validate_item(x) for x in jmessage):
+                raise errors.InputValidationError("Not every element in %s is %s" %
+                                                  (jmessage, message_template[0]))
+
+        return validate_message
+
+    def validate_message(jmessage):
+        raise errors.InputValidationError("invalid json message: expected dict or list")
+
+    return validate_message
+
+
+def get_validator(message_template):
+    """
+    Return the validator of the descriptor compiling it on first use
+    """
+    entry = _validators.get(id(message_template))
+    if entry is None or entry[0] is not message_template:
+        entry = _validators[id(message_template)] = (message_template, compile_validator(message_template))
+
+    return entry[1]
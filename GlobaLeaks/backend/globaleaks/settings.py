@@ -20,7 +20,7 @@ from optparse import OptionParser
 from six import text_type
 
 from globaleaks import __version__, DATABASE_VERSION
-from globaleaks.orm import make_db_uri, set_db_uri
+from globaleaks.orm import make_db_uri, set_db_uri, set_profiling, set_write_max_wait
 from globaleaks.utils.singleton import Singleton
 from globaleaks.utils.utility import log
 
@@ -73,8 +73,12 @@ class SettingsClass(object):
 
         self.db_type = 'sqlite'
 
+        # max number of seconds a write transaction waits for the database lock
+        self.db_max_wait = 60
+
         # debug defaults
         self.orm_debug = False
+        self.orm_profile = False
 
         # files and paths
         self.src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -270,6 +274,12 @@ class SettingsClass(object):
         if self.cmdline_options.working_path:
             self.working_path = self.cmdline_options.working_path
 
+        self.db_max_wait = self.cmdline_options.db_max_wait
+        set_write_max_wait(self.db_max_wait)
+
+        self.orm_profile = self.cmdline_options.orm_profile
+        set_profiling(self.orm_profile)
+
         self.api_prefix = self.cmdline_options.api_prefix
 
         if self.cmdline_options.client_path:
@@ -1,4 +1,5 @@
 # -*- coding: utf-8
+import multiprocessing
 import os
 import re
 import sys
@@ -14,13 +15,14 @@ from twisted.python.threadpool import ThreadPool
 from globaleaks import __version__, orm, models
 from globaleaks.transactions import schedule_email
 from globaleaks.utils.agent import get_tor_agent, get_web_agent
-from globaleaks.utils.mailutils import sendmail
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.singleton import Singleton
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.tor_exit_set import TorExitSet
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils import securetempfile
+from globaleaks.utils.pgp import PGPKeyring
 from globaleaks.utils.security import sha256
+from globaleaks.utils.smtpspooler import smtp_spooler
 from globaleaks.utils.utility import datetime_now, log
 from globaleaks.utils.tempdict import TempDict
 
@@ -73,8 +75,18 @@ class StateClass(ObjectDict):
         self.tenant_cache = {}
         self.tenant_hostname_id_map = {}
 
-        self.set_orm_tp(ThreadPool(4, 16))
+        # Write transactions are serialized on a single writer lane while
+        # read only transactions scale with the number of available cores
+        self.set_orm_tp(ThreadPool(1, 1, 'orm-rw'))
+        self.set_orm_ro_tp(ThreadPool(4, max(16, 2 * multiprocessing.cpu_count()), 'orm-ro'))
+        # the encryption of the uploads is bound to the available cores
+        self.set_crypto_tp(ThreadPool(1, max(2, multiprocessing.cpu_count()), 'crypto'))
+        self.pgp_keyring = None
         self.TempUploadFiles = TempDict(timeout=3600)
+        # uploads whose chunks are still being received
+        self.TempUploads = TempDict(timeout=3600)
+        # bytes uploaded by each session or submission token
+        self.TempUploadQuotas = TempDict(timeout=3600)
 
 
     def init_environment(self):
@@ -82,11 +94,20 @@ class StateClass(ObjectDict):
         self.settings.eval_paths()
         self.create_directories()
         self.cleaning_dead_files()
+        self.pgp_keyring = PGPKeyring(self.settings.tmp_path)
 
     def set_orm_tp(self, orm_tp):
         self.orm_tp = orm_tp
         orm.set_thread_pool(orm_tp)
 
+    def set_orm_ro_tp(self, orm_ro_tp):
+        self.orm_ro_tp = orm_ro_tp
+        orm.set_ro_thread_pool(orm_ro_tp)
+
+    def set_crypto_tp(self, crypto_tp):
+        self.crypto_tp = crypto_tp
+        securetempfile.set_thread_pool(crypto_tp)
+
     def get_agent(self, tid=1):
         if self.tenant_cache[tid].anonymize_outgoing_connections:
             return get_tor_agent(self.settings.socks_host, self.settings.socks_port)
@@ -180,20 +201,20 @@ class StateClass(ObjectDict):
            # during unit testing do not try to send the mail
            return defer.succeed(True)
 
-       return sendmail(tid,
-                       self.tenant_cache[tid].notification.smtp_username,
-                       self.tenant_cache[tid].notification.smtp_password,
-                       self.tenant_cache[tid].notification.smtp_server,
-                       self.tenant_cache[tid].notification.smtp_port,
-                       self.tenant_cache[tid].notification.smtp_security,
-                       self.tenant_cache[tid].notification.smtp_source_name,
-                       self.tenant_cache[tid].notification.smtp_source_email,
-                       to_address,
-                       self.tenant_cache[tid].name + ' - ' + subject,
-                       body,
-                       self.tenant_cache[tid].anonymize_outgoing_connections,
-                       self.settings.socks_host,
-                       self.settings.socks_port)
+       return smtp_spooler.sendmail(tid,
+                                    self.tenant_cache[tid].notification.smtp_username,
+                                    self.tenant_cache[tid].notification.smtp_password,
+                                    self.tenant_cache[tid].notification.smtp_server,
+                                    self.tenant_cache[tid].notification.smtp_port,
+                                    self.tenant_cache[tid].notification.smtp_security,
+                                    self.tenant_cache[tid].notification.smtp_source_name,
+                                    self.tenant_cache[tid].notification.smtp_source_email,
+                                    to_address,
+                                    self.tenant_cache[tid].name + ' - ' + subject,
+                                    body,
+                                    self.tenant_cache[tid].anonymize_outgoing_connections,
+                                    self.settings.socks_host,
+                                    self.settings.socks_port)
 
 
     def schedule_exception_email(self, exception_text, *args):
@@ -236,9 +257,7 @@ class StateClass(ObjectDict):
             # Opportunisticly encrypt the mail body. NOTE that mails will go out
             # unencrypted if one address in the list does not have a public key set.
             if pgp_key_public:
-               pgpctx = PGPContext(self.settings.tmp_path)
-               fingerprint = pgpctx.load_key(pgp_key_public)['fingerprint']
-               mail_body = pgpctx.encrypt_message(fingerprint, mail_body)
+               mail_body = self.pgp_keyring.encrypt_message(pgp_key_public, mail_body)
 
             # avoid waiting for the notification to send and instead rely on threads to handle it
             schedule_email(1, mail_address, mail_subject, mail_body)
@@ -261,9 +280,7 @@ class StateClass(ObjectDict):
         subject, body = Templating().get_mail_subject_and_body(template_vars)
 
         if user_desc.get('pgp_key_public', ''):
-            pgpctx = PGPContext(self.settings.tmp_path)
-            fingerprint = pgpctx.load_key(user_desc['pgp_key_public'])['fingerprint']
-            body = pgpctx.encrypt_message(fingerprint, body)
+            body = self.pgp_keyring.encrypt_message(user_desc['pgp_key_public'], body)
 
         session.add(models.Mail({
             'address': user_desc['mail_address'],
@@ -86,3 +86,21 @@ class TestJobsTiming(helpers.TestHandler):
         handler = self.request({}, role='admin')
 
         yield handler.get()
+
+
+class TestMetricsCollection(helpers.TestHandler):
+    _handler = statistics.MetricsCollection
+
+    @inlineCallbacks
+    def test_get(self):
+        handler = self.request({}, role='admin')
+
+        response = yield handler.get()
+
+        self.assertTrue('engines' in response)
+        self.assertTrue(any(x['calls'] > 0 for x in response['transactions']))
+        self.assertTrue('archived_schema_cache' in response)
+        self.assertTrue('api_cache' in response)
+        self.assertTrue('routes' in response)
+        self.assertTrue('crypto_queue' in response)
+        self.assertTrue('smtp' in response)
@@ -2,9 +2,10 @@
 import json
 
 from six import text_type
+from twisted.trial import unittest
 
-from globaleaks.handlers.base import BaseHandler
-from globaleaks.rest.errors import InputValidationError
+from globaleaks.handlers.base import BaseHandler, parse_byte_range
+from globaleaks.rest.errors import InputValidationError, RangeNotSatisfiable
 from globaleaks.tests import helpers
 
 FUTURE = 100
@@ -19,19 +20,6 @@ class BaseHandlerMock(BaseHandler):
 class TestBaseHandler(helpers.TestHandlerWithPopulatedDB):
     _handler = BaseHandlerMock
 
-    def test_validate_jmessage_valid(self):
-        dummy_message = {'spam': 'ham', 'firstd': {3: 4}, 'fields': "CIAOCIAO", 'nest': [{1: 2, 3: 4}]}
-        dummy_message_template = {'spam': str, 'firstd': dict, 'fields': '\w+', 'nest': [dict]}
-
-        self.assertTrue(BaseHandler.validate_jmessage(dummy_message, dummy_message_template))
-
-    def test_validate_jmessage_invalid(self):
-        dummy_message = {}
-        dummy_message_template = {'spam': str, 'firstd': dict, 'fields': '\w+', 'nest': [dict]}
-
-        self.assertRaises(InputValidationError,
-                          BaseHandler.validate_jmessage, dummy_message, dummy_message_template)
-
     def test_validate_message_valid(self):
         dummy_json = json.dumps({'spam': 'ham'})
         dummy_message_template = {'spam': text_type}
@@ -45,28 +33,20 @@ class TestBaseHandler(helpers.TestHandlerWithPopulatedDB):
         self.assertRaises(InputValidationError,
                           BaseHandler.validate_message, dummy_json, dummy_message_template)
 
-    def test_validate_type_valid(self):
-        self.assertTrue(BaseHandler.validate_type('foca', str))
-        self.assertTrue(BaseHandler.validate_type(True, bool))
-        self.assertTrue(BaseHandler.validate_type(4, int))
-        self.assertTrue(BaseHandler.validate_type(u'foca', text_type))
-        self.assertTrue(BaseHandler.validate_type(['foca', 'fessa'], list))
-        self.assertTrue(BaseHandler.validate_type({'foca': 1}, dict))
-
-    def test_validate_type_invalid(self):
-        self.assertFalse(BaseHandler.validate_type(1, str))
-        self.assertFalse(BaseHandler.validate_type(1, text_type))
-        self.assertFalse(BaseHandler.validate_type(False, text_type))
-        self.assertFalse(BaseHandler.validate_type({}, list))
-        self.assertFalse(BaseHandler.validate_type(True, dict))
-
-    def test_validate_python_type_valid(self):
-        self.assertTrue(BaseHandler.validate_python_type('foca', str))
-        self.assertTrue(BaseHandler.validate_python_type(True, bool))
-        self.assertTrue(BaseHandler.validate_python_type(4, int))
-        self.assertTrue(BaseHandler.validate_python_type(u'foca', text_type))
-        self.assertTrue(BaseHandler.validate_python_type(None, dict))
 
-    def test_validate_regexp_valid(self):
-        self.assertTrue(BaseHandler.validate_regexp('Foca', '\w+'))
-        self.assertFalse(BaseHandler.validate_regexp('Foca', '\d+'))
+class TestParseByteRange(unittest.TestCase):
+    def test_parse_byte_range(self):
+        for value, expected in [(b'bytes=0-99', (0, 99)),
+                                (b'bytes=10-', (10, 999)),
+                                (b'bytes=-10', (990, 999)),
+                                (b'bytes=-2000', (0, 999)),
+                                (b'bytes=900-2000', (900, 999)),
+                                (b'bytes=0-1,5-6', None),
+                                (b'bytes=9-1', None),
+                                (b'bytes=a-b', None),
+                                (b'items=0-1', None)]:
+            self.assertEqual(parse_byte_range(value, 1000), expected)
+
+        self.assertRaises(RangeNotSatisfiable, parse_byte_range, b'bytes=1000-', 1000)
+        self.assertRaises(RangeNotSatisfiable, parse_byte_range, b'bytes=-0', 1000)
+        self.assertRaises(RangeNotSatisfiable, parse_byte_range, b'bytes=0-', 0)
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks.rest.apicache import ApiCache, gzipdata
+from globaleaks.rest.apicache import ApiCache, decorator_cache_invalidate, gzipdata, serve_cache_entry
 from globaleaks.tests import helpers
 
 
@@ -31,3 +31,80 @@ class TestApiCache(helpers.TestGL):
         self.assertEqual(ApiCache.get(2, "passante_di_professione", "ca")[1], gzipdata('cacaca'))
         ApiCache.invalidate()
         self.assertEqual(ApiCache.memory_cache_dict, {})
+
+    def test_cache_eviction(self):
+        self.patch(ApiCache, 'max_size', 2 * len(gzipdata('a' * 100)) + 200)
+
+        ApiCache.set(1, "/a", "en", 'text/plain', 'a' * 100)
+        ApiCache.set(2, "/b", "en", 'text/plain', 'b' * 100)
+        self.assertIsNotNone(ApiCache.get(1, "/a", "en"))
+
+        ApiCache.set(1, "/c", "en", 'text/plain', 'c' * 100)
+        self.assertIsNone(ApiCache.get(2, "/b", "en"))
+        self.assertIsNotNone(ApiCache.get(1, "/a", "en"))
+        self.assertFalse(2 in ApiCache.tenant_size)
+        self.assertEqual(ApiCache.tenant_size[1], ApiCache.size)
+        self.assertTrue(ApiCache.get_stats()['evictions'] >= 1)
+
+        ApiCache.invalidate(1)
+        self.assertEqual(ApiCache.size, 0)
+        self.assertEqual(ApiCache.memory_cache_dict, {})
+
+    def test_serve_cache_entry(self):
+        entry = ApiCache.set(1, "/a", "en", b'text/plain', 'content')
+
+        request = helpers.forge_request()
+        self.assertEqual(serve_cache_entry(request, entry), b'content')
+        self.assertIsNone(request.responseHeaders.getRawHeaders(b'Content-encoding'))
+        etag = request.responseHeaders.getRawHeaders(b'ETag')[0]
+
+        request = helpers.forge_request(headers={b'accept-encoding': b'gzip, deflate'})
+        self.assertEqual(serve_cache_entry(request, entry), entry.gzip)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'Content-encoding'), [b'gzip'])
+        self.assertNotEqual(request.responseHeaders.getRawHeaders(b'ETag')[0], etag)
+
+        request = helpers.forge_request(headers={b'if-none-match': etag})
+        self.assertIsNone(serve_cache_entry(request, entry))
+        self.assertEqual(request.responseCode, 304)
+
+    def test_invalidate_by_tags(self):
+        class FakeHandler(object):
+            invalidate_global_cache = False
+
+            def __init__(self, tid, invalidate_cache):
+                self.request = helpers.forge_request()
+                self.request.tid = tid
+                self.invalidate_cache = invalidate_cache
+
+        write = decorator_cache_invalidate(lambda self: None)
+
+        for tid in [1, 2]:
+            ApiCache.set(tid, "/public", "en", 'application/json', '{}', {'Context', 'Config'})
+            ApiCache.set(tid, "/l10n/en", "en", 'application/json', '{}', {'CustomTexts'})
+            ApiCache.set(tid, "/admin/node", "en", 'application/json', '{}')
+
+        write(FakeHandler(2, {'CustomTexts'}))
+        self.assertIsNone(ApiCache.get(2, "/l10n/en", "en"))
+        self.assertIsNone(ApiCache.get(2, "/admin/node", "en"))
+        self.assertIsNotNone(ApiCache.get(2, "/public", "en"))
+        self.assertIsNotNone(ApiCache.get(1, "/l10n/en", "en"))
+
+        write(FakeHandler(1, {'Context'}))
+        self.assertIsNone(ApiCache.get(1, "/public", "en"))
+        self.assertIsNotNone(ApiCache.get(1, "/l10n/en", "en"))
+        self.assertIsNotNone(ApiCache.get(2, "/public", "en"))
+
+        ApiCache.set(1, "/public", "en", 'application/json', '{}', {'Context', 'Config'})
+
+        write(FakeHandler(1, {'Config'}))
+        self.assertIsNone(ApiCache.get(1, "/public", "en"))
+        self.assertIsNone(ApiCache.get(2, "/public", "en"))
+        self.assertIsNotNone(ApiCache.get(1, "/l10n/en", "en"))
+
+        # the questionnaires of the root tenant are used by the contexts of every tenant
+        for tid in [1, 2]:
+            ApiCache.set(tid, "/public", "en", 'application/json', '{}', {'Context', 'Questionnaire', 'Step', 'Field'})
+
+        write(FakeHandler(1, {'Field'}))
+        self.assertIsNone(ApiCache.get(1, "/public", "en"))
+        self.assertIsNone(ApiCache.get(2, "/public", "en"))
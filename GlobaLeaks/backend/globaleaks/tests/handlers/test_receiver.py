@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import base64
+
 from globaleaks import models
 from globaleaks.handlers.admin import receiver as admin_receiver
 from globaleaks.handlers import receiver
 from globaleaks.orm import transact
+from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_never
 from twisted.internet.defer import inlineCallbacks
@@ -50,6 +53,56 @@ class TestTipsCollection(helpers.TestHandlerWithPopulatedDB):
             self.assertEqual(ret[idx]['comment_count'], 3)
             self.assertEqual(ret[idx]['message_count'], 2)
 
+    @inlineCallbacks
+    def test_get_paginated(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        expected = yield handler.get()
+
+        ids = []
+        cursor = None
+        while True:
+            handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+            handler.request.args = {b'limit': [b'1']}
+            if cursor is not None:
+                handler.request.args[b'cursor'] = [cursor]
+
+            ret = yield handler.get()
+            self.assertTrue(len(ret) <= 1)
+            ids.extend(rtip['id'] for rtip in ret)
+
+            cursor = handler.request.responseHeaders.getRawHeaders(b'X-Next-Cursor')
+            if cursor is None:
+                break
+
+            cursor = cursor[0]
+
+        self.assertEqual(ids, [rtip['id'] for rtip in expected])
+
+    @inlineCallbacks
+    def test_get_filtered(self):
+        handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
+        handler.request.args = {b'min_score': [b'1000']}
+        ret = yield handler.get()
+        self.assertEqual(ret, [])
+
+    def test_parse_tips_query(self):
+        filters, cursor, limit = receiver.TipsCollection.parse_tips_query({b'new': [b'true'],
+                                                                           b'limit': [b'10'],
+                                                                           b'min_score': [b'2']})
+        self.assertEqual(filters, {'new': True, 'min_score': 2})
+        self.assertEqual(limit, 10)
+        self.assertIsNone(cursor)
+
+        for args in [{b'limit': [b'0']}, {b'new': [b'maybe']}, {b'max_score': [b'x']},
+                     {b'cursor': [b'\xe8']}, {b'label': [b'\xff']}]:
+            self.assertRaises(errors.InputValidationError, receiver.TipsCollection.parse_tips_query, args)
+
+        self.assertRaises(errors.InputValidationError, receiver.parse_tips_cursor, u'invalid')
+        self.assertRaises(errors.InputValidationError, receiver.parse_tips_cursor, u'\xe8')
+
+        cursor = base64.urlsafe_b64encode(b'2019-01-01T00:00:00.000000|id').decode('utf-8')
+        self.assertEqual(receiver.parse_tips_cursor(cursor)[1], u'id')
+
 
 class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.TipsOperations
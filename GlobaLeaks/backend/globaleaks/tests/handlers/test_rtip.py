@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.python import context
 
-from globaleaks import models
+from globaleaks import models, orm
 from globaleaks.handlers import rtip
 from globaleaks.jobs.delivery import Delivery
 from globaleaks.rest import errors
@@ -25,6 +26,44 @@ class TestRTipInstance(helpers.TestHandlerWithPopulatedDB):
             handler = self.request(role='receiver', user_id = rtip_desc['receiver_id'])
             yield handler.get(rtip_desc['id'])
 
+    @inlineCallbacks
+    def get_rtip_query_count(self, rtip_desc):
+        profile = orm.QueryProfile()
+
+        orm.set_profiling(True)
+        try:
+            yield context.call({orm.QUERY_PROFILE_KEY: profile},
+                               rtip.get_rtip, 1, rtip_desc['receiver_id'], rtip_desc['id'], 'en')
+        finally:
+            orm.set_profiling(False)
+
+        self.assertTrue(profile.statements > 0)
+
+        returnValue(profile.statements)
+
+    @inlineCallbacks
+    def add_comments_and_files(self, rtip_desc, n):
+        for i in range(n):
+            yield rtip.create_comment(1, rtip_desc['receiver_id'], rtip_desc['id'], {'content': u'comment %d' % i})
+            yield rtip.register_wbfile_on_db(1, rtip_desc['id'], {
+                'name': u'file %d.txt' % i,
+                'description': u'description',
+                'type': u'text/plain',
+                'size': 1,
+                'filename': u'file-%d' % i
+            })
+
+    @inlineCallbacks
+    def test_get_query_count(self):
+        rtip_desc = (yield self.get_rtips())[0]
+
+        yield self.add_comments_and_files(rtip_desc, 1)
+        count = yield self.get_rtip_query_count(rtip_desc)
+
+        # the children of the tip are loaded with a constant number of queries
+        yield self.add_comments_and_files(rtip_desc, 10)
+        self.assertEqual((yield self.get_rtip_query_count(rtip_desc)), count)
+
     @inlineCallbacks
     def test_put_postpone(self):
         now = datetime_now()
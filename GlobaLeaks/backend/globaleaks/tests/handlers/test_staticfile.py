@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+
 from six import text_type
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks.handlers.staticfile import StaticFileHandler
+from globaleaks.handlers.staticfile import StaticFileHandler, build_static_manifest
 from globaleaks.rest import errors
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
@@ -23,3 +27,107 @@ class TestStaticFileHandler(helpers.TestHandler):
         handler = self.request(kwargs={'path': Settings.client_path})
 
         return self.assertRaises(errors.ResourceNotFound, handler.get, u'unexistent')
+
+    @inlineCallbacks
+    def test_get_range(self):
+        handler = self.request(kwargs={'path': Settings.client_path})
+        yield handler.get('')
+        content = handler.request.getResponseBody()
+        etag = handler.request.responseHeaders.getRawHeaders(b'ETag')[0]
+
+        for headers, expected in [({'Range': b'bytes=0-9'}, content[:10]),
+                                  ({'Range': b'bytes=10-'}, content[10:]),
+                                  ({'Range': b'bytes=-10'}, content[-10:]),
+                                  ({'Range': b'bytes=10-', 'If-Range': etag}, content[10:])]:
+            handler = self.request(kwargs={'path': Settings.client_path}, headers=headers)
+            yield handler.get('')
+            self.assertEqual(handler.request.responseCode, 206)
+            self.assertEqual(handler.request.getResponseBody(), expected)
+            self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'Content-Length'), [b'%d' % len(expected)])
+
+        # the range is ignored if the resource changed
+        handler = self.request(kwargs={'path': Settings.client_path}, headers={'Range': b'bytes=10-', 'If-Range': b'"changed"'})
+        yield handler.get('')
+        self.assertEqual(handler.request.getResponseBody(), content)
+
+    def test_get_range_not_satisfiable(self):
+        handler = self.request(kwargs={'path': Settings.client_path}, headers={'Range': b'bytes=100000000-'})
+
+        return self.assertRaises(errors.RangeNotSatisfiable, handler.get, u'')
+
+
+class TestStaticFileManifest(helpers.TestHandler):
+    _handler = StaticFileHandler
+
+    def setUp(self):
+        self.path = self.mktemp()
+        os.makedirs(os.path.join(self.path, 'js'))
+
+        self.files = {
+            'index.html': b'<!doctype html>' + b'<div></div>' * 100,
+            'js/scripts.0123456789abcdef.js': b'var a = 1;' * 100,
+            'data/logo.png': os.urandom(128)
+        }
+
+        for name, content in self.files.items():
+            path = os.path.join(self.path, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            with open(path, 'wb') as f:
+                f.write(content)
+
+        return helpers.TestHandler.setUp(self)
+
+    def test_build_static_manifest(self):
+        manifest = build_static_manifest(self.path)
+
+        self.assertEqual(set(manifest), set(self.files))
+        self.assertEqual(manifest['index.html'].variants[b'identity'], self.files['index.html'])
+        self.assertIn(b'gzip', manifest['index.html'].variants)
+
+        # binary files are not compressed
+        self.assertEqual(list(manifest['data/logo.png'].variants), [b'identity'])
+
+        self.assertFalse(manifest['index.html'].immutable)
+        self.assertTrue(manifest['js/scripts.0123456789abcdef.js'].immutable)
+
+    @inlineCallbacks
+    def test_get_encodings(self):
+        handler = self.request(kwargs={'path': self.path})
+        yield handler.get('')
+        self.assertEqual(handler.request.getResponseBody(), self.files['index.html'])
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'Cache-control'), [b'no-cache, no-store, must-revalidate'])
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'Vary'), [b'Accept-Encoding'])
+
+        handler = self.request(kwargs={'path': self.path}, headers={'Accept-Encoding': b'gzip, deflate'})
+        yield handler.get('')
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'Content-encoding'), [b'gzip'])
+        body = gzip.GzipFile(fileobj=io.BytesIO(handler.request.getResponseBody())).read()
+        self.assertEqual(body, self.files['index.html'])
+
+    @inlineCallbacks
+    def test_get_not_modified(self):
+        for headers in [{}, {'Accept-Encoding': b'gzip'}]:
+            handler = self.request(kwargs={'path': self.path}, headers=headers)
+            yield handler.get('')
+            etag = handler.request.responseHeaders.getRawHeaders(b'ETag')[0]
+
+            handler = self.request(kwargs={'path': self.path}, headers=dict(headers, **{'If-None-Match': etag}))
+            yield handler.get('')
+            self.assertEqual(handler.request.responseCode, 304)
+            self.assertEqual(handler.request.written, [])
+
+    @inlineCallbacks
+    def test_get_immutable(self):
+        handler = self.request(kwargs={'path': self.path})
+        yield handler.get('js/scripts.0123456789abcdef.js')
+        self.assertEqual(handler.request.getResponseBody(), self.files['js/scripts.0123456789abcdef.js'])
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'Cache-control'),
+                         [b'public, max-age=31536000, immutable'])
+        self.assertFalse(handler.request.responseHeaders.hasHeader(b'Pragma'))
+
+    def test_get_directory_traversal(self):
+        handler = self.request(kwargs={'path': os.path.join(self.path, 'js')})
+
+        return self.assertRaises(errors.DirectoryTraversalError, handler.get, u'../index.html')
@@ -50,12 +50,12 @@ from globaleaks.handlers.admin.step import create_step
 from globaleaks.handlers.admin.tenant import create as create_tenant
 from globaleaks.handlers.admin.user import create_user, create_receiver_user
 from globaleaks.handlers.wizard import wizard
-from globaleaks.handlers.submission import create_submission
+from globaleaks.handlers.submission import ArchivedSchemaCache, create_submission
 from globaleaks.rest.apicache import ApiCache
 from globaleaks.rest import errors
 from globaleaks.settings import Settings
 from globaleaks.state import State
-from globaleaks.utils import security, tempdict, token, utility
+from globaleaks.utils import securetempfile, security, tempdict, token, utility
 from globaleaks.utils.securetempfile import SecureTemporaryFile
 from globaleaks.utils.objectdict import ObjectDict
 from globaleaks.utils.structures import fill_localized_keys
@@ -131,10 +131,16 @@ def init_state():
 
     Settings.eval_paths()
 
+    orm.dispose_engines()
+
+    ArchivedSchemaCache.clear()
+
     if os.path.exists(Settings.working_path):
         dir_util.remove_tree(Settings.working_path, 0)
 
     orm.set_thread_pool(FakeThreadPool())
+    orm.set_ro_thread_pool(FakeThreadPool())
+    securetempfile.set_thread_pool(FakeThreadPool())
 
     State.settings.enable_api_cache = False
     State.tenant_cache[1] = ObjectDict()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.jobs import cache_warming
+from globaleaks.rest.apicache import ApiCache
+from globaleaks.tests import helpers
+
+
+class TestCacheWarming(helpers.TestGL):
+    @inlineCallbacks
+    def test_cache_warming(self):
+        self.state.settings.enable_api_cache = True
+
+        job = cache_warming.CacheWarming()
+
+        self.test_reactor.advance(1)
+
+        try:
+            ApiCache.invalidate()
+
+            yield job.operation()
+
+            for language in self.state.tenant_cache[1].languages_enabled:
+                self.assertTrue(ApiCache.contains(1, b'/public', language))
+
+            self.assertEqual(ApiCache.warming_queue, set())
+
+            ApiCache.invalidate(1, {'CustomTexts'})
+            ApiCache.invalidate(1, {'CustomTexts'})
+            self.assertEqual(ApiCache.warming_queue, {1})
+
+            yield job.operation()
+
+            self.assertEqual(ApiCache.warming_queue, set())
+        finally:
+            self.state.settings.enable_api_cache = False
+
+            yield job.stop()
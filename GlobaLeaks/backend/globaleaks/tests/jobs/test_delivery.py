@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import os
+
+from globaleaks.jobs import delivery
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.pgp import PGPContext
+from globaleaks.utils.securetempfile import SecureTemporaryFile
+
+KEYS = {
+    u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1': 'VALID_PGP_KEY1',
+    u'CECDC5D2B721900E65639268846C82DB1F9B45E2': 'VALID_PGP_KEY2'
+}
+
+
+class TestDelivery(helpers.TestGL):
+    content = os.urandom(300 * 1024)
+
+    def get_rfile(self, fingerprint, key=None):
+        return {
+            'filename': u'file',
+            'size': len(self.content),
+            'status': u'processing',
+            'receiver': {
+                'name': fingerprint,
+                'pgp_key_public': key if key is not None else helpers.PGPKEYS[KEYS[fingerprint] + '_PUB'],
+                'pgp_key_fingerprint': fingerprint
+            }
+        }
+
+    def get_file(self):
+        sf = SecureTemporaryFile(Settings.tmp_path)
+        with sf.open('w') as f:
+            f.write(self.content)
+            f.finalize_write()
+
+        return sf
+
+    def test_process_file(self):
+        self.patch(delivery, 'DELIVERY_MAX_PARALLEL_ENCRYPTIONS', 1)
+
+        rfiles = [self.get_rfile(fingerprint) for fingerprint in KEYS] + \
+                 [self.get_rfile(u'0000000000000000000000000000000000000000', u'invalid')]
+
+        receiverfiles_map = {'ifile_name': u'file', 'ifile_size': len(self.content)}
+        plain_path = os.path.join(Settings.attachments_path, 'file.plain')
+
+        delivery.fsops_process_file(self.state, self.get_file(), receiverfiles_map, rfiles, plain_path)
+
+        with open(plain_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        self.assertEqual([x['status'] for x in rfiles], [u'encrypted', u'encrypted', u'unavailable'])
+
+        for rfile in rfiles[:2]:
+            path = os.path.join(Settings.attachments_path, rfile['filename'])
+            self.assertEqual(os.stat(path).st_size, rfile['size'])
+
+            pgpctx = PGPContext()
+            pgpctx.load_key(helpers.PGPKEYS[KEYS[rfile['receiver']['pgp_key_fingerprint']] + '_PRV'])
+            with open(path, 'rb') as f:
+                self.assertEqual(pgpctx.gnupg.decrypt_file(f).data, self.content)
+
+    def test_deliver_file_progress(self):
+        processed = []
+
+        rfiles = [self.get_rfile(fingerprint) for fingerprint in KEYS]
+
+        delivery.fsops_deliver_file(self.state, self.get_file(), rfiles, None, processed.append)
+
+        self.assertEqual(processed[-1], len(self.content))
+        self.assertEqual([x['status'] for x in rfiles], [u'encrypted', u'encrypted'])
@@ -2,9 +2,33 @@
 from twisted.internet.defer import inlineCallbacks, succeed
 
 from globaleaks import models
+from globaleaks.jobs import notification
 from globaleaks.jobs.delivery import Delivery
 from globaleaks.jobs.notification import Notification
+from globaleaks.orm import transact
 from globaleaks.tests import helpers
+from globaleaks.utils.utility import datetime_null
+
+
+@transact
+def expire_digest_windows(session):
+    session.query(models.DigestEvent).update({'creation_date': datetime_null()})
+
+
+@transact
+def get_digest_receivers(session):
+    return set(x[0] for x in session.query(models.DigestEvent.receiver_id))
+
+
+@transact
+def expire_mail_schedules(session):
+    session.query(models.Mail).update({'next_attempt_at': datetime_null(),
+                                       'lease_expiration': datetime_null()})
+
+
+@transact
+def get_mail_attempts(session):
+    return sorted(x[0] for x in session.query(models.Mail.processing_attempts))
 
 
 class TestNotification(helpers.TestGLWithPopulatedDB):
@@ -44,6 +68,98 @@ class TestNotification(helpers.TestGLWithPopulatedDB):
             yield notification.run()
             yield self.test_model_count(models.Mail, 24)
 
+            # simulate the expiration of the leases and of the retry delays
+            yield expire_mail_schedules()
+
         yield notification.run()
 
         yield self.test_model_count(models.Mail, 0)
+
+
+@transact
+def create_mails(session, count):
+    for i in range(count):
+        session.add(models.Mail({
+            'address': u'receiver%d@example.org' % i,
+            'subject': u'subject',
+            'body': u'body',
+            'tid': 1
+        }))
+
+
+class TestMailQueue(helpers.TestGL):
+    @inlineCallbacks
+    def test_notification_batch(self):
+        self.patch(notification, 'MAIL_BATCH_SIZE', 10)
+
+        yield create_mails(24)
+
+        job = Notification()
+
+        def sendmail_failure(mail):
+            job.mails_to_retry.append(mail['id'])
+            return succeed(None)
+
+        job.sendmail = sendmail_failure
+
+        yield job.spool_emails()
+
+        # only the batch claimed is attempted and postponed
+        attempts = yield get_mail_attempts()
+        self.assertEqual(attempts, [0] * 14 + [1] * 10)
+
+        yield job.spool_emails()
+        yield job.spool_emails()
+
+        # the failed mails are not retried before their backoff
+        attempts = yield get_mail_attempts()
+        self.assertEqual(attempts, [1] * 24)
+
+        del job.sendmail
+        yield expire_mail_schedules()
+        yield job.spool_emails()
+
+        yield self.test_model_count(models.Mail, 14)
+
+
+class TestMailGenerator(helpers.TestGL):
+    @inlineCallbacks
+    def test_generate_for_silent_tenant(self):
+        self.state.tenant_cache[1].notification.disable_receiver_notification_emails = True
+
+        yield notification.MailGenerator(self.state).generate()
+
+        yield self.test_model_count(models.Mail, 0)
+
+
+class TestDigest(helpers.TestGLWithPopulatedDB):
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestGLWithPopulatedDB.setUp(self)
+        yield self.perform_full_submission_actions()
+
+        self.state.tenant_cache[1].notification.notification_digest_interval = 1
+
+    @inlineCallbacks
+    def test_digest(self):
+        yield Delivery().run()
+
+        yield notification.MailGenerator(self.state).generate()
+
+        # the events are accumulated until the window elapses
+        yield self.test_model_count(models.Mail, 0)
+
+        receivers = yield get_digest_receivers()
+        self.assertTrue(receivers)
+
+        # the events recorded for the digests do not count against the hourly threshold
+        for receiver_id in receivers:
+            self.assertEqual(self.state.get_mail_counter(receiver_id), 0)
+
+        yield expire_digest_windows()
+
+        yield notification.MailGenerator(self.state).generate()
+
+        # a single mail is sent to each receiver for all of its events
+        yield self.test_model_count(models.Mail, len(receivers))
+        yield self.test_model_count(models.DigestEvent, 0)
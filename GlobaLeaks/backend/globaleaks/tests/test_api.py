@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 from twisted.internet.address import IPv4Address
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
+from twisted.test.proto_helpers import StringTransport
+from twisted.web.server import Site
 
 from globaleaks.db import refresh_memory_variables
+from globaleaks.handlers.base import new_session
 from globaleaks.handlers.admin.node import update_enabled_languages
+from globaleaks.settings import Settings
 from globaleaks.state import State
-from globaleaks.tests.helpers import TestGL, forge_request
+from globaleaks.tests.helpers import TestGL, forge_request, update_node_setting
+from globaleaks.utils.chunkedupload import ChunkedUpload
 
 
 class TestAPI(TestGL):
@@ -68,6 +75,33 @@ class TestAPI(TestGL):
                                 'Accept-Language': 'antani1,antani2;q=0.8,antani3;q=0.6'})
         self.assertEqual(self.api.detect_language(request), 'en')
 
+    @inlineCallbacks
+    def test_accept_language_header_memoization(self):
+        request = forge_request(headers={'Accept-Language': 'ar;q=0.8,it;q=0.6'})
+        self.assertEqual(self.api.detect_language(request), 'ar')
+        self.assertEqual(self.api.detect_language(request), 'ar')
+        self.assertEqual(State.tenant_cache[1].accept_language_cache.get_stats()['hits'], 1)
+
+        yield update_enabled_languages(1, ['en', 'it'], 'en')
+        yield refresh_memory_variables()
+
+        self.assertEqual(self.api.detect_language(request), 'it')
+
+    @inlineCallbacks
+    def test_headers(self):
+        request = forge_request(uri=b"https://www.globaleaks.org/")
+        self.api.render(request)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'Content-Language'), [b'en'])
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'X-Robots-Tag'), None)
+
+        yield update_node_setting(u'allow_indexing', False)
+        yield refresh_memory_variables()
+
+        request = forge_request(uri=b"https://www.globaleaks.org/", headers={'GL-Language': 'it'})
+        self.api.render(request)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'Content-Language'), [b'it'])
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'X-Robots-Tag'), [b'noindex'])
+
     def test_status_codes_assigned(self):
         test_cases = [
             (b'GET', 200),
@@ -150,3 +184,69 @@ class TestAPI(TestGL):
         self.assertEqual(request.responseCode, 301)
         location = request.responseHeaders.getRawHeaders(b'location')[0]
         self.assertEqual(b'https://www.globaleaks.org/public', location)
+
+    def test_request_body_limits(self):
+        from globaleaks.rest.api import APIChannel, APIRequest
+
+        site = Site(self.api)
+        site.protocol = APIChannel
+        site.requestFactory = APIRequest
+
+        def send(headers, *chunks):
+            return send_to(b'/authentication', headers, *chunks)
+
+        def send_to(path, headers, *chunks):
+            transport = StringTransport()
+            channel = site.buildProtocol(None)
+            channel.makeConnection(transport)
+            channel.dataReceived(b'POST ' + path + b' HTTP/1.1\r\nHost: 127.0.0.1\r\n' + headers + b'\r\n')
+            for chunk in chunks:
+                channel.dataReceived(chunk)
+
+            channel.connectionLost(Failure(ConnectionDone()))
+
+            return transport.value()
+
+        # the declared length exceeds the limit of the handler
+        self.assertTrue(send(b'Content-Length: %d\r\n' % (2 * 1024 * 1024)).startswith(b'HTTP/1.1 413'))
+
+        # the uploads are bounded by the maximum file size instead
+        self.assertEqual(send_to(b'/admin/files/logo', b'Content-Length: %d\r\n' % (2 * 1024 * 1024)), b'')
+        self.assertTrue(send_to(b'/admin/files/logo?flowChunkNumber=1', b'Content-Length: %d\r\n' % (2 * 1024 * 1024 * 1024)).startswith(b'HTTP/1.1 400'))
+
+        # the chunked body exceeds the limit of the handler while it is received
+        chunk = b'%x\r\n%s\r\n' % (600 * 1024, b' ' * 600 * 1024)
+        self.assertEqual(send(b'Transfer-Encoding: chunked\r\n', chunk), b'')
+        self.assertTrue(send(b'Transfer-Encoding: chunked\r\n', chunk, chunk).startswith(b'HTTP/1.1 413'))
+
+        # the body is nested too deeply
+        body = b'[' * 100
+        self.assertTrue(send(b'Content-Length: 200\r\n', body).startswith(b'HTTP/1.1 406'))
+
+    def test_upload_chunk_check(self):
+        session = new_session(1, u'admin', u'admin', u'enabled', None)
+
+        def check(chunk_number, session_id=session.id):
+            headers = {b'x-session': session_id.encode()} if session_id else {}
+            request = forge_request(uri=b'https://www.globaleaks.org/admin/files/logo', headers=headers)
+            request.args = {b'flowIdentifier': [b'upload'], b'flowChunkNumber': [chunk_number]}
+            self.api.render(request)
+            return request.responseCode
+
+        self.assertEqual(check(b'1'), 204)
+
+        upload = ChunkedUpload(Settings.tmp_path, 10, 2, 5)
+        upload.chunks.add(1)
+        State.TempUploads.set((1, session.id, b'upload'), upload)
+
+        self.assertEqual(check(b'1'), 200)
+        self.assertEqual(check(b'2'), 204)
+
+        # the upload is visible only to the session that started it
+        other_session = new_session(1, u'other', u'admin', u'enabled', None)
+        self.assertEqual(check(b'1', other_session.id), 204)
+
+        # the requests are authenticated as the uploads
+        self.assertEqual(check(b'1', None), 412)
+
+        State.TempUploads.delete((1, session.id, b'upload'))
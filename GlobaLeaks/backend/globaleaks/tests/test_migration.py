@@ -11,7 +11,7 @@ import shutil
 from sqlalchemy.orm import sessionmaker
 
 from globaleaks import __version__, DATABASE_VERSION, FIRST_DATABASE_VERSION_SUPPORTED, models
-from globaleaks.db import migration, update_db
+from globaleaks.db import get_db_file, migration, update_db
 from globaleaks.db.migrations import update_37
 from globaleaks.models import config
 from globaleaks.orm import get_session, make_db_uri, set_db_uri
@@ -34,8 +34,13 @@ class TestMigrationRoutines(unittest.TestCase):
 
         shutil.rmtree(self.db_path, True)
         os.mkdir(self.db_path)
+
+        if os.path.exists(self.final_db_file):
+            os.remove(self.final_db_file)
+
+        # starting from version 41 the database is stored as globaleaks.db
         dbpath = os.path.join(path, f)
-        dbfile = os.path.join(self.db_path, f)
+        dbfile = os.path.join(self.db_path, f) if version < 41 else self.final_db_file
         shutil.copyfile(dbpath, dbfile)
 
         # TESTS PRECONDITIONS
@@ -52,6 +57,7 @@ class TestMigrationRoutines(unittest.TestCase):
 
         #shutil.rmtree(self.db_path, True)
         self.assertNotEqual(ret, -1)
+        self.assertEqual(get_db_file(Settings.working_path)[0], DATABASE_VERSION)
 
     def preconditions_30(self):
         logo_path = os.path.join(Settings.files_path, 'logo.png')
@@ -88,6 +94,31 @@ class TestMigrationRoutines(unittest.TestCase):
         self.assertEqual(saved_key, pk)
         session.close()
 
+    def test_digest_config_migration(self):
+        # the configuration added by update_43 does not rely on the update of the defaults
+        self.patch(migration, 'perform_data_update', lambda db_file: None)
+
+        helpers.init_state()
+        final_db_file = os.path.abspath(os.path.join(Settings.working_path, 'globaleaks.db'))
+        set_db_uri('sqlite:' + final_db_file)
+
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'db', 'populated', 'glbackend-42.db')
+        shutil.copyfile(path, final_db_file)
+
+        migration.perform_migration(42)
+
+        session = get_session(make_db_uri(final_db_file))
+
+        for tid, in session.query(models.Tenant.id):
+            self.assertEqual(config.ConfigFactory(session, tid, 'notification').get_val(u'notification_digest_interval'), 0)
+
+        for lang in session.query(models.EnabledLanguage):
+            l10n = config.NotificationL10NFactory(session, lang.tid).localized_dict(lang.name)
+            self.assertNotEqual(l10n[u'digest_mail_title'], u'')
+            self.assertNotEqual(l10n[u'digest_mail_template'], u'')
+
+        session.close()
+
 
 def test(path, version):
     return lambda self: self._test(path, version)
@@ -1,8 +1,31 @@
 # -*- coding: utf-8 -*-
+import time
+
 from globaleaks.models import Tenant
-from globaleaks.orm import get_session, transact
+from sqlalchemy.exc import OperationalError
+
+from globaleaks import orm
+from globaleaks.orm import get_engine, get_engine_stats, get_session, get_transaction_stats, \
+    transact, transact_ro
+from globaleaks.rest import errors
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
+from twisted.python import context
+
+
+class DelayedThreadPool(helpers.FakeThreadPool):
+    """
+    A fake thread pool queuing the functions until run is called
+    """
+    def __init__(self):
+        self.calls = []
+
+    def callInThreadWithCallback(self, *args, **kw):
+        self.calls.append((args, kw))
+
+    def run(self):
+        for args, kw in self.calls:
+            helpers.FakeThreadPool.callInThreadWithCallback(self, *args, **kw)
 
 
 class TestORM(helpers.TestGL):
@@ -14,6 +37,7 @@ class TestORM(helpers.TestGL):
         self.assertEqual(session.execute("PRAGMA foreign_keys").fetchone()[0], 1)  # ON
         self.assertEqual(session.execute("PRAGMA secure_delete").fetchone()[0], 1) # ON
         self.assertEqual(session.execute("PRAGMA auto_vacuum").fetchone()[0], 1)   # FULL
+        self.assertEqual(session.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
 
     @transact
     def _transact_with_success(self, session):
@@ -24,6 +48,25 @@ class TestORM(helpers.TestGL):
         self.db_add_config(session)
         raise Exception("antani")
 
+    @transact_ro
+    def _transact_ro_count(self, session):
+        return session.query(Tenant).count()
+
+    @transact_ro
+    def _transact_ro_with_write(self, session):
+        self.db_add_config(session)
+        session.flush()
+
+    @transact
+    def _transact_with_lock(self, session):
+        raise OperationalError('', (), 'database is locked')
+
+    @transact_ro
+    def _transact_n_plus_one(self, session):
+        for tenant in session.query(Tenant):
+            for _ in range(orm.QUERY_PROFILE_REPEAT_THRESHOLD + 1):
+                session.query(Tenant).filter(Tenant.id == tenant.id).one()
+
     def db_add_config(self, session):
         session.add(Tenant())
 
@@ -56,3 +99,99 @@ class TestORM(helpers.TestGL):
             self.assertTrue(getattr(session, 'query'))
 
         return transaction()
+
+    @inlineCallbacks
+    def test_engine_is_shared(self):
+        self.assertIs(get_engine(), get_engine())
+
+        yield self._transact_with_success()
+        yield self._transact_with_success()
+
+        stats = [x for x in get_engine_stats() if x['foreign_keys']][0]
+        self.assertTrue(stats['hit'] > 0)
+        self.assertEqual(stats['checkedout'], 0)
+
+    @inlineCallbacks
+    def test_transact_ro(self):
+        count = yield self._transact_ro_count()
+        self.assertEqual(count, 1)
+
+        yield self.assertFailure(self._transact_ro_with_write(), OperationalError)
+
+        count = yield self._transact_ro_count()
+        self.assertEqual(count, 1)
+
+    @inlineCallbacks
+    def test_transact_lock_backoff(self):
+        orm.set_write_max_wait(0.05)
+
+        try:
+            yield self.assertFailure(self._transact_with_lock(), errors.DatabaseBusy)
+        finally:
+            orm.set_write_max_wait(60)
+
+        stats = [x for x in get_transaction_stats() if x['name'].endswith('_transact_with_lock')][0]
+        self.assertEqual(stats['calls'], 1)
+        self.assertTrue(stats['attempts'] > 1)
+        self.assertEqual(stats['rollbacks'], stats['attempts'])
+        self.assertTrue(stats['wait_time'] <= 0.05)
+
+    @inlineCallbacks
+    def test_transact_queue_wait(self):
+        pool = DelayedThreadPool()
+        orm.set_thread_pool(pool)
+        orm.set_write_max_wait(0.05)
+
+        try:
+            d = self._transact_with_success()
+            self.assertEqual(orm.write_queue.waiting, 1)
+
+            # the time spent in the queue of the writer lane counts as wait
+            time.sleep(0.1)
+            pool.run()
+
+            yield self.assertFailure(d, errors.DatabaseBusy)
+        finally:
+            orm.set_thread_pool(helpers.FakeThreadPool())
+            orm.set_write_max_wait(60)
+
+        self.assertEqual(orm.write_queue.waiting, 0)
+
+        session = get_session()
+        self.assertEqual(session.query(Tenant).count(), 1)
+
+    @inlineCallbacks
+    def test_query_profile(self):
+        orm.set_profiling(True)
+        orm.query_profiles.clear()
+
+        profile = orm.QueryProfile()
+
+        try:
+            yield context.call({orm.QUERY_PROFILE_KEY: profile}, self._transact_n_plus_one)
+        finally:
+            orm.set_profiling(False)
+
+        self.assertEqual(profile.statements, orm.QUERY_PROFILE_REPEAT_THRESHOLD + 2)
+        self.assertEqual(profile.max_repeat(), orm.QUERY_PROFILE_REPEAT_THRESHOLD + 1)
+        self.assertEqual(len(orm.query_profiles), 1)
+        self.assertTrue(orm.query_profiles[0]['name'].endswith('_transact_n_plus_one'))
+
+    @inlineCallbacks
+    def test_query_profile_across_transactions(self):
+        orm.set_profiling(True)
+
+        profile = orm.QueryProfile()
+
+        @inlineCallbacks
+        def handler():
+            # the transactions following the first one are dispatched once it completes
+            yield self._transact_n_plus_one()
+            yield self._transact_n_plus_one()
+
+        try:
+            yield context.call({orm.QUERY_PROFILE_KEY: profile}, handler)
+        finally:
+            orm.set_profiling(False)
+
+        self.assertEqual(profile.statements, 2 * (orm.QUERY_PROFILE_REPEAT_THRESHOLD + 2))
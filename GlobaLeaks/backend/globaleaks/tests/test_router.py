@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import re
+
+from twisted.trial import unittest
+
+from globaleaks.rest import api
+from globaleaks.rest.router import Router, get_literal_first_segment
+
+
+paths = [
+    u'/public',
+    u'/token/abcdefghilmnopqrstuvz0123456789',
+    u'/rtip/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30',
+    u'/rtip/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30/comments',
+    u'/rtip/operations',
+    u'/rtip/rfile/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30',
+    u'/wbtip',
+    u'/wbtip/comments',
+    u'/receiver/tips',
+    u'/admin/files',
+    u'/admin/files/logo',
+    u'/admin/files/custom.css',
+    u'/admin/users/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30/img',
+    u'/admin/config/tls/files/csr',
+    u'/admin/unexistent',
+    u'/l10n/en',
+    u'/s/logo',
+    u'/u/shorturl',
+    u'/robots.txt',
+    u'/.well-known/acme-challenge/' + u'a' * 43,
+    u'/',
+    u'/index.html',
+    u'/js/scripts.min.js',
+    u'/public/',
+    u'relative',
+    u'/#$%'
+]
+
+
+def linear_match(path):
+    for tup in api.api_spec:
+        pattern = tup[0]
+
+        if not pattern.startswith("^"):
+            pattern = "^" + pattern
+
+        if not pattern.endswith("$"):
+            pattern += "$"
+
+        match = re.match(pattern, path)
+        if match:
+            return match.groups(), tup[1]
+
+    return None, None
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = Router()
+        for tup in api.api_spec:
+            self.router.add(*tup)
+
+    def test_get_literal_first_segment(self):
+        self.assertEqual(get_literal_first_segment(r'/admin/files$'), 'admin')
+        self.assertEqual(get_literal_first_segment(r'^/public$'), 'public')
+        self.assertEqual(get_literal_first_segment(r'/robots.txt'), None)
+        self.assertEqual(get_literal_first_segment(r'(/u/.{1,255})'), None)
+        self.assertEqual(get_literal_first_segment(r'/([a-z]*)'), None)
+
+    def test_same_semantics_of_linear_match(self):
+        for path in paths:
+            match, handler, _ = self.router.match(path)
+            expected_groups, expected_handler = linear_match(path)
+            self.assertEqual(handler, expected_handler)
+            self.assertEqual(match.groups() if match else None, expected_groups)
+
+    def test_routing_cost_does_not_depend_on_the_number_of_routes(self):
+        before = dict((path, len(self.router.candidates(path))) for path in paths)
+
+        for i in range(1000):
+            self.router.add(r'/benchmark%d/(.+)' % i, None)
+
+        for path in paths:
+            self.assertEqual(len(self.router.candidates(path)), before[path])
+
+        # a static file is matched against a handful of routes instead of every one
+        self.assertTrue(len(self.router.candidates(u'/js/scripts.min.js')) < 10)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import copy
+import re
+
+from six import text_type
+from twisted.trial import unittest
+
+from globaleaks.rest import requests
+from globaleaks.rest.errors import InputValidationError
+from globaleaks.rest.validator import compile_type, compile_validator, get_validator
+
+
+# candidate values used to build a message matching the regexps of the descriptors
+sample_strings = [
+    u'',
+    u'6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30',
+    u'admin',
+    u'default',
+    u'enabled',
+    u'enable_notifications',
+    u'homepage',
+    u'list',
+    u'postpone',
+    u'instance',
+    u'inputbox',
+    u'unicode',
+    u'pending',
+    u'submission',
+    u'whistleblower@globaleaks.org',
+    u'https://www.globaleaks.org',
+    u'globaleaks.org',
+    u'/submission',
+    u'a' * 42
+]
+
+sample_python_types = {
+    text_type: u'GlobaLeaks',
+    int: 1,
+    bool: True,
+    dict: {},
+    list: []
+}
+
+
+def generate_sample(template, unknown_keys=True):
+    if template == requests.SkipSpecificValidation:
+        return u'value'
+
+    if callable(template):
+        return copy.deepcopy(sample_python_types[template])
+
+    if isinstance(template, dict):
+        sample = {key: generate_sample(value, unknown_keys) for key, value in template.items()}
+
+        if unknown_keys:
+            # an attribute not present in the descriptors that should be stripped
+            sample['unknown_attribute'] = u'1970-01-01T00:00:00.000000Z'
+
+        return sample
+
+    if isinstance(template, str):
+        return next(x for x in sample_strings if re.match(template, x))
+
+    return [generate_sample(template[0], unknown_keys)]
+
+
+def get_descriptors():
+    return sorted((name, value) for name, value in vars(requests).items()
+                  if name.endswith(('Desc', 'DescRaw')) and isinstance(value, (dict, list)))
+
+
+class TestValidator(unittest.TestCase):
+    def test_validate_message_valid(self):
+        message = {
+            'spam': u'ham',
+            'num': u'3',
+            'flag': u'true',
+            'nest': [{'uuid': u'6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30', 'extra': 1}],
+            'extra': u'strip me'
+        }
+
+        template = {
+            'spam': text_type,
+            'num': int,
+            'flag': bool,
+            'nest': [{'uuid': requests.uuid_regexp}]
+        }
+
+        compile_validator(template)(message)
+
+        self.assertEqual(message, {
+            'spam': u'ham',
+            'num': u'3',
+            'flag': u'true',
+            'nest': [{'uuid': u'6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30'}]
+        })
+
+    def test_validate_message_invalid(self):
+        template = {'spam': text_type, 'nest': [{'uuid': requests.uuid_regexp}]}
+
+        for message in [{},
+                        [],
+                        {'spam': u'ham'},
+                        {'spam': None, 'nest': []},
+                        {'spam': 1, 'nest': []},
+                        {'spam': u'ham', 'nest': [{'uuid': u'invalid'}]},
+                        {'spam': u'ham', 'nest': [{}]}]:
+            self.assertRaises(InputValidationError, compile_validator(template), message)
+
+        self.assertRaises(InputValidationError, compile_validator([text_type]), [u'ham', 1])
+        self.assertRaises(InputValidationError, compile_validator(text_type), u'ham')
+
+    def test_validators_are_compiled_once(self):
+        self.assertIs(get_validator(requests.SubmissionDesc), get_validator(requests.SubmissionDesc))
+        self.assertIsNot(get_validator(requests.SubmissionDesc), get_validator(requests.AdminFieldDesc))
+
+    def test_validate_type(self):
+        self.assertTrue(compile_type(str)('foca'))
+        self.assertTrue(compile_type(bool)(True))
+        self.assertTrue(compile_type(bool)(u'false'))
+        self.assertTrue(compile_type(int)(4))
+        self.assertTrue(compile_type(int)(u'4'))
+        self.assertTrue(compile_type(text_type)(u'foca'))
+        self.assertTrue(compile_type(list)(['foca', 'fessa']))
+        self.assertTrue(compile_type(dict)({'foca': 1}))
+        self.assertTrue(compile_type('\\w+')('Foca'))
+
+        self.assertFalse(compile_type(str)(1))
+        self.assertFalse(compile_type(text_type)(1))
+        self.assertFalse(compile_type(text_type)(False))
+        self.assertFalse(compile_type(text_type)(None))
+        self.assertFalse(compile_type(list)({}))
+        self.assertFalse(compile_type(dict)(True))
+        self.assertFalse(compile_type('\\d+')('Foca'))
+
+    def test_validate_descriptors(self):
+        for name, template in get_descriptors():
+            sample = generate_sample(template)
+
+            get_validator(template)(sample)
+            self.assertEqual(sample, generate_sample(template, False), name)
+
+            if isinstance(template, dict):
+                for key in template:
+                    for message in [{k: v for k, v in sample.items() if k != key},
+                                    dict(sample, **{key: None})]:
+                        self.assertRaises(InputValidationError, get_validator(template), copy.deepcopy(message))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import os
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.rest import errors
+from globaleaks.settings import Settings
+from globaleaks.tests import helpers
+from globaleaks.utils.chunkedupload import ChunkedUpload, UploadQuota
+
+
+class TestChunkedUpload(helpers.TestGL):
+    @inlineCallbacks
+    def test_write_chunks_out_of_order(self):
+        data = os.urandom(1000)
+        upload = ChunkedUpload(Settings.tmp_path, len(data), 4, 256)
+
+        yield defer.gatherResults([upload.write_chunk(n, data[(n - 1) * 256:n * 256]) for n in [3, 1, 4]])
+        self.assertFalse(upload.complete)
+        self.assertTrue(upload.has_chunk(4))
+        self.assertFalse(upload.has_chunk(2))
+
+        # chunks sent again are written once
+        yield upload.write_chunk(1, data[:256])
+        yield upload.write_chunk(2, data[256:512])
+        self.assertTrue(upload.complete)
+
+        with upload.file.open('r') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_write_chunk_exceeding_size(self):
+        upload = ChunkedUpload(Settings.tmp_path, 1000, 4, 256)
+
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 0, b'a')
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 5, b'a')
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 4, b'a' * 256)
+
+    def test_declared_chunks_not_matching_size(self):
+        self.assertRaises(errors.InputValidationError, ChunkedUpload, Settings.tmp_path, 1000, 40, 256)
+        self.assertRaises(errors.InputValidationError, ChunkedUpload, Settings.tmp_path, 1000, 3, 256)
+        self.assertRaises(errors.InputValidationError, ChunkedUpload, Settings.tmp_path, 1000, 4, 0)
+
+        # an empty file is sent in a chunk
+        ChunkedUpload(Settings.tmp_path, 0, 1, 256)
+
+    def test_write_chunk_not_matching_size(self):
+        upload = ChunkedUpload(Settings.tmp_path, 1000, 4, 256)
+
+        # the chunks before the last one have the declared chunk size
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 1, b'a')
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 2, b'a' * 257)
+
+        # the last chunk ends at the declared file size
+        self.assertRaises(errors.InputValidationError, upload.write_chunk, 4, b'a' * 231)
+
+    def test_match(self):
+        upload = ChunkedUpload(Settings.tmp_path, 1000, 4, 256)
+
+        self.assertTrue(upload.match(1000, 4, 256))
+        self.assertFalse(upload.match(2000, 8, 256))
+
+
+class TestUploadQuota(helpers.TestGL):
+    def test_charge(self):
+        quota = UploadQuota(1000)
+
+        quota.charge(600)
+        quota.charge(400)
+        self.assertEqual(quota.used, 1000)
+
+        self.assertRaises(errors.UploadQuotaExceeded, quota.charge, 1)
+        self.assertEqual(quota.used, 1000)
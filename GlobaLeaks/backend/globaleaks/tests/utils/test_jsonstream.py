@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import json
+
+from twisted.trial import unittest
+
+from globaleaks.utils.jsonstream import JSONDepthScanner
+
+
+def nest(depth):
+    value = u'leaf'
+    for i in range(depth):
+        value = [value] if i % 2 else {u'key': value}
+
+    return json.dumps(value).encode()
+
+
+def feed_in_chunks(scanner, data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        scanner.feed(data[i:i + chunk_size])
+
+
+class TestJSONDepthScanner(unittest.TestCase):
+    def test_depth_within_limit(self):
+        for chunk_size in [1, 2, 7, 1024]:
+            scanner = JSONDepthScanner(10)
+            feed_in_chunks(scanner, nest(10), chunk_size)
+            self.assertEqual(scanner.depth, 0)
+
+    def test_depth_exceeding_limit(self):
+        for chunk_size in [1, 2, 7, 1024]:
+            scanner = JSONDepthScanner(10)
+            self.assertRaises(ValueError, feed_in_chunks, scanner, nest(11), chunk_size)
+
+    def test_brackets_in_strings_are_ignored(self):
+        data = json.dumps({u'a': u'[[[{{{', u'b': u'\\"[[[', u'c': [u'\\', u'{{{']}).encode()
+
+        for chunk_size in [1, 2, 3, 1024]:
+            scanner = JSONDepthScanner(2)
+            feed_in_chunks(scanner, data, chunk_size)
+            self.assertEqual(scanner.depth, 0)
+            self.assertFalse(scanner.in_string)
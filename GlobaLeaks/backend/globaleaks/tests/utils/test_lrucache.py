@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from twisted.trial import unittest
+
+from globaleaks.utils.lrucache import LRUCache, json_size
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(3)
+
+        for x in range(3):
+            cache.set(x, x)
+
+        self.assertEqual(cache.get(0), 0)
+
+        cache.set(3, 3)
+
+        self.assertTrue(0 in cache)
+        self.assertFalse(1 in cache)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(1), None)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_size_accounting(self):
+        cache = LRUCache(20, sizeof=json_size)
+
+        cache.set('a', 'x' * 8)
+        cache.set('b', 'y' * 8)
+        self.assertEqual(cache.size, 20)
+
+        cache.set('a', 'x')
+        self.assertEqual(cache.size, 13)
+
+        cache.set('c', 'z' * 100)
+        self.assertFalse('c' in cache)
+
+        cache.set('c', 'z' * 8)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.size, 13)
+
+        cache.clear()
+        self.assertEqual(cache.size, 0)
@@ -2,7 +2,8 @@
 import os
 from datetime import datetime
 
-from globaleaks.utils.pgp import PGPContext
+from globaleaks.rest import errors
+from globaleaks.utils.pgp import PGPContext, PGPEncryptionSink, PGPKeyring
 from globaleaks.tests import helpers
 
 
@@ -47,6 +48,27 @@ class TestPGP(helpers.TestGL):
         with open(file_dst, 'rb') as f:
             self.assertEqual(str(pgpctx.gnupg.decrypt_file(f)), self.secret_content)
 
+    def test_encryption_sink(self):
+        file_dst = os.path.join(os.getcwd(), 'test_encrypted_file.txt')
+
+        pgpctx = PGPContext()
+        pgpctx.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'])
+
+        sink = PGPEncryptionSink(pgpctx, u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1', file_dst)
+        for line in self.secret_content.splitlines(True):
+            sink.write(line.encode())
+
+        self.assertEqual(sink.wait(), os.stat(file_dst).st_size)
+
+        with open(file_dst, 'rb') as f:
+            self.assertEqual(str(pgpctx.gnupg.decrypt_file(f)), self.secret_content)
+
+        # the writes to a failed encryption do not block
+        sink = PGPEncryptionSink(pgpctx, u'0000000000000000000000000000000000000000', file_dst)
+        sink.write(b'a' * 1024 * 1024)
+
+        self.assertRaises(errors.InputValidationError, sink.wait)
+
     def test_read_expirations(self):
         pgpctx = PGPContext()
 
@@ -55,3 +77,47 @@ class TestPGP(helpers.TestGL):
 
         self.assertEqual(pgpctx.load_key(helpers.PGPKEYS['EXPIRED_PGP_KEY_PUB'])['expiration'],
                          datetime.utcfromtimestamp(1391012793))
+
+    def test_keyring(self):
+        keyring = PGPKeyring()
+
+        pgpctx = keyring.get_context()
+        imports = []
+        load_key = pgpctx.load_key
+        pgpctx.load_key = lambda key: imports.append(key) or load_key(key)
+
+        for _ in range(3):
+            encrypted_body = keyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'], self.secret_content)
+            self.assertEqual(str(pgpctx.gnupg.decrypt(encrypted_body)), self.secret_content)
+
+        # the key is imported only at its first use
+        self.assertEqual(len(imports), 1)
+
+        # a removed key is imported again when used
+        keyring.remove_key(u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1')
+        self.assertEqual(keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'])['fingerprint'],
+                         u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1')
+        self.assertEqual(len(imports), 2)
+
+    def test_keyring_remove_key_in_use(self):
+        keyring = PGPKeyring()
+        pgpctx = keyring.get_context()
+        fingerprint = u'BFB3C82D1B5F6A94BDAC55C6E70460ABF9A4C8C1'
+
+        # the key is kept in the keyring until the encryption using it is completed
+        self.assertEqual(keyring.acquire_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])['fingerprint'], fingerprint)
+        keyring.remove_key(fingerprint)
+        self.assertEqual(len(pgpctx.gnupg.list_keys(keys=[fingerprint])), 1)
+
+        encrypted_body = pgpctx.encrypt_message(fingerprint, self.secret_content)
+        self.assertNotEqual(encrypted_body, self.secret_content)
+
+        keyring.release_key(fingerprint)
+        self.assertEqual(len(pgpctx.gnupg.list_keys(keys=[fingerprint])), 0)
+
+        # a key used again after its removal is kept
+        keyring.acquire_key(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'])
+        keyring.remove_key(fingerprint)
+        keyring.encrypt_message(helpers.PGPKEYS['VALID_PGP_KEY1_PUB'], self.secret_content)
+        keyring.release_key(fingerprint)
+        self.assertEqual(len(pgpctx.gnupg.list_keys(keys=[fingerprint])), 1)
@@ -1,8 +1,9 @@
 # -*- coding: utf-8
 import os
 from six import text_type
+from twisted.internet.defer import inlineCallbacks
 
-from globaleaks.utils.securetempfile import SecureTemporaryFile, SecureTemporaryFile
+from globaleaks.utils.securetempfile import SecureTemporaryFile, ThreadPoolStats
 from globaleaks.settings import Settings
 from globaleaks.tests import helpers
 
@@ -18,3 +19,31 @@ class TestSecureTemporaryFiles(helpers.TestGL):
         with a.open('r') as f:
             for x in range(1000):
                 self.assertTrue(antani == text_type(f.read(10), 'utf-8'))
+
+    def test_write_at(self):
+        data = os.urandom(1000)
+
+        a = SecureTemporaryFile(Settings.tmp_path)
+        for offset in [400, 150, 0, 333, 17]:
+            a.write_at(offset, data[offset:offset + 200])
+
+        # the portions written in any order are decrypted as a single stream
+        with a.open('r') as f:
+            self.assertEqual(f.read(), data[:600])
+
+    @inlineCallbacks
+    def test_deferred_operations(self):
+        completed = ThreadPoolStats.completed
+        antani = b"0123456789"
+
+        a = SecureTemporaryFile(Settings.tmp_path)
+        for _ in range(10):
+            yield a.deferred_write(antani)
+
+        yield a.deferred_finalize_write()
+
+        data = yield a.deferred_read()
+        self.assertEqual(data, antani * 10)
+
+        self.assertEqual(ThreadPoolStats.pending, 0)
+        self.assertEqual(ThreadPoolStats.completed, completed + 12)
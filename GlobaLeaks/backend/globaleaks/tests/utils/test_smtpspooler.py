@@ -0,0 +1,114 @@
+# -*- coding: utf-8
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
+from twisted.internet.testing import StringTransport
+
+from globaleaks.tests import helpers
+from globaleaks.utils.smtpspooler import SMTPServerQueue, SMTPSessionFactory, SMTPSpooler
+
+
+class FakeSMTPServerQueue(SMTPServerQueue):
+    def open_session(self):
+        self.sessions += 1
+
+        session = SMTPSessionFactory(self).buildProtocol(None)
+        session.makeConnection(StringTransport())
+        self.opened.append(session)
+
+
+def converse(session, rejected=()):
+    """
+    Answer as a SMTP server to the commands sent by the session
+    """
+    transport = session.transport
+    if not getattr(session, 'greeted', False):
+        session.greeted = True
+        session.dataReceived(b'220 fake ESMTP\r\n')
+
+    while transport.value():
+        lines = transport.value().split(b'\r\n')
+        transport.clear()
+
+        for line in lines:
+            if line.startswith(b'EHLO'):
+                session.dataReceived(b'250-fake\r\n250 AUTH PLAIN\r\n')
+            elif line.startswith(b'AUTH'):
+                session.dataReceived(b'235 ok\r\n')
+            elif line.startswith(b'MAIL') or line.startswith(b'RSET'):
+                session.dataReceived(b'250 ok\r\n')
+            elif line.startswith(b'RCPT'):
+                session.dataReceived(b'550 no\r\n' if line[9:-1] in rejected else b'250 ok\r\n')
+            elif line.startswith(b'DATA'):
+                session.dataReceived(b'354 go\r\n')
+                while transport.producer is not None:
+                    transport.producer.resumeProducing()
+            elif line == b'.':
+                session.dataReceived(b'250 queued\r\n')
+            elif line.startswith(b'QUIT'):
+                session.dataReceived(b'221 bye\r\n')
+
+
+class TestSMTPSpooler(helpers.TestGL):
+    def setUp(self):
+        self.spooler = SMTPSpooler()
+        self.queue = FakeSMTPServerQueue(self.spooler, u'smtp.example.org', 465, 'SSL',
+                                         u'user', u'password', False, '127.0.0.1', 9050)
+        self.queue.opened = []
+
+        return helpers.TestGL.setUp(self)
+
+    def tearDown(self):
+        for session in self.queue.opened:
+            session.connectionLost(Failure(ConnectionDone()))
+
+        return helpers.TestGL.tearDown(self)
+
+    def push_mails(self, addresses):
+        results = []
+
+        for address in addresses:
+            d = self.spooler.sendmail(1, u'user', u'password', u'smtp.example.org', 465, 'SSL',
+                                      u'sender', u'sender@example.org', address, u'subject', u'body', False)
+            d.addCallback(results.append)
+
+        return results
+
+    def test_session_reuse(self):
+        self.spooler.queues[(u'smtp.example.org', 465, 'SSL', u'user', u'password', False)] = self.queue
+
+        results = self.push_mails([u'a%d@example.org' % i for i in range(10)] + [u'rejected@example.org'])
+
+        # the sessions opened are bounded
+        self.assertEqual(len(self.queue.opened), 3)
+
+        for session in self.queue.opened:
+            converse(session, rejected=[b'rejected@example.org'])
+
+        # a mail refused does not affect the others sent through the same session
+        self.assertEqual(results, [True] * 10 + [False])
+        self.assertEqual(len(self.queue.idle), 3)
+
+        # the following mails reuse the idle sessions
+        results = self.push_mails([u'b@example.org'])
+        converse([x for x in self.queue.opened if x not in self.queue.idle][0])
+
+        self.assertEqual(results, [True])
+        self.assertEqual(len(self.queue.opened), 3)
+
+        stats = self.spooler.get_stats()
+        self.assertEqual(stats['sent'], 11)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['queued'], 0)
+
+    def test_unreachable_server(self):
+        self.spooler.queues[(u'smtp.example.org', 465, 'SSL', u'user', u'password', False)] = self.queue
+
+        results = self.push_mails([u'a%d@example.org' % i for i in range(5)])
+
+        for session in self.queue.opened:
+            session.connectionLost(Failure(ConnectionDone()))
+
+        self.queue.opened = []
+
+        self.assertEqual(results, [False] * 5)
+        self.assertEqual(self.queue.sessions, 0)
@@ -1,9 +1,34 @@
 # -*- coding: utf-8 -*-
 from twisted.internet.defer import inlineCallbacks
+from globaleaks.db.appdata import load_appdata
 from globaleaks.handlers import admin, rtip
 from globaleaks.jobs.delivery import Delivery
 from globaleaks.tests import helpers
-from globaleaks.utils.templating import Templating, supported_template_types
+from globaleaks.utils.templating import Templating, supported_template_types, template_cache
+
+
+def get_tip_notification_data():
+    templates = load_appdata()['templates']
+
+    return {
+        'type': u'tip',
+        'node': {
+            'name': u'GlobaLeaks',
+            'onionservice': u'aaaaaaaaaaaaaaaa.onion',
+            'hostname': u'www.globaleaks.org'
+        },
+        'notification': dict((k, v['en']) for k, v in templates.items()),
+        'user': {'name': u'Recipient1'},
+        'context': {'name': u'Context1'},
+        'tip': {
+            'id': u'6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30',
+            'progressive': 1,
+            'label': u'',
+            'creation_date': u'2018-01-01T00:00:00Z',
+            'questionnaire': [],
+            'answers': {}
+        }
+    }
 
 
 class notifTemplateTest(helpers.TestGLWithPopulatedDB):
@@ -39,3 +64,61 @@ class notifTemplateTest(helpers.TestGLWithPopulatedDB):
             data['type'] = key
             template = ''.join(supported_template_types[key].keyword_list)
             Templating().format_template(template, data)
+
+
+class TestTemplateCompilation(helpers.TestGL):
+    def test_format_template(self):
+        data = get_tip_notification_data()
+        templating = Templating(1, u'en')
+
+        for template, expected in [(u'', u''),
+                                   (u'{Unknown} {TipNum}', u'{Unknown} 1'),
+                                   (u'{TipNum}{TipNum}\n{Blank}\n{TipID}\n{Blank}', u'11\n6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30'),
+                                   (u'{TipNum} {TipLabel}\n{Blank}\n{ContextName}\n{RecipientName}', u'1 \nContext1\nRecipient1')]:
+            self.assertEqual(templating.format_template(template, data, 'test'), expected)
+
+        body = templating.format_template(data['notification']['tip_mail_template'], data, 'tip_mail_template')
+        self.assertIn(u'Recipient1', body)
+        self.assertIn(u'http://aaaaaaaaaaaaaaaa.onion/#/status/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30', body)
+        self.assertIn(u'https://www.globaleaks.org/#/status/6b1d9d1e-0cf0-4e47-9b84-0ccf4f8f6e30', body)
+        self.assertNotIn(u'{', body)
+
+        # a keyword replaced by a text including other keywords
+        data['user']['name'] = u'{TipNum}'
+        self.assertEqual(Templating().format_template(u'{RecipientName}', data), u'1')
+
+    def test_cache_invalidation(self):
+        data = get_tip_notification_data()
+
+        for tid in [1, 2]:
+            Templating(tid, u'en').get_mail_subject_and_body(data)
+            self.assertIn((tid, 'tip_mail_title', u'en'), template_cache.templates)
+
+        # the compiled template is reused while the template is unchanged
+        template = template_cache.templates[(1, 'tip_mail_title', u'en')]
+        Templating(1, u'en').get_mail_subject_and_body(data)
+        self.assertIs(template_cache.templates[(1, 'tip_mail_title', u'en')], template)
+
+        # a changed template is compiled again even if the cache is not invalidated
+        data['notification']['tip_mail_title'] = u'New tip'
+        self.assertEqual(Templating(1, u'en').get_mail_subject_and_body(data)[0], u'1 New tip')
+        self.assertIsNot(template_cache.templates[(1, 'tip_mail_title', u'en')], template)
+
+        template_cache.invalidate(1)
+        self.assertNotIn((1, 'tip_mail_title', u'en'), template_cache.templates)
+        self.assertIn((2, 'tip_mail_title', u'en'), template_cache.templates)
+
+        self.assertEqual(Templating(1, u'en').get_mail_subject_and_body(data)[0], u'1 New tip')
+
+    def test_digest(self):
+        data = get_tip_notification_data()
+        data['type'] = u'digest'
+        data['events'] = [{'creation_date': u'2018-01-01T00:00:00Z', 'subject': u'1 New submission'},
+                          {'creation_date': u'2018-01-01T01:00:00Z', 'subject': u'1 New comment'}]
+
+        subject, body = Templating(1, u'en').get_mail_subject_and_body(data)
+
+        self.assertEqual(subject, data['notification']['digest_mail_title'])
+        self.assertIn(u'2 events', body)
+        self.assertIn(u'1 New submission\n', body)
+        self.assertIn(u'1 New comment\n', body)
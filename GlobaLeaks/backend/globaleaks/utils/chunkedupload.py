@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+#   chunkedupload
+#   *************
+#
+# Reassembly of the files uploaded in chunks by Flow.js
+from twisted.internet import defer
+
+from globaleaks.rest import errors
+from globaleaks.utils.securetempfile import SecureTemporaryFile
+
+# maximum number of chunks written to disk at the same time; the chunks of
+# further requests, already received in memory, wait in queue for a slot
+UPLOAD_MAX_CONCURRENT_WRITES = 4
+
+upload_semaphore = defer.DeferredSemaphore(UPLOAD_MAX_CONCURRENT_WRITES)
+
+# the uploads of the same session or submission token are bounded to the
+# bytes of this number of files of the maximum size
+UPLOAD_QUOTA_FILES = 20
+
+
+def count_chunks(total_size, chunk_size):
+    """
+    Return the number of chunks in which Flow.js splits a file
+
+    An empty file is still sent in a chunk
+    """
+    return max((total_size + chunk_size - 1) // chunk_size, 1)
+
+
+class UploadQuota(object):
+    """
+    The bytes of the uploads started by a session or submission token
+    """
+    expireCall = None
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+
+    def charge(self, size):
+        """
+        Reserve the bytes of an upload
+
+        @raise UploadQuotaExceeded: if the upload exceeds the quota
+        """
+        if self.used + size > self.limit:
+            raise errors.UploadQuotaExceeded(self.limit)
+
+        self.used += size
+
+
+class ChunkedUpload(object):
+    """
+    A file uploaded in chunks that could be received out of order, in
+    parallel and resumed, encrypted to a temporary file as they arrive
+    """
+    expireCall = None
+
+    def __init__(self, filesdir, total_size, total_chunks, chunk_size):
+        if total_size < 0 or chunk_size < 1 or total_chunks != count_chunks(total_size, chunk_size):
+            raise errors.InputValidationError("Upload sizes not matching the declared number of chunks")
+
+        self.file = SecureTemporaryFile(filesdir)
+        self.total_size = total_size
+        self.total_chunks = total_chunks
+        self.chunk_size = chunk_size
+
+        # numbers of the chunks written and of the ones being written
+        self.chunks = set()
+        self.pending = set()
+
+    def match(self, total_size, total_chunks, chunk_size):
+        """
+        Check that a chunk belongs to the same upload of the previous ones
+        """
+        return (self.total_size, self.total_chunks, self.chunk_size) == (total_size, total_chunks, chunk_size)
+
+    def has_chunk(self, number):
+        return number in self.chunks
+
+    @property
+    def complete(self):
+        return len(self.chunks) == self.total_chunks
+
+    def write_chunk(self, number, data):
+        """
+        Write the chunk in a thread returning a deferred fired once it is on disk
+
+        @raise InputValidationError: if the chunk does not match the declared sizes
+        """
+        offset = (number - 1) * self.chunk_size
+
+        if not 1 <= number <= self.total_chunks:
+            raise errors.InputValidationError("Chunk %d exceeding the declared number of chunks" % number)
+
+        if offset + len(data) > self.total_size:
+            raise errors.InputValidationError("Chunk %d exceeding the declared file size" % number)
+
+        # every chunk has the declared size except the last one that ends the file
+        if number < self.total_chunks and len(data) != self.chunk_size or \
+           number == self.total_chunks and offset + len(data) != self.total_size:
+            raise errors.InputValidationError("Chunk %d not matching the declared sizes" % number)
+
+        if number in self.chunks or number in self.pending:
+            # a chunk sent again after a network failure
+            return defer.succeed(None)
+
+        self.pending.add(number)
+
+        d = upload_semaphore.run(self.file.deferred_write_at, offset, data)
+        d.addCallback(lambda _: self.chunks.add(number))
+        d.addBoth(lambda result: self.pending.discard(number) or result)
+
+        return d
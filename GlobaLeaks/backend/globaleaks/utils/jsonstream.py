@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+#   jsonstream
+#   **********
+#
+# Incremental scanning of JSON documents received in chunks
+import re
+
+
+class JSONDepthScanner(object):
+    """
+    Track the nesting depth of a JSON document while it is received so that
+    documents nested too deeply are rejected before being fully buffered
+    and parsed
+    """
+    tokens = re.compile(br'["\\\[\]{}]')
+
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+        self.depth = 0
+        self.in_string = False
+
+        # set when the last chunk ended with the escape character of a string
+        self.escape = False
+
+    def feed(self, data):
+        """
+        Scan a chunk of the document raising ValueError if the maximum depth is exceeded
+        """
+        # tokens before this offset are escaped by a backslash
+        escaped = 1 if self.escape else 0
+        self.escape = False
+
+        for match in self.tokens.finditer(data):
+            i = match.start()
+            if i < escaped:
+                continue
+
+            c = data[i:i + 1]
+            if self.in_string:
+                if c == b'\\':
+                    escaped = i + 2
+                    self.escape = escaped > len(data)
+                elif c == b'"':
+                    self.in_string = False
+            elif c == b'"':
+                self.in_string = True
+            elif c in (b'[', b'{'):
+                self.depth += 1
+                if self.depth > self.max_depth:
+                    raise ValueError("Maximum nesting depth (%d) exceeded" % self.max_depth)
+            else:
+                self.depth -= 1
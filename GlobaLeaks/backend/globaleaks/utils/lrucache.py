@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+from collections import OrderedDict
+
+
+def json_size(value):
+    """
+    Estimate the memory footprint of a json serializable value
+    """
+    return len(json.dumps(value))
+
+
+class LRUCache(object):
+    """
+    A thread safe least recently used cache bounded by the total size of
+    its entries as evaluated by the sizeof function (by default the
+    number of entries)
+    """
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.sizeof = sizeof if sizeof is not None else lambda value: 1
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            value, size = self.entries.pop(key)
+            self.entries[key] = (value, size)
+
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+            # values larger than the whole cache are never stored
+            if size > self.max_size:
+                return value
+
+            while self.entries and self.size + size > self.max_size:
+                self.size -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+            self.entries[key] = (value, size)
+            self.size += size
+
+        return value
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -1,15 +1,42 @@
 # -*- coding: utf-8 -*-
+import fcntl
+import hashlib
 import os
 import shutil
 import tempfile
+import threading
 
+from collections import Counter
 from datetime import datetime
 
-from gnupg import GPG
+import gnupg
 
 from globaleaks.rest import errors
 from globaleaks.utils.utility import log
 
+# serializes the creation of the gpg processes and of their pipes
+_spawn_lock = threading.Lock()
+
+
+def set_cloexec(fd):
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+
+class GPG(gnupg.GPG):
+    def _open_subprocess(self, *args, **kwargs):
+        """
+        Spawn gpg keeping its pipes out of the processes spawned at the same
+        time by other threads, that otherwise would inherit them and never
+        let the encryptions running in parallel see the end of their input
+        """
+        with _spawn_lock:
+            p = gnupg.GPG._open_subprocess(self, *args, **kwargs)
+
+            for f in (p.stdin, p.stdout, p.stderr):
+                set_cloexec(f.fileno())
+
+        return p
+
 
 class PGPContext(object):
     """
@@ -58,7 +85,7 @@ class PGPContext(object):
 
         # looking if the key is effectively reachable
         try:
-            all_keys = self.gnupg.list_keys()
+            all_keys = self.gnupg.list_keys(keys=[fingerprint])
         except Exception as excep:
             log.err("Error in PGP list_keys: %s", excep)
             raise errors.InputValidationError
@@ -102,3 +129,169 @@ class PGPContext(object):
             shutil.rmtree(self.gnupg.gnupghome)
         except Exception as excep:
             log.err("Unable to clean temporary PGP environment: %s: %s", self.gnupg.gnupghome, excep)
+
+
+class PGPKeyring(object):
+    """
+    A keyring living as long as the application where each public key is
+    imported once; the fingerprint and the expiration of the keys are
+    cached by the digest of the key material so that a key already known
+    does not cost a gpg invocation before every encryption
+
+    The keys are shared by the users and the encryptions running in parallel
+    and so a removed key is deleted from the keyring once no encryption uses it
+    """
+    def __init__(self, tempdirprefix=None):
+        self.tempdirprefix = tempdirprefix
+        self.pgpctx = None
+        self.keys = {}
+        self.lock = threading.RLock()
+
+        # number of the encryptions using each key and keys removed while in use
+        self.refs = Counter()
+        self.removed = set()
+
+    def get_context(self):
+        with self.lock:
+            if self.pgpctx is None:
+                self.pgpctx = PGPContext(self.tempdirprefix)
+
+            return self.pgpctx
+
+    def load_key(self, key):
+        """
+        @param key
+        @return: a dict with the expiration date and the key fingerprint
+        """
+        digest = hashlib.sha256(key.encode('utf-8') if not isinstance(key, bytes) else key).hexdigest()
+
+        with self.lock:
+            k = self.keys.get(digest)
+            if k is None:
+                k = self.keys[digest] = self.get_context().load_key(key)
+
+                # the key is used again and so should be kept
+                self.removed.discard(k['fingerprint'])
+
+        return k
+
+    def acquire_key(self, key):
+        """
+        Load a key preventing its deletion until it is released
+
+        @return: a dict with the expiration date and the key fingerprint
+        """
+        with self.lock:
+            k = self.load_key(key)
+            self.refs[k['fingerprint']] += 1
+
+        return k
+
+    def release_key(self, key_fingerprint):
+        with self.lock:
+            self.refs[key_fingerprint] -= 1
+            if self.refs[key_fingerprint] > 0:
+                return
+
+            del self.refs[key_fingerprint]
+
+            if key_fingerprint in self.removed:
+                self.removed.discard(key_fingerprint)
+                self.pgpctx.gnupg.delete_keys(str(key_fingerprint))
+
+    def remove_key(self, key_fingerprint):
+        """
+        Invalidate a key when it is changed or removed by its owner
+        """
+        with self.lock:
+            for digest in [d for d, k in self.keys.items() if k['fingerprint'] == key_fingerprint]:
+                del self.keys[digest]
+
+            if self.pgpctx is None:
+                return
+
+            if self.refs[key_fingerprint] > 0:
+                self.removed.add(key_fingerprint)
+            else:
+                self.pgpctx.gnupg.delete_keys(str(key_fingerprint))
+
+    def encrypt_file(self, key, input_file, output_path):
+        fingerprint = self.acquire_key(key)['fingerprint']
+        try:
+            return self.get_context().encrypt_file(fingerprint, input_file, output_path)
+        finally:
+            self.release_key(fingerprint)
+
+    def encrypt_message(self, key, plaintext):
+        fingerprint = self.acquire_key(key)['fingerprint']
+        try:
+            return self.get_context().encrypt_message(fingerprint, plaintext)
+        finally:
+            self.release_key(fingerprint)
+
+
+class PGPEncryptionSink(object):
+    """
+    Encrypt for a key the data written to the sink feeding a gpg process
+    through a pipe, so that a stream could be encrypted for many keys in
+    parallel while it is read
+    """
+    def __init__(self, pgpctx, key_fingerprint, output_path):
+        self.key_fingerprint = key_fingerprint
+        self.output_path = output_path
+        self.size = None
+        self.error = None
+
+        # the pipe should not be inherited by the gpg processes of the other
+        # sinks or the end of the stream would never be notified
+        with _spawn_lock:
+            r, w = os.pipe()
+            for fd in (r, w):
+                set_cloexec(fd)
+
+        self.pipe_in = os.fdopen(r, 'rb')
+        self.pipe_out = os.fdopen(w, 'wb')
+
+        self.thread = threading.Thread(target=self.encrypt, args=(pgpctx, key_fingerprint))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def encrypt(self, pgpctx, key_fingerprint):
+        try:
+            _, self.size = pgpctx.encrypt_file(key_fingerprint, self.pipe_in, self.output_path)
+        except Exception as excep:
+            self.error = excep
+        finally:
+            # a failed process stops reading and so the writes should fail instead of blocking
+            self.pipe_in.close()
+
+    def write(self, data):
+        if self.pipe_out is None:
+            return
+
+        try:
+            self.pipe_out.write(data)
+        except (IOError, OSError) as excep:
+            self.error = self.error or excep
+            self.close()
+
+    def close(self):
+        if self.pipe_out is not None:
+            try:
+                self.pipe_out.close()
+            except (IOError, OSError):
+                pass
+
+            self.pipe_out = None
+
+    def wait(self):
+        """
+        Wait the end of the encryption returning the size of the encrypted file
+        """
+        self.close()
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+        return self.size
@@ -1,14 +1,67 @@
 # -*- coding: utf-8 -*-
+import binascii
 import os
 import tempfile
 import time
 
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from six import text_type
+from twisted.internet import defer, reactor
+from twisted.internet.threads import deferToThreadPool
 
 from globaleaks.rest import errors
 from globaleaks.utils.security import crypto_backend, generateRandomKey
 
+# thread pool running the encryption and the disk I/O of the temporary files
+__THREAD_POOL = None
+
+
+class ThreadPoolStats(object):
+    """
+    Depth of the queue of the operations submitted to the thread pool
+    """
+    pending = 0
+    max_pending = 0
+    completed = 0
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'workers': getattr(get_thread_pool(), 'max', None),
+            'pending': cls.pending,
+            'max_pending': cls.max_pending,
+            'completed': cls.completed
+        }
+
+
+def set_thread_pool(thread_pool):
+    global __THREAD_POOL
+    __THREAD_POOL = thread_pool
+
+
+def get_thread_pool():
+    global __THREAD_POOL
+    return __THREAD_POOL
+
+
+def run_in_thread_pool(function, *args, **kwargs):
+    """
+    Run the function in the thread pool returning a deferred fired with its result
+    """
+    ThreadPoolStats.pending += 1
+    ThreadPoolStats.max_pending = max(ThreadPoolStats.max_pending, ThreadPoolStats.pending)
+
+    def completed(result):
+        ThreadPoolStats.pending -= 1
+        ThreadPoolStats.completed += 1
+        return result
+
+    d = deferToThreadPool(reactor, get_thread_pool(), function, *args, **kwargs)
+    d.addBoth(completed)
+
+    return d
+
+
 class SecureTemporaryFile(object):
     file = None
 
@@ -24,6 +77,9 @@ class SecureTemporaryFile(object):
         self.enc = self.cipher.encryptor()
         self.dec = None
 
+        # serializes the operations depending on the state of the cipher
+        self.lock = defer.DeferredLock()
+
     def open(self, mode):
         if self.file is None:
            if mode == 'w':
@@ -40,6 +96,34 @@ class SecureTemporaryFile(object):
 
         self.file.write(self.enc.update(data))
 
+    def write_at(self, offset, data):
+        """
+        Encrypt and write the data at the offset of the file
+
+        The counter mode allows to encrypt each portion of the file
+        independently so that the chunks of an upload could be written
+        in any order and concurrently
+        """
+        if isinstance(data, text_type):
+            data = data.encode('utf-8')
+
+        counter = (int(binascii.hexlify(self.key_counter_nonce), 16) + offset // 16) % (1 << 128)
+        counter_block = binascii.unhexlify('%032x' % counter)
+        enc = Cipher(algorithms.AES(self.key), modes.CTR(counter_block), backend=crypto_backend).encryptor()
+
+        # skip the keystream preceding the offset within its block
+        enc.update(b'\0' * (offset % 16))
+
+        data = enc.update(data) + enc.finalize()
+
+        fd = os.open(self.filepath, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            os.lseek(fd, offset, os.SEEK_SET)
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+
     def finalize_write(self):
         self.file.write(self.enc.finalize())
 
@@ -54,6 +138,45 @@ class SecureTemporaryFile(object):
 
         return self.dec.finalize()
 
+    def run_locked(self, function, *args):
+        return self.lock.run(run_in_thread_pool, function, *args)
+
+    def deferred_write(self, data):
+        """
+        Append the data to the file in the thread pool
+        """
+        def write():
+            with self.open('w'):
+                self.write(data)
+
+        return self.run_locked(write)
+
+    def deferred_write_at(self, offset, data):
+        """
+        Write the data at the offset of the file in the thread pool
+        """
+        return run_in_thread_pool(self.write_at, offset, data)
+
+    def deferred_finalize_write(self):
+        """
+        Finalize and close the file in the thread pool
+        """
+        def finalize_write():
+            with self.open('w'):
+                self.finalize_write()
+
+        return self.run_locked(finalize_write)
+
+    def deferred_read(self):
+        """
+        Read and decrypt the whole file in the thread pool
+        """
+        def read():
+            with self.open('r') as f:
+                return f.read()
+
+        return self.run_locked(read)
+
     def close(self):
         self.file.close()
         self.file = None
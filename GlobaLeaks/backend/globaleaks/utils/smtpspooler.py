@@ -0,0 +1,284 @@
+# -*- coding: utf-8
+#
+# smtpspooler
+# ***********
+#
+# Delivery of the mails through ESMTP sessions reused across the messages
+# queued for the same server
+import collections
+import time
+
+from twisted.internet import defer, protocol, reactor
+from twisted.internet.endpoints import TCP4ClientEndpoint
+from twisted.mail.smtp import DNSNAME, SUCCESS, SMTPClient, ESMTPSender
+from twisted.protocols import tls
+
+from globaleaks.utils.mailutils import MIME_mail_build
+from globaleaks.utils.socks import SOCKS5ClientEndpoint
+from globaleaks.utils.tls import TLSClientContextFactory
+from globaleaks.utils.utility import log
+
+# sessions opened at the same time with each server
+SMTP_MAX_SESSIONS_PER_SERVER = 3
+
+# messages sent through a session before closing it and opening a new one
+SMTP_MAX_MESSAGES_PER_SESSION = 100
+
+# seconds for which a session with no messages to send is kept open
+SMTP_SESSION_IDLE_TIMEOUT = 30
+
+# seconds waited for the answers of the server
+SMTP_TIMEOUT = 30
+
+# seconds over which the throughput is measured
+SMTP_THROUGHPUT_WINDOW = 60
+
+
+class OutgoingMail(object):
+    __slots__ = ['tid', 'from_address', 'to_address', 'message', 'deferred']
+
+    def __init__(self, tid, from_address, to_address, message):
+        self.tid = tid
+        self.from_address = from_address
+        self.to_address = to_address
+        self.message = message
+        self.deferred = defer.Deferred()
+
+
+class SMTPSession(ESMTPSender):
+    """
+    An authenticated ESMTP session sending one after the other the mails
+    queued for its server; once the queue is empty the session is kept
+    open for a while to be reused by the next mails
+    """
+    mail = None
+    idle_call = None
+    sent = 0
+
+    def smtpState_from(self, code, resp):
+        self.mail = None
+
+        if self.sent < SMTP_MAX_MESSAGES_PER_SESSION:
+            self.mail = self.factory.queue.pop_mail()
+            if self.mail is None:
+                return self.park()
+
+        return ESMTPSender.smtpState_from(self, code, resp)
+
+    def park(self):
+        self.setTimeout(None)
+        self.idle_call = reactor.callLater(SMTP_SESSION_IDLE_TIMEOUT, self.close)
+        self.factory.queue.idle.append(self)
+
+    def resume(self):
+        """
+        Send the mails queued while the session was idle
+        """
+        self.idle_call.cancel()
+        self.idle_call = None
+        self.setTimeout(self.timeout)
+        self.smtpState_from(250, b'')
+
+    def close(self):
+        self.idle_call = None
+        self.factory.queue.idle.remove(self)
+        self._disconnectFromServer()
+
+    def getMailFrom(self):
+        if self.mail is None:
+            return None
+
+        return str(self.mail.from_address)
+
+    def getMailTo(self):
+        return [self.mail.to_address]
+
+    def getMailData(self):
+        return self.mail.message
+
+    def sentMail(self, code, resp, numOk, addresses, log):
+        mail, self.mail = self.mail, None
+        self.sent += 1
+
+        # a mail refused by the server does not affect the others of the session
+        self.factory.queue.mail_done(mail, code in SUCCESS, resp)
+
+    def sendError(self, exc):
+        self.factory.error = exc
+        SMTPClient.sendError(self, exc)
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        ESMTPSender.connectionLost(self, reason)
+
+        if self.idle_call is not None:
+            # the session was closed by the server while idle
+            self.idle_call.cancel()
+            self.idle_call = None
+            self.factory.queue.idle.remove(self)
+
+        self.factory.queue.session_lost(self, self.factory.error or reason.value)
+
+
+class SMTPSessionFactory(protocol.ClientFactory):
+    protocol = SMTPSession
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.error = None
+
+    def buildProtocol(self, addr):
+        p = self.protocol(self.queue.username,
+                          self.queue.password,
+                          self.queue.context_factory,
+                          DNSNAME,
+                          10)
+
+        p.heloFallback = False
+        p.requireAuthentication = True
+        p.requireTransportSecurity = self.queue.security != 'SSL'
+        p.timeout = SMTP_TIMEOUT
+        p.factory = self
+
+        return p
+
+
+class SMTPServerQueue(object):
+    """
+    The mails to be sent through a server with the same credentials and the
+    pool of the sessions opened to send them
+    """
+    def __init__(self, spooler, smtp_host, smtp_port, security, username, password, anonymize, socks_host, socks_port):
+        self.spooler = spooler
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.security = security
+        self.username = username.encode('utf-8')
+        self.password = password.encode('utf-8')
+        self.anonymize = anonymize
+        self.socks_host = socks_host
+        self.socks_port = socks_port
+        self.context_factory = TLSClientContextFactory()
+
+        self.mails = collections.deque()
+        self.sessions = 0
+        self.idle = []
+
+    def push_mail(self, mail):
+        self.mails.append(mail)
+
+        if self.idle:
+            self.idle.pop().resume()
+        elif self.sessions < SMTP_MAX_SESSIONS_PER_SERVER and len(self.mails) > self.sessions:
+            self.open_session()
+
+    def pop_mail(self):
+        return self.mails.popleft() if self.mails else None
+
+    def open_session(self):
+        self.sessions += 1
+        self.spooler.sessions_opened += 1
+
+        factory = SMTPSessionFactory(self)
+        if self.security == 'SSL':
+            factory = tls.TLSMemoryBIOFactory(self.context_factory, True, factory)
+
+        if self.anonymize:
+            socksProxy = TCP4ClientEndpoint(reactor, self.socks_host, self.socks_port, timeout=SMTP_TIMEOUT)
+            endpoint = SOCKS5ClientEndpoint(self.smtp_host.encode('utf-8'), self.smtp_port, socksProxy)
+        else:
+            endpoint = TCP4ClientEndpoint(reactor, self.smtp_host.encode('utf-8'), self.smtp_port, timeout=SMTP_TIMEOUT)
+
+        endpoint.connect(factory).addErrback(lambda failure: self.session_lost(None, failure.value))
+
+    def mail_done(self, mail, success, reason=None):
+        if success:
+            self.spooler.sent += 1
+            self.spooler.completions.append(time.time())
+        else:
+            self.spooler.failed += 1
+            log.err("SMTP delivery to %s failed (%s)", mail.to_address, reason, tid=mail.tid)
+
+        mail.deferred.callback(success)
+
+    def session_lost(self, session, error):
+        self.sessions -= 1
+
+        if session is not None and session.mail is not None:
+            self.mail_done(session.mail, False, error)
+
+        if not self.mails:
+            return
+
+        if session is not None and session.sent:
+            # the server is reachable and a new session continues the delivery
+            self.open_session()
+        elif not self.sessions:
+            # none of the queued mails could reach the server
+            while self.mails:
+                self.mail_done(self.mails.popleft(), False, error)
+
+
+class SMTPSpooler(object):
+    """
+    Queue the mails grouping them by server and credentials so that every
+    server receives them through a bounded number of reused sessions
+    """
+    def __init__(self):
+        self.queues = {}
+        self.sessions_opened = 0
+        self.sent = 0
+        self.failed = 0
+        self.completions = collections.deque(maxlen=10000)
+
+    def sendmail(self, tid, username, password, smtp_host, smtp_port, security, from_name, from_address, to_address, subject, body, anonymize=True, socks_host='127.0.0.1', socks_port=9050):
+        """
+        Queue an email to be sent using SMTPS/SMTP+TLS maybe torifying the connection.
+
+        @return: a {Deferred} that returns a success {bool} if the message was passed
+                 to the server.
+        """
+        try:
+            message = MIME_mail_build(from_name,
+                                      from_address,
+                                      to_address,
+                                      to_address,
+                                      subject,
+                                      body)
+
+            key = (smtp_host, smtp_port, security, username, password, anonymize)
+            if key not in self.queues:
+                self.queues[key] = SMTPServerQueue(self, smtp_host, smtp_port, security, username, password, anonymize, socks_host, socks_port)
+
+            log.debug('Queuing email to %s for SMTP server [%s:%d] [%s]',
+                      to_address,
+                      smtp_host,
+                      smtp_port,
+                      security,
+                      tid=tid)
+
+            mail = OutgoingMail(tid, from_address, to_address.encode('ascii'), message)
+
+            self.queues[key].push_mail(mail)
+
+            return mail.deferred
+
+        except Exception as excep:
+            # avoids raising an exception inside email logic to avoid chained errors
+            log.err("Unexpected exception in sendmail: %s", str(excep), tid=tid)
+            return defer.succeed(False)
+
+    def get_stats(self):
+        now = time.time()
+
+        return {
+            'queued': sum(len(q.mails) for q in self.queues.values()),
+            'sessions': sum(q.sessions for q in self.queues.values()),
+            'idle_sessions': sum(len(q.idle) for q in self.queues.values()),
+            'sessions_opened': self.sessions_opened,
+            'sent': self.sent,
+            'failed': self.failed,
+            'throughput': float(sum(1 for x in self.completions if x > now - SMTP_THROUGHPUT_WINDOW)) / SMTP_THROUGHPUT_WINDOW
+        }
+
+
+smtp_spooler = SMTPSpooler()
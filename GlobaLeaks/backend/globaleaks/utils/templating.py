@@ -45,6 +45,13 @@ tip_keywords = [
     '{HTTPSUrl}'
 ]
 
+digest_keywords = [
+    '{EventCount}',
+    '{EventList}',
+    '{TorUrl}',
+    '{HTTPSUrl}'
+]
+
 file_keywords = [
     '{FileName}',
     '{FileSize}'
@@ -123,6 +130,7 @@ def indent_text(text, n=1):
 class Keyword(object):
     keyword_list = []
     data_keys = []
+    templating = None
 
     def __init__(self, data):
         for k in self.data_keys:
@@ -277,7 +285,7 @@ class TipKeyword(UserNodeKeyword, ContextKeyword):
             data['message'] = copy.deepcopy(message)
             template = 'export_message_whistleblower' if (message['type'] == 'whistleblower') else 'export_message_recipient'
             ret += indent_text('-' * 40) + '\n'
-            ret += indent_text(text_type(Templating().format_template(self.data['notification'][template], data))) + '\n\n'
+            ret += indent_text(text_type(self.templating.format_template(self.data['notification'][template], data, template))) + '\n\n'
 
         return ret
 
@@ -377,6 +385,23 @@ class ExpirationSummaryKeyword(UserNodeKeyword):
         return 'https://' + self.data['node']['hostname'] + '/#/receiver/tips'
 
 
+class DigestKeyword(UserNodeKeyword):
+    keyword_list = UserNodeKeyword.keyword_list + digest_keywords
+    data_keys =  UserNodeKeyword.data_keys + ['events']
+
+    def EventCount(self):
+        return str(len(self.data['events']))
+
+    def EventList(self):
+        return '\n'.join('%s  %s' % (ISO8601_to_pretty_str(e['creation_date']), e['subject']) for e in self.data['events'])
+
+    def _TorUrl(self):
+        return 'http://' + self.data['node']['onionservice'] + '/#/receiver/tips'
+
+    def _HTTPSUrl(self):
+        return 'https://' + self.data['node']['hostname'] + '/#/receiver/tips'
+
+
 class AdminPGPAlertKeyword(UserNodeKeyword):
     keyword_list = UserNodeKeyword.keyword_list + admin_pgp_alert_keywords
     data_keys =  UserNodeKeyword.data_keys + ['users']
@@ -546,6 +571,7 @@ supported_template_types = {
     u'message': MessageKeyword,
     u'file': FileKeyword,
     u'tip_expiration_summary': ExpirationSummaryKeyword,
+    u'digest': DigestKeyword,
     u'pgp_alert': PGPAlertKeyword,
     u'admin_pgp_alert': AdminPGPAlertKeyword,
     u'receiver_notification_limit_reached': UserNodeKeyword,
@@ -562,19 +588,102 @@ supported_template_types = {
 }
 
 
+# matches the tokens that could be keywords of a template
+keyword_re = re.compile(r'(\{[A-Za-z]+\})')
+
+
+class CompiledTemplate(object):
+    """
+    A template split in the literals and the names of the keywords
+    referenced among them, respectively at the even and at the odd positions
+    of the segments
+    """
+    __slots__ = ['source', 'segments', 'keywords']
+
+    def __init__(self, source, segments):
+        self.source = source
+        self.segments = segments
+        self.keywords = frozenset(segments[1::2])
+
+    def render(self, keyword_converter):
+        """
+        Evaluate each of the referenced keywords once and join the results
+
+        @return: the text and the values of the keywords
+        """
+        values = dict((k, getattr(keyword_converter, k)()) for k in self.keywords)
+
+        output = list(self.segments)
+        output[1::2] = [values[k] for k in self.segments[1::2]]
+
+        return ''.join(output), values.values()
+
+
+def compile_template(raw_template, keyword_list):
+    keywords = set(keyword_list)
+    segments = ['']
+
+    for i, token in enumerate(keyword_re.split(raw_template)):
+        if i % 2 and token in keywords:
+            segments += [token[1:-1], '']
+        else:
+            segments[-1] += token
+
+    return CompiledTemplate(raw_template, segments)
+
+
+class TemplateCache(object):
+    """
+    The templates compiled indexed by tenant, template variable and language
+
+    The entries are checked against the text of the template so that
+    a template changed without invalidating the cache is compiled again
+    """
+    def __init__(self):
+        self.templates = {}
+
+    def get(self, tid, var, language, raw_template, keyword_list):
+        key = (tid, var, language)
+
+        template = self.templates.get(key)
+        if template is None or template.source != raw_template:
+            template = self.templates[key] = compile_template(raw_template, keyword_list)
+
+        return template
+
+    def invalidate(self, tid):
+        for key in [key for key in self.templates if key[0] == tid]:
+            del self.templates[key]
+
+
+template_cache = TemplateCache()
+
+
 class Templating(object):
-    def format_template(self, raw_template, data):
+    """
+    Render the templates compiling them once per tenant, template variable
+    and language when a tenant and a variable are given
+    """
+    def __init__(self, tid=None, language=None):
+        self.tid = tid
+        self.language = language
+
+    def compile_template(self, raw_template, keyword_list, var=None):
+        if self.tid is None or var is None:
+            return compile_template(raw_template, keyword_list)
+
+        return template_cache.get(self.tid, var, self.language, raw_template, keyword_list)
+
+    def format_template(self, raw_template, data, var=None):
         keyword_converter = supported_template_types[data['type']](data)
-        for _ in range(3):
-            count = 0
+        keyword_converter.templating = self
 
-            for kw in keyword_converter.keyword_list:
-                if raw_template.count(kw):
-                    # if %SomeKeyword% matches, call keyword_converter.SomeKeyword function
-                    variable_content = getattr(keyword_converter, kw[1:-1])()
-                    raw_template = raw_template.replace(kw, variable_content)
+        template = self.compile_template(raw_template, keyword_converter.keyword_list, var)
 
-                    count += 1
+        for _ in range(3):
+            values = []
+            if template.keywords:
+                raw_template, values = template.render(keyword_converter)
 
             # remobe lines with only {Blank}
             raw_template = raw_template.replace('\n{Blank}\n', '\n')
@@ -584,33 +693,37 @@ class Templating(object):
 
             raw_template = raw_template.rstrip()
 
-            if count == 0:
+            if not any('{' in v for v in values):
                 # finally!
                 break
 
+            # the keywords have been replaced by text including other keywords
+            template = compile_template(raw_template, keyword_converter.keyword_list)
+
         return raw_template
 
-    def get_mail_subject_and_body(self, data):
-        subject_template = ''
-        body_template = ''
-
-        if data['type'] == 'export_template':
-            # this is currently the only template not used for mail notifications
-            pass
-        elif data['type'] in supported_template_types:
-            subject_template = data['notification'][data['type'] + '_mail_title']
-            body_template = data['notification'][data['type'] + '_mail_template']
-        else:
-            raise NotImplementedError('This data_type (%s) is not supported' % ['data.type'])
+    def get_mail_subject(self, data):
+        subject_var = data['type'] + '_mail_title'
+        subject_template = data['notification'][subject_var]
 
         if data['type'] in [u'tip', u'comment', u'file', u'message']:
             prefix = '{TipNum} '
             if data['tip']['label']:
                 prefix += '[{TipLabel}] '
+                subject_var += '_labeled'
 
             subject_template = prefix + subject_template
 
-        subject = self.format_template(subject_template, data)
-        body = self.format_template(body_template, data)
+        return self.format_template(subject_template, data, subject_var)
+
+    def get_mail_subject_and_body(self, data):
+        if data['type'] == 'export_template':
+            # this is currently the only template not used for mail notifications
+            return '', ''
+        elif data['type'] not in supported_template_types:
+            raise NotImplementedError('This data_type (%s) is not supported' % ['data.type'])
+
+        subject = self.get_mail_subject(data)
+        body = self.format_template(data['notification'][data['type'] + '_mail_template'], data, data['type'] + '_mail_template')
 
         return subject, body